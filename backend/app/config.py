@@ -1,10 +1,79 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Optional
 
 class Settings(BaseSettings):
+    # Use an async driver (e.g. sqlite+aiosqlite://, postgresql+asyncpg://)
+    # to switch to the async engine
     DATABASE_URL: str = "sqlite:///./cards_against_ai.db"
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_RECYCLE: int = 30 * 60
+    SQLITE_BUSY_TIMEOUT_MS: int = 5_000
     REDIS_URL: str = "redis://localhost:6379"
+    # "redis" shares locks, the model rate limit, the card index version and
+    # the response cache between workers, required when WORKERS > 1
+    SHARED_STATE: str = "local"  # local | redis
+    WORKERS: int = 1
+    # How long a request waits for another one holding its session or round
+    SESSION_LOCK_TIMEOUT: float = 30.0
+    # How often workers check whether another one refreshed the card index
+    CARD_INDEX_POLL_S: float = 5.0
     ANTHROPIC_API_KEY: str
+    ANTHROPIC_BASE_URL: Optional[str] = None
+    ANTHROPIC_MODEL: str = "claude-3-5-sonnet-20240620"
+    ANTHROPIC_MAX_CONCURRENCY: int = 16
+    ANTHROPIC_TIMEOUT: float = 30.0
+    # Hard deadline of a model call, hedges and retries included
+    ANTHROPIC_PICK_DEADLINE: float = 8.0
+    ANTHROPIC_JUDGE_DEADLINE: float = 12.0
+    # Start a duplicate request once a call runs past the observed p95
+    ANTHROPIC_HEDGING: bool = True
+    ANTHROPIC_HEDGE_MIN_DELAY_MS: int = 250
+    # Hedges and retries allowed, as a fraction of calls over the last 10s
+    ANTHROPIC_RETRY_BUDGET_RATIO: float = 0.1
+    ANTHROPIC_RETRY_BUDGET_MIN: int = 3
+    # Consecutive failures that open the circuit, and how long it stays open
+    ANTHROPIC_BREAKER_FAILURES: int = 5
+    ANTHROPIC_BREAKER_RESET_S: float = 30.0
+    # Model calls per second across all workers, 0 disables the limit
+    ANTHROPIC_RATE_LIMIT: int = 0
+    ANTHROPIC_RATE_LIMIT_BURST: int = 10
+    AI_SPECULATIVE_PICK: bool = True
+    # "heuristic" plays every game with the local engine, no network needed;
+    # otherwise each AI personality's own engine is used
+    AI_ENGINE: str = "anthropic"  # anthropic | heuristic
+    # Answer with the local engine when the model call fails or times out
+    AI_HEURISTIC_FALLBACK: bool = True
+    # 0 disables judge micro-batching
+    JUDGE_BATCH_WINDOW_MS: int = 0
+    JUDGE_BATCH_MAX_SIZE: int = 8
+    # Log the span breakdown of requests slower than this, unset disables it
+    SLOW_REQUEST_MS: Optional[int] = None
+    # memory | redis | none, unset follows SHARED_STATE
+    RESPONSE_CACHE_BACKEND: Optional[str] = None
+    RESPONSE_CACHE_TTL: int = 24 * 60 * 60
+    RESPONSE_CACHE_MAX_ENTRIES: int = 10_000
+    # Compress responses larger than COMPRESSION_MIN_SIZE bytes, brotli needs
+    # the brotli extra and falls back to gzip for clients without it
+    COMPRESSION: str = "gzip"  # gzip | brotli | none
+    COMPRESSION_MIN_SIZE: int = 1024
+    COMPRESSION_LEVEL: int = 5
+    # Persist round results from a background writer in grouped transactions
+    # instead of in the submit request. Results are journaled first and the
+    # journal is replayed on startup. Needs WORKERS=1
+    WRITE_BEHIND: bool = False
+    # Results the database keeps refusing are moved to <journal>.dead
+    WRITE_BEHIND_JOURNAL: str = "./round_results.journal"
+    # Submits wait once this many results are queued
+    WRITE_BEHIND_MAX_PENDING: int = 1_000
+    WRITE_BEHIND_BATCH_SIZE: int = 200
+    # Startup warmup (model client, pooled connections, caches) runs behind
+    # GET /ready while requests are already served; true holds the server
+    # back until every step ran once
+    WARMUP_BEFORE_SERVING: bool = False
+    # Pooled database connections opened by the warmup
+    WARMUP_DB_CONNECTIONS: int = 4
 
     class Config:
         env_file = ".env"
@@ -1,16 +1,139 @@
+import asyncio
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import TYPE_CHECKING, AsyncGenerator, Callable, TypeVar, Union
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlmodel import SQLModel, create_engine, Session
-from typing import Generator
 from app.config import get_settings
 
-settings = get_settings()
+if TYPE_CHECKING:
+    from sqlmodel.ext.asyncio.session import AsyncSession
+
+ASYNC_DRIVERS = ("aiosqlite", "asyncpg", "aiomysql", "asyncmy", "psycopg_async")
+
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+)
+
+T = TypeVar("T")
+AnySession = Union[Session, "AsyncSession"]
+
+
+def is_async_url(database_url: str) -> bool:
+    return make_url(database_url).drivername.split("+")[-1] in ASYNC_DRIVERS
+
+
+def _engine_options(database_url: str) -> dict:
+    if make_url(database_url).get_backend_name() == "sqlite":
+        return {"connect_args": {"check_same_thread": False}}
+    settings = get_settings()
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.execute(f"PRAGMA busy_timeout={get_settings().SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+
+def _make_engine(database_url: str):
+    options = _engine_options(database_url)
+    if is_async_url(database_url):
+        # Imported lazily, the asyncio extension needs greenlet installed
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        engine = create_async_engine(database_url, **options)
+        sync_engine = engine.sync_engine
+    else:
+        engine = sync_engine = create_engine(database_url, **options)
+    if sync_engine.dialect.name == "sqlite":
+        event.listen(sync_engine, "connect", _set_sqlite_pragmas)
+    return engine
 
-engine = create_engine(settings.DATABASE_URL, connect_args={"check_same_thread": False})
 
+@lru_cache()
+def get_engine():
+    """The process-wide engine, built on first use so importing the app
+    does not read the settings or load a database driver."""
+    return _make_engine(get_settings().DATABASE_URL)
 
-def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
 
+@lru_cache()
+def is_async_engine() -> bool:
+    return is_async_url(get_settings().DATABASE_URL)
 
-def get_session() -> Generator[Session, None, None]:
-    with Session(engine) as session:
+
+async def create_db_and_tables():
+    engine = get_engine()
+    if is_async_engine():
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+    else:
+        SQLModel.metadata.create_all(engine)
+
+
+async def open_pool_connections(count: int) -> int:
+    """Connect up to `count` pooled connections ahead of the first requests,
+    which would otherwise each pay for a connect (and SQLite's pragmas).
+    Returns how many were opened."""
+    engine = get_engine()
+    pool = getattr(engine, "sync_engine", engine).pool
+    # Pools without a size (SQLite in memory) hold a single connection
+    count = min(count, pool.size()) if hasattr(pool, "size") else min(count, 1)
+    if is_async_engine():
+        connections = [await engine.connect() for _ in range(count)]
+        for connection in connections:
+            await connection.exec_driver_sql("SELECT 1")
+            await connection.close()
+        return count
+
+    def connect():
+        connections = [engine.connect() for _ in range(count)]
+        for connection in connections:
+            connection.exec_driver_sql("SELECT 1")
+            connection.close()
+
+    await asyncio.to_thread(connect)
+    return count
+
+
+@asynccontextmanager
+async def open_session() -> AsyncGenerator[AnySession, None]:
+    # Objects stay loaded after commit, responses serialize them without a
+    # refresh round-trip per row.
+    if is_async_engine():
+        from sqlmodel.ext.asyncio.session import AsyncSession
+
+        async with AsyncSession(get_engine(), expire_on_commit=False) as session:
+            yield session
+    else:
+        with Session(get_engine(), expire_on_commit=False) as session:
+            yield session
+
+
+async def get_session() -> AsyncGenerator[AnySession, None]:
+    async with open_session() as session:
         yield session
+
+
+async def run_db(db: AnySession, fn: Callable[..., T], *args) -> T:
+    """Run `fn(session, *args)` without blocking the event loop.
+
+    `fn` is always written against a synchronous `Session`: async engines run
+    it through `AsyncSession.run_sync`, sync engines in a worker thread.
+    """
+    if isinstance(db, Session):
+        return await asyncio.to_thread(fn, db, *args)
+    return await db.run_sync(fn, *args)
@@ -1,5 +1,6 @@
 from typing import Optional
 from datetime import datetime, timezone
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 
 
@@ -44,6 +45,8 @@ class AIPersonality(SQLModel, table=True):
     description: Optional[str] = None
     created_at: datetime = Field(default_factory=utc_now)
     created_by: Optional[int] = Field(default=None, foreign_key="users.id")
+    # "anthropic" plays with the remote model, "heuristic" with the local engine
+    engine: str = "anthropic"
 
 
 class GameSession(SQLModel, table=True):
@@ -54,10 +57,28 @@ class GameSession(SQLModel, table=True):
     ai_personality_id: int = Field(foreign_key="ai_personalities.id")
     start_time: datetime = Field(default_factory=utc_now)
     end_time: Optional[datetime] = None
+    # Running scoreboard, kept in sync by GameService so reads never have to
+    # scan game_rounds
+    current_round: int = 0
+    user_score: int = 0
+    ai_score: int = 0
+    # Per session shuffle of the decks, a seed, the highest card ids when it
+    # was made and how many ids were dealt (see app/services/deck_cursor.py),
+    # set on the first round
+    deck_seed: Optional[int] = None
+    black_deck_max_id: int = 0
+    black_cursor: int = 0
+    white_deck_max_id: int = 0
+    white_cursor: int = 0
 
 
 class GameRound(SQLModel, table=True):
     __tablename__ = "game_rounds"
+    __table_args__ = (
+        Index(
+            "idx_unique_game_round", "game_session_id", "round_number", unique=True
+        ),
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
     game_session_id: int = Field(foreign_key="game_sessions.id")
@@ -65,15 +86,56 @@ class GameRound(SQLModel, table=True):
     black_card_id: int = Field(foreign_key="black_cards.id")
     user_score: int
     ai_score: int
-    winner: str
+    winner: Optional[str] = None
     judge_explanation: Optional[str] = None
+    # Dealt and judged, the analytics export measures round durations with them
+    created_at: Optional[datetime] = Field(default_factory=utc_now)
+    completed_at: Optional[datetime] = None
 
 
 class CardPlay(SQLModel, table=True):
     __tablename__ = "card_plays"
+    __table_args__ = (
+        Index("idx_unique_card_play", "round_id", "play_order", unique=True),
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
     round_id: int = Field(foreign_key="game_rounds.id")
     user_card_id: int = Field(foreign_key="white_cards.id")
     ai_card_id: int = Field(foreign_key="white_cards.id")
     play_order: int
+
+
+class RoundHand(SQLModel, table=True):
+    __tablename__ = "round_hands"
+
+    round_id: int = Field(primary_key=True, foreign_key="game_rounds.id")
+    # Dealt white card ids, comma separated in deal order
+    card_ids: str
+
+
+class CardStats(SQLModel, table=True):
+    """Plays and wins of a white card, kept up to date by every submit."""
+
+    __tablename__ = "card_stats"
+    __table_args__ = (Index("idx_card_stats_leaderboard", "wins", "card_id"),)
+
+    card_id: int = Field(primary_key=True, foreign_key="white_cards.id")
+    plays: int = 0
+    wins: int = 0
+
+
+class PersonalityStats(SQLModel, table=True):
+    """Rounds an AI personality won, lost and tied against humans."""
+
+    __tablename__ = "personality_stats"
+    __table_args__ = (
+        Index("idx_personality_stats_leaderboard", "wins", "ai_personality_id"),
+    )
+
+    ai_personality_id: int = Field(
+        primary_key=True, foreign_key="ai_personalities.id"
+    )
+    wins: int = 0
+    losses: int = 0
+    ties: int = 0
@@ -1,15 +1,109 @@
-from fastapi import FastAPI, HTTPException, Depends
+import asyncio
+import importlib
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime
+from fastapi import FastAPI, HTTPException, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from sqlmodel import Session, select
-from typing import List
-from app.db.database import get_session
-from app.db.models import AIPersonality, BlackCard, GameSession, GameRound, WhiteCard
+from typing import Any, Dict, List, Literal, Optional
+from app.config import get_settings
+from app.db.database import (
+    AnySession,
+    get_engine,
+    get_session,
+    open_pool_connections,
+    open_session,
+    run_db,
+)
+from app.db.models import AIPersonality
+from app.metrics import RequestTracingMiddleware, instrument_engine, registry
 from app.services.game import GameService
 from app.services.card_manager import CardManagerService
-from app.services.anthropic import AnthropicService
-from pydantic import BaseModel
+from app.services.ai_precompute import get_ai_precomputer
+from app.services.anthropic import get_anthropic_service
+from app.services.card_index import refresh_card_index
+from app.services.heuristic import HEURISTIC_ENGINE, get_heuristic_engine
+from app.services import leaderboard
+from app.services.result_writer import get_result_writer
+from app.services.shared_state import get_redis_client, get_shared_state
+from app.services.warmup import WarmupStep, get_warmup
+from pydantic import BaseModel, ConfigDict, TypeAdapter
+from starlette.types import ASGIApp
+
+logger = logging.getLogger(__name__)
+
+
+async def _refresh_card_index():
+    async with open_session() as db:
+        return await run_db(db, refresh_card_index)
+
+
+async def _import_model_sdk():
+    # The SDK import is the slowest part of a cold start, done in a thread
+    # the event loop keeps serving meanwhile
+    await asyncio.to_thread(importlib.import_module, "anthropic")
+    get_anthropic_service()
+    if get_settings().AI_SPECULATIVE_PICK:
+        get_ai_precomputer()
+
+
+async def _connect_shared_state():
+    settings = get_settings()
+    get_shared_state()
+    if settings.SHARED_STATE == "redis":
+        # Same cached client, and so connection pool, as the shared state and
+        # the response cache
+        await get_redis_client(settings.REDIS_URL).ping()
+
+
+def _warmup_steps(settings) -> List[WarmupStep]:
+    # Not ready without the database and the shared state, everything else
+    # is only slower on first use
+    steps: List[WarmupStep] = [
+        (
+            "database",
+            lambda: open_pool_connections(settings.WARMUP_DB_CONNECTIONS),
+            True,
+        ),
+        ("shared_state", _connect_shared_state, True),
+    ]
+    if settings.AI_ENGINE != HEURISTIC_ENGINE:
+        steps.append(("model_client", _import_model_sdk, False))
+    # Personalities on the local engine and the fallback both play with it
+    steps.append(
+        ("heuristic_engine", lambda: asyncio.to_thread(get_heuristic_engine), False)
+    )
+    return steps
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    settings = get_settings()
+    instrument_engine(get_engine())
+    # Required before serving, an async session cannot build the index lazily
+    await _refresh_card_index()
+    if settings.WRITE_BEHIND:
+        # Replays the results a crashed process left in the journal
+        await get_result_writer().start()
+    # Picks up card index refreshes done through other workers
+    card_index_watcher = asyncio.create_task(
+        get_shared_state().watch_card_index(
+            _refresh_card_index, settings.CARD_INDEX_POLL_S
+        )
+    )
+    warmup = asyncio.create_task(get_warmup().run(_warmup_steps(settings)))
+    if settings.WARMUP_BEFORE_SERVING:
+        await get_warmup().wait_first_pass()
+    yield
+    warmup.cancel()
+    card_index_watcher.cancel()
+    if settings.WRITE_BEHIND:
+        await get_result_writer().close()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -20,15 +114,68 @@ app.add_middleware(
 )
 
 
-def get_game_service(db: Session = Depends(get_session)):
+def compress(app: ASGIApp, settings) -> ASGIApp:
+    # Server-sent events stay uncompressed so every chunk goes out as soon as
+    # it is yielded. GZipMiddleware skips text/event-stream by itself
+    if settings.COMPRESSION == "gzip":
+        from starlette.middleware.gzip import GZipMiddleware
+
+        return GZipMiddleware(
+            app,
+            minimum_size=settings.COMPRESSION_MIN_SIZE,
+            compresslevel=settings.COMPRESSION_LEVEL,
+        )
+    if settings.COMPRESSION == "brotli":
+        from brotli_asgi import BrotliMiddleware
+
+        return BrotliMiddleware(
+            app,
+            quality=settings.COMPRESSION_LEVEL,
+            minimum_size=settings.COMPRESSION_MIN_SIZE,
+            gzip_fallback=True,
+            excluded_handlers=[r"/game-rounds/\d+/submit/stream"],
+        )
+    if settings.COMPRESSION != "none":
+        raise ValueError(f"Unknown COMPRESSION {settings.COMPRESSION!r}")
+    return app
+
+
+def configured_middleware(app: ASGIApp) -> ASGIApp:
+    # Starlette builds the middleware stack on startup, so the settings are
+    # read then and importing this module does not need them
+    settings = get_settings()
+    return RequestTracingMiddleware(
+        compress(app, settings), slow_request_ms=settings.SLOW_REQUEST_MS
+    )
+
+
+app.add_middleware(configured_middleware)
+
+
+def get_game_service(db: AnySession = Depends(get_session)):
+    settings = get_settings()
     card_manager = CardManagerService(db)
-    anthropic_service = AnthropicService()
-    return GameService(db, anthropic_service, card_manager)
+    result_writer = get_result_writer() if settings.WRITE_BEHIND else None
+    if settings.AI_ENGINE == HEURISTIC_ENGINE:
+        # Offline mode, the local engine stands in for the model everywhere
+        return GameService(
+            db, get_heuristic_engine(), card_manager, result_writer=result_writer
+        )
+    anthropic_service = get_anthropic_service()
+    ai_precomputer = get_ai_precomputer() if settings.AI_SPECULATIVE_PICK else None
+    return GameService(
+        db,
+        anthropic_service,
+        card_manager,
+        ai_precomputer,
+        result_writer=result_writer,
+    )
 
 
 class AIPersonalityCreate(BaseModel):
     name: str
     description: str
+    engine: Literal["anthropic", "heuristic"] = "anthropic"
 
 
 class GameSessionCreate(BaseModel):
@@ -40,20 +187,68 @@ class GameRoundCreate(BaseModel):
     game_session_id: int
 
 
+# What the client renders of a session, a round and its cards, instead of the
+# full rows
+class GameSessionOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    user_id: int
+    ai_personality_id: int
+    start_time: datetime
+    end_time: Optional[datetime] = None
+
+
+class BlackCardOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    text: str
+    pick: int
+    watermark: Optional[str] = None
+
+
+class WhiteCardOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    text: str
+    watermark: Optional[str] = None
+
+
+class GameRoundOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    game_session_id: int
+    round_number: int
+    user_score: int
+    ai_score: int
+    winner: Optional[str] = None
+    judge_explanation: Optional[str] = None
+
+
 class GameRoundResponse(BaseModel):
-    game_round: GameRound
-    black_card: BlackCard
-    white_cards: List[WhiteCard]
+    game_round: GameRoundOut
+    black_card: BlackCardOut
+    white_cards: List[WhiteCardOut]
 
 
 class GameRoundResult(BaseModel):
-    game_round: GameRound
-    ai_chosen_cards: List[WhiteCard]
+    game_round: GameRoundOut
+    ai_chosen_cards: List[WhiteCardOut]
+
+
+class CardIndexStats(BaseModel):
+    black_cards: int
+    white_cards: int
 
 
 class CardSubmission(BaseModel):
     user_card_ids: List[int]
-    white_card_ids: List[int]
+    # Deprecated, the dealt hand is stored server side. Only read for rounds
+    # dealt before that.
+    white_card_ids: Optional[List[int]] = None
 
 
 class GameResult(BaseModel):
@@ -64,18 +259,45 @@ class GameResult(BaseModel):
     rounds_played: int
 
 
-@app.get("/ai-personalities", response_model=List[AIPersonality])
-def get_ai_personalities(db: Session = Depends(get_session)):
-    personalities = db.exec(select(AIPersonality)).all()
-    return personalities
+class CardLeaderboardEntry(BaseModel):
+    card_id: int
+    text: str
+    plays: int
+    wins: int
+    win_rate: float
 
 
-@app.post("/ai-personalities", response_model=AIPersonality, status_code=201)
-def create_ai_personality(
-    personality: AIPersonalityCreate, db: Session = Depends(get_session)
-):
+class PersonalityLeaderboardEntry(BaseModel):
+    ai_personality_id: int
+    name: str
+    wins: int
+    losses: int
+    ties: int
+    win_rate: float
+
+
+class CardLeaderboard(BaseModel):
+    items: List[CardLeaderboardEntry]
+    # Pass back as `cursor` for the next page, None on the last one
+    next_cursor: Optional[str]
+
+
+class PersonalityLeaderboard(BaseModel):
+    items: List[PersonalityLeaderboardEntry]
+    next_cursor: Optional[str]
+
+
+def _list_ai_personalities(db: Session) -> List[AIPersonality]:
+    return db.exec(select(AIPersonality)).all()
+
+
+def _create_ai_personality(
+    db: Session, personality: AIPersonalityCreate
+) -> AIPersonality:
     db_personality = AIPersonality(
-        name=personality.name, description=personality.description
+        name=personality.name,
+        description=personality.description,
+        engine=personality.engine,
     )
     db.add(db_personality)
     db.commit()
@@ -83,7 +305,124 @@ def create_ai_personality(
     return db_personality
 
 
-@app.post("/game-sessions", response_model=GameSession, status_code=201)
+@app.get("/ai-personalities", response_model=List[AIPersonality])
+async def get_ai_personalities(db: AnySession = Depends(get_session)):
+    personalities = await run_db(db, _list_ai_personalities)
+    return personalities
+
+
+@app.post("/ai-personalities", response_model=AIPersonality, status_code=201)
+async def create_ai_personality(
+    personality: AIPersonalityCreate, db: AnySession = Depends(get_session)
+):
+    return await run_db(db, _create_ai_personality, personality)
+
+
+@app.post("/card-index/refresh", response_model=CardIndexStats)
+async def refresh_cards(db: AnySession = Depends(get_session)):
+    card_index = await run_db(db, refresh_card_index)
+    await get_shared_state().bump_card_index_version()
+    return CardIndexStats(
+        black_cards=len(card_index.black_deck("SAFE")),
+        white_cards=len(card_index.white_deck("SAFE")),
+    )
+
+
+@app.get("/ready", response_model=Dict[str, Any])
+def ready():
+    # 503 until the startup warmup is done and while a critical step of it
+    # keeps failing, so replicas only get traffic warm and connected
+    status = get_warmup().status()
+    if not status["ready"]:
+        raise HTTPException(status_code=503, detail=status)
+    return status
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return registry.render()
+
+
+@app.get("/response-cache/stats", response_model=Dict[str, Any])
+def response_cache_stats():
+    return get_anthropic_service().cache.stats()
+
+
+@app.get("/model/resilience", response_model=Dict[str, Any])
+def model_resilience():
+    return get_anthropic_service().resilience.stats()
+
+
+@app.get("/shared-state", response_model=Dict[str, Any])
+def shared_state_stats():
+    return get_shared_state().stats()
+
+
+def _decode_cursor(cursor: Optional[str]) -> Optional[leaderboard.Cursor]:
+    try:
+        return leaderboard.decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _next_cursor(rows: List[tuple], limit: int) -> Optional[str]:
+    # A short page is the last one
+    if len(rows) < limit:
+        return None
+    stats, row = rows[-1]
+    return leaderboard.encode_cursor((stats.wins, row.id))
+
+
+@app.get("/leaderboards/cards", response_model=CardLeaderboard)
+async def card_leaderboard(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: AnySession = Depends(get_session),
+):
+    """White cards by rounds won, read from the counters kept by every submit."""
+    after = _decode_cursor(cursor)
+    rows = await run_db(db, leaderboard.card_leaderboard, limit, after)
+    return CardLeaderboard(
+        items=[
+            CardLeaderboardEntry(
+                card_id=card.id,
+                text=card.text,
+                plays=stats.plays,
+                wins=stats.wins,
+                win_rate=stats.wins / stats.plays if stats.plays else 0.0,
+            )
+            for stats, card in rows
+        ],
+        next_cursor=_next_cursor(rows, limit),
+    )
+
+
+@app.get("/leaderboards/personalities", response_model=PersonalityLeaderboard)
+async def personality_leaderboard(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: AnySession = Depends(get_session),
+):
+    """AI personalities by rounds won against humans."""
+    after = _decode_cursor(cursor)
+    rows = await run_db(db, leaderboard.personality_leaderboard, limit, after)
+    items = []
+    for stats, personality in rows:
+        rounds = stats.wins + stats.losses + stats.ties
+        items.append(
+            PersonalityLeaderboardEntry(
+                ai_personality_id=personality.id,
+                name=personality.name,
+                wins=stats.wins,
+                losses=stats.losses,
+                ties=stats.ties,
+                win_rate=stats.wins / rounds if rounds else 0.0,
+            )
+        )
+    return PersonalityLeaderboard(items=items, next_cursor=_next_cursor(rows, limit))
+
+
+@app.post("/game-sessions", response_model=GameSessionOut, status_code=201)
 async def create_game_session(
     session_data: GameSessionCreate,
     game_service: GameService = Depends(get_game_service),
@@ -102,8 +441,11 @@ async def end_game_session(
     session_id: int, game_service: GameService = Depends(get_game_service)
 ):
     try:
+        game_session = await game_service.end_game_session(session_id)
         rounds_played, user_score, ai_score = (
-            game_service.get_latest_game_round_information(session_id)
+            game_session.current_round,
+            game_session.user_score,
+            game_session.ai_score,
         )
         if user_score > ai_score:
             winner = "human"
@@ -158,7 +500,55 @@ async def submit_game_round(
         raise HTTPException(status_code=400, detail=str(e))
 
 
+SSE_PAYLOADS = {
+    "ai_cards": TypeAdapter(List[WhiteCardOut]),
+    "result": TypeAdapter(GameRoundOut),
+}
+_ANY_PAYLOAD = TypeAdapter(Any)
+
+
+def _sse_event(event: str, data: Any) -> str:
+    adapter = SSE_PAYLOADS.get(event, _ANY_PAYLOAD)
+    payload = adapter.dump_json(adapter.validate_python(data)).decode()
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+@app.post("/game-rounds/{round_id}/submit/stream")
+async def submit_game_round_stream(
+    round_id: int,
+    submission: CardSubmission,
+    game_service: GameService = Depends(get_game_service),
+):
+    events = game_service.stream_submit_game_round(
+        round_id, submission.user_card_ids, submission.white_card_ids
+    )
+    try:
+        # Validation errors surface before the first event, report them as a
+        # regular 400 instead of a broken stream
+        first_event = await anext(events)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def event_stream():
+        yield _sse_event(*first_event)
+        async for event in events:
+            yield _sse_event(*event)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    settings = get_settings()
+    if settings.WORKERS > 1 and settings.SHARED_STATE != "redis":
+        logger.warning(
+            "Running %d workers with SHARED_STATE=%s, locks, rate limits and "
+            "card index refreshes are not shared between them",
+            settings.WORKERS,
+            settings.SHARED_STATE,
+        )
+    # Several workers need the app as an import string
+    uvicorn.run(
+        "app.main:app", host="0.0.0.0", port=8000, workers=settings.WORKERS
+    )
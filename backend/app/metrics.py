@@ -0,0 +1,233 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_COUNT_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Minimal Prometheus-style registry for counters, gauges and histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._gauges: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._help: Dict[str, str] = {}
+
+    def inc(self, name: str, value: float = 1, help: str = "", **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._help.setdefault(name, help)
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, help: str = "", **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._help.setdefault(name, help)
+            self._gauges.setdefault(name, {})[key] = value
+
+    def observe(
+        self,
+        name: str,
+        value: float,
+        buckets=LATENCY_BUCKETS,
+        help: str = "",
+        **labels,
+    ) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._help.setdefault(name, help)
+            series = self._histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = Histogram(buckets)
+            series[key].observe(value)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            for name, series in self._counters.items():
+                lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in series.items():
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+            for name, series in self._gauges.items():
+                lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} gauge")
+                for labels, value in series.items():
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+            for name, series in self._histograms.items():
+                lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, histogram in series.items():
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        bucket_labels = labels + (("le", str(bound)),)
+                        lines.append(
+                            f"{name}_bucket{_format_labels(bucket_labels)} {count}"
+                        )
+                    inf_labels = labels + (("le", "+Inf"),)
+                    lines.append(
+                        f"{name}_bucket{_format_labels(inf_labels)} {histogram.count}"
+                    )
+                    lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+                    lines.append(
+                        f"{name}_count{_format_labels(labels)} {histogram.count}"
+                    )
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (key, value.replace("\\", "\\\\").replace('"', '\\"')) for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+registry = MetricsRegistry()
+
+
+class RequestTrace:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float, float]] = []
+        self.db_queries = 0
+
+    def breakdown(self) -> str:
+        return ", ".join(
+            f"{name}@{(start - self.started) * 1000:.1f}ms+{duration * 1000:.1f}ms"
+            for name, start, duration in self.spans
+        )
+
+
+current_trace: ContextVar[Optional[RequestTrace]] = ContextVar(
+    "current_trace", default=None
+)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time a hot-path step into `caai_span_seconds` and the request trace."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - started
+        registry.observe(
+            "caai_span_seconds",
+            duration,
+            help="Duration of instrumented steps",
+            span=name,
+        )
+        trace = current_trace.get()
+        if trace is not None:
+            trace.spans.append((name, started, duration))
+
+
+def record_token_usage(model: str, usage) -> None:
+    if usage is None:
+        return
+    for kind in (
+        "input_tokens",
+        "output_tokens",
+        "cache_creation_input_tokens",
+        "cache_read_input_tokens",
+    ):
+        tokens = getattr(usage, kind, None)
+        if tokens:
+            registry.inc(
+                "caai_model_tokens_total",
+                tokens,
+                help="Tokens consumed by model calls",
+                model=model,
+                kind=kind,
+            )
+
+
+def instrument_engine(engine) -> None:
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    def count_query(conn, cursor, statement, parameters, context, executemany):
+        registry.inc("caai_db_queries_total", help="SQL statements executed")
+        trace = current_trace.get()
+        if trace is not None:
+            trace.db_queries += 1
+
+    event.listen(sync_engine, "before_cursor_execute", count_query)
+
+
+class RequestTracingMiddleware:
+    """Plain ASGI middleware, cheaper than `@app.middleware("http")` on the
+    hot path and it also covers the body of streaming responses."""
+
+    def __init__(self, app, slow_request_ms: Optional[int] = None):
+        self.app = app
+        self.slow_request_ms = slow_request_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        trace = RequestTrace()
+        token = current_trace.set(trace)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_trace.reset(token)
+            self._record(scope, trace)
+
+    def _record(self, scope, trace: RequestTrace) -> None:
+        duration = time.perf_counter() - trace.started
+        route = scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        method = scope["method"]
+        registry.observe(
+            "caai_request_seconds",
+            duration,
+            help="HTTP request latency",
+            method=method,
+            route=path,
+        )
+        registry.observe(
+            "caai_request_db_queries",
+            trace.db_queries,
+            buckets=QUERY_COUNT_BUCKETS,
+            help="SQL statements per HTTP request",
+            method=method,
+            route=path,
+        )
+        if self.slow_request_ms is not None and duration * 1000 >= self.slow_request_ms:
+            logger.warning(
+                "Slow request %s %s took %.1fms with %d queries: %s",
+                method,
+                path,
+                duration * 1000,
+                trace.db_queries,
+                trace.breakdown(),
+            )
@@ -0,0 +1,90 @@
+import asyncio
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Hashable, List, Optional, Tuple
+
+from app.db.models import AIPersonality, BlackCard, WhiteCard
+from app.services.anthropic import AnthropicService, get_anthropic_service
+
+
+class AIPickPrecomputer:
+    """Starts the AI card pick as soon as a round is dealt.
+
+    The pick only depends on the black card, the hand and the personality, all
+    known when `create_game_round` returns, so it runs while the human is
+    still choosing. `submit_game_round` then consumes the finished (or still
+    running) task instead of paying for a fresh model round-trip.
+    """
+
+    def __init__(self, anthropic_service: AnthropicService, max_pending: int = 1024):
+        self.anthropic_service = anthropic_service
+        self.max_pending = max_pending
+        self._tasks: "OrderedDict[Hashable, Tuple[frozenset, asyncio.Task]]" = (
+            OrderedDict()
+        )
+
+    def start(
+        self,
+        round_id: Hashable,
+        black_card: BlackCard,
+        white_cards: List[WhiteCard],
+        ai_personality: AIPersonality,
+    ) -> None:
+        self.discard(round_id)
+        task = asyncio.create_task(
+            self._pick_ids(black_card, white_cards, ai_personality)
+        )
+        self._tasks[round_id] = (frozenset(card.id for card in white_cards), task)
+        # Abandoned rounds are never consumed, cap how many we keep around
+        while len(self._tasks) > self.max_pending:
+            _, (_, stale_task) = self._tasks.popitem(last=False)
+            stale_task.cancel()
+
+    async def consume(
+        self, round_id: int, white_cards: List[WhiteCard]
+    ) -> Optional[List[WhiteCard]]:
+        """Return the precomputed pick, or None if there is no usable one."""
+        entry = self._tasks.pop(round_id, None)
+        if entry is None:
+            return None
+        hand_ids, task = entry
+        if hand_ids != frozenset(card.id for card in white_cards):
+            task.cancel()
+            return None
+        try:
+            chosen_ids = await task
+        except Exception:
+            return None
+        cards_by_id = {card.id: card for card in white_cards}
+        return [cards_by_id[card_id] for card_id in chosen_ids]
+
+    def rekey(self, old_key: Hashable, new_key: Hashable) -> bool:
+        """Move a pick started before its round existed to the round id."""
+        entry = self._tasks.pop(old_key, None)
+        if entry is None:
+            return False
+        self._tasks[new_key] = entry
+        return True
+
+    def discard(self, round_id: Hashable) -> None:
+        entry = self._tasks.pop(round_id, None)
+        if entry is not None:
+            entry[1].cancel()
+
+    async def _pick_ids(
+        self,
+        black_card: BlackCard,
+        white_cards: List[WhiteCard],
+        ai_personality: AIPersonality,
+    ) -> List[int]:
+        chosen_cards = await self.anthropic_service.generate_ai_response(
+            black_card=black_card,
+            white_cards=white_cards,
+            ai_personality=ai_personality,
+        )
+        return [card.id for card in chosen_cards]
+
+
+@lru_cache()
+def get_ai_precomputer() -> AIPickPrecomputer:
+    return AIPickPrecomputer(get_anthropic_service())
@@ -1,15 +1,103 @@
-import anthropic
-from typing import List
-from app.config import get_settings
+import asyncio
+import logging
+import time
+from functools import lru_cache
+from typing import AsyncIterator, List, Optional, Tuple
+from app.config import Settings, get_settings
 from app.db.models import WhiteCard, BlackCard, AIPersonality
+from app.metrics import record_token_usage, registry, span
+from app.services import prompts
+from app.services.heuristic import HeuristicEngine, get_heuristic_engine
+from app.services.judge_batcher import JudgeBatcher
+from app.services.resilience import CircuitOpenError, ResiliencePolicy
+from app.services.response_cache import (
+    ResponseCache,
+    make_cache_key,
+    make_response_cache,
+    normalize_text,
+)
+from app.services.shared_state import SharedState, get_shared_state
 
-settings = get_settings()
+logger = logging.getLogger(__name__)
+
+JUDGE_FALLBACK = (
+    "human",
+    "I am a lousy LLM that cannot judge a simple card game. The AI wins because I am a failure.",
+)
+
+
+def _parse_winner(line: str) -> str:
+    """The winner of a judge answer's "Winner: ..." line."""
+    if ": " not in line:
+        raise ValueError("Malformed judge response")
+    winner = line.split(": ", 1)[1].strip().lower()
+    if winner not in ("human", "ai"):
+        raise ValueError(f"Invalid judge winner {winner}")
+    return winner
 
 
 class AnthropicService:
-    def __init__(self):
-        self.client = anthropic.Client(api_key=settings.ANTHROPIC_API_KEY)
-        self.model = "claude-3-5-sonnet-20240620"  # Use the appropriate model version
+    def __init__(
+        self,
+        settings: Optional[Settings] = None,
+        cache: Optional[ResponseCache] = None,
+        fallback_engine: Optional[HeuristicEngine] = None,
+        shared_state: Optional[SharedState] = None,
+    ):
+        # The SDK takes longer to import than the rest of the app together,
+        # only processes that talk to the model pay for it
+        import anthropic
+
+        settings = settings or get_settings()
+        # A single AsyncAnthropic client keeps its HTTP connection pool alive
+        # across requests, so the service is meant to be shared (see
+        # `get_anthropic_service`).
+        self.client = anthropic.AsyncAnthropic(
+            api_key=settings.ANTHROPIC_API_KEY,
+            base_url=settings.ANTHROPIC_BASE_URL,
+            timeout=settings.ANTHROPIC_TIMEOUT,
+        )
+        self.model = settings.ANTHROPIC_MODEL
+        self.timeout = settings.ANTHROPIC_TIMEOUT
+        self.pick_deadline = settings.ANTHROPIC_PICK_DEADLINE
+        self.judge_deadline = settings.ANTHROPIC_JUDGE_DEADLINE
+        self.resilience = ResiliencePolicy.from_settings(settings)
+        self._semaphore = asyncio.Semaphore(settings.ANTHROPIC_MAX_CONCURRENCY)
+        # The semaphore caps this worker's calls in flight, the rate limiter
+        # caps calls per second across every worker
+        self.rate_limiter = (shared_state or get_shared_state()).rate_limiter
+        self.cache = cache if cache is not None else make_response_cache(settings)
+        self.judge_batcher = (
+            JudgeBatcher(
+                self,
+                window_ms=settings.JUDGE_BATCH_WINDOW_MS,
+                max_size=settings.JUDGE_BATCH_MAX_SIZE,
+            )
+            if settings.JUDGE_BATCH_WINDOW_MS > 0
+            else None
+        )
+        self.fallback_engine = fallback_engine or (
+            get_heuristic_engine() if settings.AI_HEURISTIC_FALLBACK else None
+        )
+
+    async def _create_message(
+        self,
+        prompt: str,
+        max_tokens: int,
+        timeout=None,
+        system: Optional[prompts.SystemPrompt] = None,
+    ):
+        await self.rate_limiter.acquire()
+        async with self._semaphore:
+            response = await self.client.messages.create(
+                model=self.model,
+                max_tokens=max_tokens,
+                messages=[{"role": "user", "content": prompt}],
+                timeout=timeout or self.timeout,
+                **({"system": system} if system else {}),
+            )
+        record_token_usage(self.model, getattr(response, "usage", None))
+        return response
 
     async def generate_ai_response(
         self,
@@ -17,33 +105,61 @@ class AnthropicService:
         white_cards: List[WhiteCard],
         ai_personality: AIPersonality,
     ) -> List[WhiteCard]:
-        prompt = f"""
-        You are playing Cards Against Humanity. 
-        You have the personality of {ai_personality.description}.
-        The black card is: {black_card.text}
-        Your white cards are:
-        {self._format_white_card(white_cards)}
-
-        Choose the funniest {black_card.pick} white card{'s' if black_card.pick > 1 else ''} to play. Avoid inappropriate content.
-        Only return the number{'s' if black_card.pick > 1 else ''} of the chosen card{'s' if black_card.pick > 1 else ''}, separated by commas if more than one.
-        For example, if you choose cards 2 and 5, just return: 2,5
-        Go stragight to the point. Do not include any other information or explanation. Just the ids of the chosen cards."""
-
-        response = self.client.messages.create(
-            model=self.model,
-            max_tokens=20,
-            messages=[{"role": "user", "content": prompt}],
+        cache_key = make_cache_key(
+            "pick",
+            self.model,
+            {
+                "black_card": normalize_text(black_card.text),
+                "pick": black_card.pick,
+                "hand": sorted((c.id, normalize_text(c.text)) for c in white_cards),
+                "personality": normalize_text(ai_personality.description or ""),
+            },
         )
-        chosen_cards = [
+        cached_ids = await self.cache.get(cache_key)
+        if cached_ids is not None:
+            cards_by_id = {card.id: card for card in white_cards}
+            return [cards_by_id[card_id] for card_id in cached_ids]
+
+        try:
+            chosen_cards = await self.resilience.call(
+                "pick",
+                lambda: self._pick(black_card, white_cards, ai_personality),
+                deadline=self.pick_deadline,
+            )
+        except Exception as e:
+            if self.fallback_engine is None:
+                raise
+            self._record_fallback("pick", e)
+            return self.fallback_engine.pick(black_card, white_cards, ai_personality)
+
+        await self.cache.set(cache_key, [card.id for card in chosen_cards])
+        return chosen_cards
+
+    async def _pick(
+        self,
+        black_card: BlackCard,
+        white_cards: List[WhiteCard],
+        ai_personality: AIPersonality,
+    ) -> List[WhiteCard]:
+        with span("anthropic.pick"):
+            response = await self._create_message(
+                prompts.pick_message(black_card, white_cards),
+                max_tokens=20,
+                system=prompts.pick_system(ai_personality),
+            )
+        chosen_ids = [
             int(card.strip()) for card in response.content[0].text.strip().split(",")
         ]
-        chosen_cards = list(filter(lambda c: c.id in chosen_cards, white_cards))
+        cards_by_id = {card.id: card for card in white_cards}
 
-        # Validate the response
-        if len(chosen_cards) != black_card.pick:
+        # Validate the response, the cards are played in the order given
+        if (
+            len(chosen_ids) != black_card.pick
+            or len(set(chosen_ids)) != len(chosen_ids)
+            or not all(card_id in cards_by_id for card_id in chosen_ids)
+        ):
             raise ValueError("Invalid AI response")
-
-        return chosen_cards
+        return [cards_by_id[card_id] for card_id in chosen_ids]
 
     async def judge_round(
         self,
@@ -51,35 +167,193 @@ class AnthropicService:
         user_cards: List[WhiteCard],
         ai_cards: List[WhiteCard],
     ) -> tuple[str, str]:
-        prompt = f"""You are the judge in a game similar to Cards Against Humanity.
-        The black card is: {black_card.text}
-        The human player's white card{'s' if len(user_cards) > 1 else ''}: {', '.join([c.text for c in user_cards])}
-        The AI player's white card{'s' if len(ai_cards) > 1 else ''}: {', '.join([c.text for c in ai_cards])}
-        
-        Determine the winner based on which answer is funnier or more fitting.
-        Provide a very brief explanation for your decision and be cocky.
-        Return your response in the format: "Winner: [human/ai]\nExplanation: [Your explanation here]" """
+        cache_key = self._judge_cache_key(black_card, user_cards, ai_cards)
+        cached_verdict = await self.cache.get(cache_key)
+        if cached_verdict is not None:
+            return tuple(cached_verdict)
 
         try:
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=150,
-                messages=[{"role": "user", "content": prompt}],
-            )
-            result = response.content[0].text.strip().split("\n", 1)
-            winner = result[0].split(": ")[1].lower()
-            explanation = result[1].split(": ")[1]
-            return winner, explanation
+            if self.judge_batcher is not None:
+                winner, explanation = await self.judge_batcher.judge(
+                    black_card, user_cards, ai_cards
+                )
+            else:
+                winner, explanation = await self._judge_single(
+                    black_card, user_cards, ai_cards
+                )
+        except Exception as e:
+            return self._fallback_verdict(black_card, user_cards, ai_cards, e)
+        await self.cache.set(cache_key, [winner, explanation])
+        return winner, explanation
+
+    async def stream_judge_round(
+        self,
+        black_card: BlackCard,
+        user_cards: List[WhiteCard],
+        ai_cards: List[WhiteCard],
+    ) -> AsyncIterator[Tuple[str, str]]:
+        """Yield ("winner", winner) once, then ("explanation", text) chunks
+        as the judge's answer streams in."""
+        cache_key = self._judge_cache_key(black_card, user_cards, ai_cards)
+        cached_verdict = await self.cache.get(cache_key)
+        if cached_verdict is not None:
+            yield "winner", cached_verdict[0]
+            yield "explanation", cached_verdict[1]
+            return
+
+        winner = None
+        explanation = ""
+        buffer = ""
+        in_prefix = True
+        started, first_token_at = time.perf_counter(), None
+        breaker = self.resilience.breaker
+        # Streams are not hedged or retried, but they share the circuit
+        # breaker and a read deadline with the other judge calls
+        called = False
+        try:
+            if not breaker.allow():
+                raise CircuitOpenError("Model circuit is open, judge stream skipped")
+            called = True
+            await self.rate_limiter.acquire()
+            async with self._semaphore:
+                async with self.client.messages.stream(
+                    model=self.model,
+                    max_tokens=150,
+                    system=prompts.judge_system(),
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": prompts.judge_message(
+                                black_card, user_cards, ai_cards
+                            ),
+                        }
+                    ],
+                    timeout=self.judge_deadline,
+                ) as stream:
+                    async for text in stream.text_stream:
+                        if winner is None and not buffer:
+                            first_token_at = time.perf_counter()
+                        buffer += text
+                        if winner is None:
+                            # Wait for the full "Winner: ..." line
+                            if "\n" not in buffer.lstrip():
+                                continue
+                            winner_line, buffer = buffer.lstrip().split("\n", 1)
+                            winner = _parse_winner(winner_line)
+                            yield "winner", winner
+                        if in_prefix:
+                            # Still inside the "Explanation: " prefix
+                            if ": " not in buffer:
+                                continue
+                            buffer = buffer.split(": ", 1)[1]
+                            in_prefix = False
+                        if buffer:
+                            explanation += buffer
+                            yield "explanation", buffer
+                            buffer = ""
+                    if winner is None:
+                        # The whole answer fit on one line, no newline came
+                        winner = _parse_winner(buffer.strip())
+                        yield "winner", winner
+                    record_token_usage(
+                        self.model, (await stream.get_final_message()).usage
+                    )
+            breaker.record_success()
+            called = False
         except Exception as e:
-            return (
-                "human",
-                "I am a lousy LLM that cannot judge a simple card game. The AI wins because I am a failure.",
+            if called:
+                breaker.record_failure()
+                called = False
+            if winner is None:
+                fallback_winner, fallback_explanation = self._fallback_verdict(
+                    black_card, user_cards, ai_cards, e
+                )
+                yield "winner", fallback_winner
+                yield "explanation", fallback_explanation
+            return
+
+        finally:
+            if called:
+                # Closed by the client before the answer finished
+                breaker.release()
+            if first_token_at is not None:
+                registry.observe(
+                    "caai_judge_time_to_first_token_seconds",
+                    first_token_at - started,
+                    help="Time until the streamed judge answer starts",
+                )
+
+        await self.cache.set(cache_key, [winner, explanation])
+
+    async def _judge_single(
+        self,
+        black_card: BlackCard,
+        user_cards: List[WhiteCard],
+        ai_cards: List[WhiteCard],
+    ) -> tuple[str, str]:
+        return await self.resilience.call(
+            "judge",
+            lambda: self._judge_once(black_card, user_cards, ai_cards),
+            deadline=self.judge_deadline,
+        )
+
+    async def _judge_once(
+        self,
+        black_card: BlackCard,
+        user_cards: List[WhiteCard],
+        ai_cards: List[WhiteCard],
+    ) -> tuple[str, str]:
+        with span("anthropic.judge"):
+            response = await self._create_message(
+                prompts.judge_message(black_card, user_cards, ai_cards),
+                max_tokens=150,
+                system=prompts.judge_system(),
             )
+        result = response.content[0].text.strip().split("\n", 1)
+        if len(result) != 2 or ": " not in result[0] or ": " not in result[1]:
+            raise ValueError("Malformed judge response")
+        winner = _parse_winner(result[0])
+        explanation = result[1].split(": ", 1)[1]
+        return winner, explanation
 
-    def _format_white_card(self, cards: List[WhiteCard]) -> str:
-        import json
+    def _fallback_verdict(
+        self,
+        black_card: BlackCard,
+        user_cards: List[WhiteCard],
+        ai_cards: List[WhiteCard],
+        error: Exception,
+    ) -> tuple[str, str]:
+        if self.fallback_engine is None:
+            logger.warning("Model judge call failed: %r", error)
+            return JUDGE_FALLBACK
+        self._record_fallback("judge", error)
+        return self.fallback_engine.judge(black_card, user_cards, ai_cards)
 
-        text = json.dumps(
-            [{"id": card.id, "text": card.text} for card in cards], indent=2
+    def _record_fallback(self, call: str, error: Exception) -> None:
+        logger.warning("Model %s call failed, using the local engine: %r", call, error)
+        registry.inc(
+            "caai_model_fallbacks_total",
+            help="Model calls answered by the local heuristic engine",
+            call=call,
         )
-        return text
+
+    def _judge_cache_key(
+        self,
+        black_card: BlackCard,
+        user_cards: List[WhiteCard],
+        ai_cards: List[WhiteCard],
+    ) -> str:
+        return make_cache_key(
+            "judge",
+            self.model,
+            {
+                "black_card": normalize_text(black_card.text),
+                "user_cards": [normalize_text(c.text) for c in user_cards],
+                "ai_cards": [normalize_text(c.text) for c in ai_cards],
+            },
+        )
+
+
+@lru_cache()
+def get_anthropic_service() -> AnthropicService:
+    return AnthropicService()
@@ -0,0 +1,193 @@
+import threading
+from array import array
+from bisect import bisect_right
+from typing import Dict, List, Optional, Tuple
+
+from sqlmodel import Session, select
+from app.db.models import BlackCard, WhiteCard
+from app.services.deck_cursor import DeckCursor
+
+
+class CardDeck:
+    """Compact, column-oriented snapshot of the cards in one (category, language)."""
+
+    def __init__(self):
+        self.ids = array("l")
+        self.texts: List[str] = []
+        self.picks = array("b")
+        self.watermarks: List[Optional[str]] = []
+        self.languages: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def append(self, card_id, text, watermark, language, pick=0):
+        self.ids.append(card_id)
+        self.texts.append(text)
+        self.picks.append(pick)
+        self.watermarks.append(watermark)
+        self.languages.append(language)
+
+
+DeckKey = Tuple[str, Optional[str]]
+CardPosition = Tuple[CardDeck, int, str]
+
+
+class CardIndex:
+    """Process-wide in-memory index of the card tables.
+
+    Decks are keyed by ``(category, language)``; ``language=None`` holds every
+    language of a category. The index is built once and swapped atomically on
+    ``refresh`` so deals never see a half-built index.
+    """
+
+    def __init__(self):
+        self._black: Dict[DeckKey, CardDeck] = {}
+        self._white: Dict[DeckKey, CardDeck] = {}
+        # Card id -> (all-languages deck, position, category), the deck is held
+        # directly so lookups stay consistent while a refresh swaps the index
+        self._black_positions: Dict[int, CardPosition] = {}
+        self._white_positions: Dict[int, CardPosition] = {}
+        self._lock = threading.Lock()
+        self.loaded = False
+
+    def refresh(self, db: Session) -> "CardIndex":
+        black: Dict[DeckKey, CardDeck] = {}
+        white: Dict[DeckKey, CardDeck] = {}
+        black_positions: Dict[int, CardPosition] = {}
+        white_positions: Dict[int, CardPosition] = {}
+
+        black_rows = db.exec(
+            select(
+                BlackCard.id,
+                BlackCard.text,
+                BlackCard.pick,
+                BlackCard.watermark,
+                BlackCard.category,
+                BlackCard.language,
+            ).order_by(BlackCard.id)
+        )
+        for card_id, text, pick, watermark, category, language in black_rows:
+            deck = black.setdefault((category, None), CardDeck())
+            black_positions[card_id] = (deck, len(deck), category)
+            for key in ((category, language), (category, None)):
+                black.setdefault(key, CardDeck()).append(
+                    card_id, text, watermark, language, pick
+                )
+
+        white_rows = db.exec(
+            select(
+                WhiteCard.id,
+                WhiteCard.text,
+                WhiteCard.watermark,
+                WhiteCard.category,
+                WhiteCard.language,
+            ).order_by(WhiteCard.id)
+        )
+        for card_id, text, watermark, category, language in white_rows:
+            deck = white.setdefault((category, None), CardDeck())
+            white_positions[card_id] = (deck, len(deck), category)
+            for key in ((category, language), (category, None)):
+                white.setdefault(key, CardDeck()).append(
+                    card_id, text, watermark, language
+                )
+
+        with self._lock:
+            self._black, self._white = black, white
+            self._black_positions = black_positions
+            self._white_positions = white_positions
+            self.loaded = True
+        return self
+
+    def black_deck(self, category: str, language: Optional[str] = None) -> CardDeck:
+        return self._black.get((category, language)) or CardDeck()
+
+    def white_deck(self, category: str, language: Optional[str] = None) -> CardDeck:
+        return self._white.get((category, language)) or CardDeck()
+
+    def deal_black_card(
+        self, cursor: DeckCursor, category: str, language: Optional[str] = None
+    ) -> BlackCard:
+        with self._lock:
+            deck, positions = self.black_deck(category, language), self._black_positions
+        (card_id,) = self._deal(cursor, 1, deck, positions, category, language)
+        return self._black_card(*positions[card_id])
+
+    def deal_white_cards(
+        self,
+        cursor: DeckCursor,
+        count: int,
+        category: str,
+        language: Optional[str] = None,
+    ) -> List[WhiteCard]:
+        with self._lock:
+            deck, positions = self.white_deck(category, language), self._white_positions
+        card_ids = self._deal(cursor, count, deck, positions, category, language)
+        return [self._white_card(*positions[card_id]) for card_id in card_ids]
+
+    @staticmethod
+    def _deal(
+        cursor: DeckCursor,
+        count: int,
+        deck: CardDeck,
+        positions: Dict[int, CardPosition],
+        category: str,
+        language: Optional[str],
+    ) -> List[int]:
+        def in_deck(card_id: int) -> bool:
+            position = positions.get(card_id)
+            if position is None or position[2] != category:
+                return False
+            return language is None or position[0].languages[position[1]] == language
+
+        # deck.ids is sorted, this counts the cards the session's deck can hold
+        available = bisect_right(deck.ids, cursor.max_id)
+        return cursor.deal(count, available, in_deck)
+
+    def get_black_card(self, card_id: int) -> Optional[BlackCard]:
+        position = self._black_positions.get(card_id)
+        if position is None:
+            return None
+        return self._black_card(*position)
+
+    def get_white_cards(self, card_ids: List[int]) -> Optional[List[WhiteCard]]:
+        """Cards in the order of `card_ids`, or None if any is not indexed."""
+        positions = [self._white_positions.get(card_id) for card_id in card_ids]
+        if None in positions:
+            return None
+        return [self._white_card(*position) for position in positions]
+
+    @staticmethod
+    def _black_card(deck: CardDeck, position: int, category: str) -> BlackCard:
+        return BlackCard(
+            id=deck.ids[position],
+            text=deck.texts[position],
+            pick=deck.picks[position],
+            watermark=deck.watermarks[position],
+            category=category,
+            language=deck.languages[position],
+        )
+
+    @staticmethod
+    def _white_card(deck: CardDeck, position: int, category: str) -> WhiteCard:
+        return WhiteCard(
+            id=deck.ids[position],
+            text=deck.texts[position],
+            watermark=deck.watermarks[position],
+            category=category,
+            language=deck.languages[position],
+        )
+
+
+_card_index = CardIndex()
+
+
+def get_card_index(db: Optional[Session] = None) -> CardIndex:
+    if not _card_index.loaded and db is not None:
+        _card_index.refresh(db)
+    return _card_index
+
+
+def refresh_card_index(db: Session) -> CardIndex:
+    """Rebuild the index, e.g. after `db/setup_db.py` or `db/categorize.py` ran."""
+    return _card_index.refresh(db)
@@ -1,21 +1,73 @@
 from sqlmodel import Session, select
+from app.db.database import AnySession
 from app.db.models import BlackCard, WhiteCard
-from typing import List
-import random
+from app.metrics import span
+from app.services.card_index import CardIndex, get_card_index
+from app.services.deck_cursor import DeckCursor
+from typing import List, Optional, Tuple
 
 
 class CardManagerService:
-    def __init__(self, db: Session):
+    def __init__(self, db: AnySession, card_index: Optional[CardIndex] = None):
         self.db = db
+        # An async session cannot lazily build the index, the app lifespan
+        # loads it before serving in that case
+        self.card_index = card_index or get_card_index(
+            db if isinstance(db, Session) else None
+        )
 
-    def draw_black_card(self) -> BlackCard:
-        black_cards = self.db.exec(
-            select(BlackCard).where(BlackCard.category == "SAFE")
-        ).all()
-        return random.choice(black_cards)
-
-    def draw_white_cards(self, count: int) -> List[WhiteCard]:
-        white_cards = self.db.exec(
-            select(WhiteCard).where(WhiteCard.category == "SAFE")
-        ).all()
-        return random.sample(white_cards, count)
+    def deck_max_ids(self) -> Tuple[int, int]:
+        """Highest black and white card ids, new sessions shuffle ids up to these."""
+        return (
+            _max_id(self.card_index.black_deck(category="SAFE")),
+            _max_id(self.card_index.white_deck(category="SAFE")),
+        )
+
+    def deal_black_card(self, cursor: DeckCursor) -> BlackCard:
+        with span("cards.deal_black"):
+            return self.card_index.deal_black_card(cursor, category="SAFE")
+
+    def deal_white_cards(self, cursor: DeckCursor, count: int) -> List[WhiteCard]:
+        with span("cards.deal_white"):
+            return self.card_index.deal_white_cards(cursor, count, category="SAFE")
+
+    def resolve_white_cards(
+        self, card_ids: List[int], db: Optional[Session] = None
+    ) -> List[WhiteCard]:
+        """Cards in the order of `card_ids`, from the card index when it holds
+        all of them and with a single IN query otherwise.
+
+        Pass the synchronous `db` when running inside `run_db`.
+        """
+        if not card_ids:
+            return []
+        cards = self.card_index.get_white_cards(card_ids)
+        if cards is not None:
+            return cards
+        db = db or self.db
+        with span("cards.resolve_white"):
+            cards_by_id = {
+                card.id: card
+                for card in db.exec(
+                    select(WhiteCard).where(WhiteCard.id.in_(set(card_ids)))
+                )
+            }
+        missing_ids = [card_id for card_id in card_ids if card_id not in cards_by_id]
+        if missing_ids:
+            raise ValueError(f"Invalid card ID {missing_ids[0]}")
+        return [cards_by_id[card_id] for card_id in card_ids]
+
+    def resolve_black_card(
+        self, card_id: int, db: Optional[Session] = None
+    ) -> BlackCard:
+        black_card = self.card_index.get_black_card(card_id) or (db or self.db).get(
+            BlackCard, card_id
+        )
+        if not black_card:
+            raise ValueError("Invalid black card ID")
+        return black_card
+
+
+def _max_id(deck) -> int:
+    # Decks are ordered by card id
+    return deck.ids[-1] if len(deck) else 0
@@ -0,0 +1,107 @@
+import random
+from typing import Callable, List
+
+MASK_64 = (1 << 64) - 1
+# Seeds are 31 bits, flipping bit 31 gives the white deck its own shuffle
+WHITE_DECK_SALT = 1 << 31
+
+
+def _mix(value: int) -> int:
+    # splitmix64 finalizer, a cheap well distributed 64 bit hash
+    value = (value + 0x9E3779B97F4A7C15) & MASK_64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK_64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK_64
+    return value ^ (value >> 31)
+
+
+def new_deck_seed() -> int:
+    # 31 bits so the seed fits a plain INTEGER column on every database
+    return random.getrandbits(31)
+
+
+class FeistelPermutation:
+    """Keyed bijection of range(size), evaluated one index at a time.
+
+    A balanced Feistel network permutes the smallest even-bit power of two
+    covering `size`, cycle walking maps the values past `size` back inside.
+    Nothing is materialized, so shuffling a deck costs O(1) memory.
+    """
+
+    ROUNDS = 4
+
+    def __init__(self, size: int, key: int):
+        self.size = size
+        bits = max(2, (size - 1).bit_length())
+        self.half_bits = (bits + 1) // 2
+        self.half_mask = (1 << self.half_bits) - 1
+        self.keys = [_mix(_mix(key) + r) for r in range(self.ROUNDS)]
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, index: int) -> int:
+        if not 0 <= index < self.size:
+            raise IndexError(index)
+        value = index
+        while True:
+            value = self._encrypt(value)
+            if value < self.size:
+                return value
+
+    def _encrypt(self, value: int) -> int:
+        left, right = value >> self.half_bits, value & self.half_mask
+        for key in self.keys:
+            left, right = right, left ^ (_mix(right ^ key) & self.half_mask)
+        return (left << self.half_bits) | right
+
+
+class DeckCursor:
+    """Position in a session's private shuffle of a deck.
+
+    The shuffle permutes card ids, not positions in the in-memory deck: it
+    is `seed` plus `max_id`, the highest card id of the deck when the
+    session started. The position is how many ids were dealt, so the whole
+    state is three integers stored on the session and dealing k cards is
+    O(k). No card repeats until the deck is exhausted, every later pass over
+    the deck is shuffled again.
+
+    Ids that are not in the deck, because they never were or because the
+    card was removed or recategorized since, are skipped where they fall and
+    every other card keeps its place. The deal is the same after a card
+    index refresh, a restart or on a worker with another index version.
+    Cards imported after the session started have higher ids and are not
+    part of its deck.
+    """
+
+    def __init__(self, seed: int, max_id: int, offset: int = 0):
+        self.seed = seed
+        self.max_id = max_id
+        self.offset = offset
+
+    def deal(
+        self, count: int, available: int, in_deck: Callable[[int], bool]
+    ) -> List[int]:
+        """Card ids of the next `count` cards, advancing the cursor.
+
+        `available` is how many cards of the deck have an id up to `max_id`,
+        `in_deck` whether an id is one of them.
+        """
+        if count > available:
+            raise ValueError("Not enough cards left in the deck")
+        card_ids: List[int] = []
+        permutation = None
+        while len(card_ids) < count:
+            deck_pass, index = divmod(self.offset, self.max_id)
+            if permutation is None or index == 0:
+                permutation = FeistelPermutation(
+                    self.max_id, (self.seed << 32) | deck_pass
+                )
+            self.offset += 1
+            card_id = permutation[index] + 1
+            # A hand that straddles two passes could otherwise hold a card twice
+            if card_id not in card_ids and in_deck(card_id):
+                card_ids.append(card_id)
+        return card_ids
+
+    def copy(self) -> "DeckCursor":
+        return DeckCursor(self.seed, self.max_id, self.offset)
@@ -1,72 +1,123 @@
 from datetime import datetime, timezone
-from typing import List, Tuple
+from typing import Any, AsyncIterator, List, Optional, Tuple, Union
 
 from sqlmodel import Session, select
+from app.db.database import AnySession, run_db
+from app.metrics import span
 from app.db.models import (
     GameSession,
     GameRound,
-    CardPlay,
     BlackCard,
     WhiteCard,
     AIPersonality,
+    RoundHand,
     User,
 )
+from app.services.ai_precompute import AIPickPrecomputer
 from app.services.anthropic import AnthropicService
 from app.services.card_manager import CardManagerService
+from app.services.deck_cursor import WHITE_DECK_SALT, DeckCursor, new_deck_seed
+from app.services.hand_store import HandStore, encode_hand, get_hand_store
+from app.services.heuristic import (
+    HEURISTIC_ENGINE,
+    HeuristicEngine,
+    get_heuristic_engine,
+)
+from app.services.result_writer import (
+    RoundResult,
+    RoundResultWriter,
+    add_round_results,
+    apply_round_result,
+)
+from app.services.round_prefetch import (
+    PreparedRound,
+    RoundDeal,
+    RoundPrefetcher,
+    cursor_state,
+    get_round_prefetcher,
+    prefetch_key,
+)
+from app.services.shared_state import SharedState, get_shared_state
+
+HAND_SIZE = 10
+
+TIE_VERDICT = ("tie", "The AI and human both played the same cards... so boring")
 
 
 class GameService:
+    """Game flow on top of a sync or async session.
+
+    Every database step is a private method taking a synchronous `Session`
+    and is dispatched through `run_db`, so the same code serves both engines.
+    """
+
     def __init__(
         self,
-        db: Session,
+        db: AnySession,
         anthropic_service: AnthropicService,
         card_manager: CardManagerService,
+        ai_precomputer: Optional[AIPickPrecomputer] = None,
+        hand_store: Optional[HandStore] = None,
+        heuristic_engine: Optional[HeuristicEngine] = None,
+        round_prefetcher: Optional[RoundPrefetcher] = None,
+        shared_state: Optional[SharedState] = None,
+        result_writer: Optional[RoundResultWriter] = None,
     ):
         self.db = db
         self.anthropic_service = anthropic_service
         self.card_manager = card_manager
+        self.ai_precomputer = ai_precomputer
+        self.hand_store = hand_store or get_hand_store()
+        self.heuristic_engine = heuristic_engine or get_heuristic_engine()
+        self.round_prefetcher = round_prefetcher or get_round_prefetcher()
+        self.shared_state = shared_state or get_shared_state()
+        self.result_writer = result_writer
 
     async def create_game_session(
         self, username: str, ai_personality_id: int
     ) -> GameSession:
-        ai_personality = self.db.get(AIPersonality, ai_personality_id)
-        user = self._get_or_make_user_id_by_username(username=username)
-        if not ai_personality:
-            raise ValueError("Invalid AI personality ID")
-
-        game_session = GameSession(user_id=user.id, ai_personality_id=ai_personality_id)
-        self.db.add(game_session)
-        self.db.commit()
-        self.db.refresh(game_session)
-        return game_session
+        with span("game.create_session"):
+            return await run_db(
+                self.db, self._create_game_session, username, ai_personality_id
+            )
 
     async def create_game_round(
         self, game_session_id: int
     ) -> Tuple[GameRound, BlackCard, List[WhiteCard]]:
-        game_session = self.db.get(GameSession, game_session_id)
-        if not game_session:
-            raise ValueError("Invalid game session ID")
+        # The new round starts from the session scores
+        await self._flush_results(game_session_id)
+        prepared = self.round_prefetcher.take(game_session_id)
+        # Rounds of a session are dealt one at a time, two concurrent deals
+        # would read the same deck cursors
+        async with self.shared_state.lock(f"session:{game_session_id}"):
+            with span("game.create_round"):
+                game_round, deal, ai_personality = await run_db(
+                    self.db,
+                    self._create_game_round,
+                    game_session_id,
+                    prepared.deal if prepared is not None else None,
+                )
+        black_card, white_cards = deal.black_card, deal.white_cards
+        self.round_prefetcher.track(game_session_id, deal)
+        self.hand_store.put(game_round.id, [card.id for card in white_cards])
 
-        black_card = self.card_manager.draw_black_card()
+        if prepared is not None and deal is prepared.deal:
+            ai_personality = prepared.ai_personality
+            # The AI pick for a prefetched round is usually already running
+            if self.ai_precomputer is not None and self.ai_precomputer.rekey(
+                prefetch_key(game_session_id), game_round.id
+            ):
+                return game_round, black_card, white_cards
+        elif prepared is not None and self.ai_precomputer is not None:
+            self.ai_precomputer.discard(prefetch_key(game_session_id))
 
-        (
-            previous_round_number,
-            user_score,
-            ai_score,
-        ) = self.get_latest_game_round_information(game_session_id=game_session_id)
-        game_round = GameRound(
-            game_session_id=game_session_id,
-            round_number=previous_round_number + 1,
-            black_card_id=black_card.id,
-            user_score=user_score,
-            ai_score=ai_score,
-            winner=None,
-        )
-        self.db.add(game_round)
-        self.db.commit()
-        self.db.refresh(game_round)
-        self.db.refresh(black_card)
-        white_cards = self.card_manager.draw_white_cards(10)
+        if (
+            self.ai_precomputer is not None
+            and ai_personality.engine != HEURISTIC_ENGINE
+        ):
+            self.ai_precomputer.start(
+                game_round.id, black_card, white_cards, ai_personality
+            )
 
         return game_round, black_card, white_cards
 
@@ -74,127 +125,438 @@ class GameService:
         self,
         round_id: int,
         user_card_ids: List[int],
-        white_card_ids: List[int],
+        white_card_ids: Optional[List[int]] = None,
     ) -> Tuple[GameRound, List[WhiteCard]]:
-        game_round = self._get_round(round_id)
-        black_card = self._get_black_card(game_round.black_card_id)
-        user_cards = self._get_white_cards_from_ids(user_card_ids)
-        white_cards = self._get_white_cards_from_ids(white_card_ids)
+        # Concurrent submits of a round wait for each other here, the later
+        # ones are then rejected as already played
+        async with self.shared_state.lock(f"round:{round_id}"):
+            with span("game.load_submission"):
+                (
+                    game_round,
+                    black_card,
+                    user_cards,
+                    white_cards,
+                    ai_personality,
+                ) = await run_db(
+                    self.db,
+                    self._load_submission,
+                    round_id,
+                    user_card_ids,
+                    white_card_ids,
+                )
 
-        ai_personality = self._get_ai_personality_by_session_id(
-            game_round.game_session_id
+            ai_chosen_cards = await self._choose_ai_cards(
+                round_id, black_card, white_cards, ai_personality
+            )
+            self._prefetch_next_round(game_round.game_session_id, ai_personality)
+            if self._is_tie(user_cards, ai_chosen_cards):
+                winner, explanation = TIE_VERDICT
+            else:
+                engine = self._engine(ai_personality)
+                with span("game.judge"):
+                    winner, explanation = await engine.judge_round(
+                        black_card=black_card,
+                        user_cards=user_cards,
+                        ai_cards=ai_chosen_cards,
+                    )
+
+            with span("game.record_result"):
+                game_round = await self._record_result(
+                    game_round,
+                    ai_personality,
+                    winner,
+                    explanation,
+                    user_cards,
+                    ai_chosen_cards,
+                )
+            self.hand_store.discard(round_id)
+
+            return (game_round, ai_chosen_cards)
+
+    async def stream_submit_game_round(
+        self,
+        round_id: int,
+        user_card_ids: List[int],
+        white_card_ids: Optional[List[int]] = None,
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """Streaming variant of `submit_game_round`.
+
+        Yields ("ai_cards", cards), ("winner", winner), one or more
+        ("explanation", text) chunks and finally ("result", game_round) once
+        the round has been persisted.
+        """
+        async with self.shared_state.lock(f"round:{round_id}"):
+            with span("game.load_submission"):
+                (
+                    game_round,
+                    black_card,
+                    user_cards,
+                    white_cards,
+                    ai_personality,
+                ) = await run_db(
+                    self.db,
+                    self._load_submission,
+                    round_id,
+                    user_card_ids,
+                    white_card_ids,
+                )
+
+            ai_chosen_cards = await self._choose_ai_cards(
+                round_id, black_card, white_cards, ai_personality
+            )
+            self._prefetch_next_round(game_round.game_session_id, ai_personality)
+            yield "ai_cards", ai_chosen_cards
+
+            if self._is_tie(user_cards, ai_chosen_cards):
+                winner, explanation = TIE_VERDICT
+                yield "winner", winner
+                yield "explanation", explanation
+            else:
+                winner, explanation_parts = None, []
+                engine = self._engine(ai_personality)
+                async for event, data in engine.stream_judge_round(
+                    black_card=black_card,
+                    user_cards=user_cards,
+                    ai_cards=ai_chosen_cards,
+                ):
+                    if event == "winner":
+                        winner = data
+                    else:
+                        explanation_parts.append(data)
+                    yield event, data
+                explanation = "".join(explanation_parts)
+
+            with span("game.record_result"):
+                game_round = await self._record_result(
+                    game_round,
+                    ai_personality,
+                    winner,
+                    explanation,
+                    user_cards,
+                    ai_chosen_cards,
+                )
+            self.hand_store.discard(round_id)
+            yield "result", game_round
+
+    async def end_game_session(self, game_session_id: int) -> GameSession:
+        await self._flush_results(game_session_id)
+        game_session = await run_db(self.db, self._end_game_session, game_session_id)
+        self.round_prefetcher.discard(game_session_id)
+        if self.ai_precomputer is not None:
+            self.ai_precomputer.discard(prefetch_key(game_session_id))
+        return game_session
+
+    async def get_latest_game_round_information(
+        self,
+        game_session_id: int,
+    ) -> Tuple[int, int, int]:
+        await self._flush_results(game_session_id)
+        return await run_db(
+            self.db, self._get_latest_game_round_information, game_session_id
+        )
+
+    async def _record_result(
+        self,
+        game_round: GameRound,
+        ai_personality: AIPersonality,
+        winner: str,
+        explanation: str,
+        user_cards: List[WhiteCard],
+        ai_chosen_cards: List[WhiteCard],
+    ) -> GameRound:
+        if winner not in ("human", "ai", "tie"):
+            # Never saved without a verdict, the round would look unplayed
+            raise ValueError(f"No verdict for round {game_round.id}")
+        result = RoundResult(
+            round_id=game_round.id,
+            game_session_id=game_round.game_session_id,
+            ai_personality_id=ai_personality.id,
+            winner=winner,
+            explanation=explanation,
+            completed_at=datetime.now(timezone.utc),
+            user_card_ids=[card.id for card in user_cards],
+            ai_card_ids=[card.id for card in ai_chosen_cards],
+        )
+        if self.result_writer is None:
+            return await run_db(self.db, self._record_round_result, game_round, result)
+        # Answered from memory, the writer persists the result with the next
+        # batch. Detached first so the request session never flushes it
+        if game_round in self.db:
+            self.db.expunge(game_round)
+        apply_round_result(game_round, result)
+        await self.result_writer.submit(result)
+        return game_round
+
+    async def _flush_results(self, game_session_id: int) -> None:
+        """Wait until the session's pending results are in the database."""
+        if self.result_writer is not None:
+            await self.result_writer.flush_session(game_session_id)
+
+    async def _choose_ai_cards(
+        self,
+        round_id: int,
+        black_card: BlackCard,
+        white_cards: List[WhiteCard],
+        ai_personality: AIPersonality,
+    ) -> List[WhiteCard]:
+        engine = self._engine(ai_personality)
+        with span("game.ai_pick"):
+            ai_chosen_cards = None
+            if self.ai_precomputer is not None and engine is self.anthropic_service:
+                ai_chosen_cards = await self.ai_precomputer.consume(
+                    round_id, white_cards
+                )
+            if ai_chosen_cards is None:
+                ai_chosen_cards = await engine.generate_ai_response(
+                    black_card=black_card,
+                    white_cards=white_cards,
+                    ai_personality=ai_personality,
+                )
+            return ai_chosen_cards
+
+    def _deal(
+        self, black_cursor: DeckCursor, white_cursor: DeckCursor
+    ) -> RoundDeal:
+        black_cursor, white_cursor = black_cursor.copy(), white_cursor.copy()
+        dealt_from = cursor_state(black_cursor, white_cursor)
+        black_card = self.card_manager.deal_black_card(black_cursor)
+        white_cards = self.card_manager.deal_white_cards(white_cursor, HAND_SIZE)
+        return RoundDeal(
+            black_card, white_cards, dealt_from, black_cursor, white_cursor
         )
-        ai_chosen_cards = await self.anthropic_service.generate_ai_response(
-            black_card=black_card,
-            white_cards=white_cards,
-            ai_personality=ai_personality,
+
+    def _prefetch_next_round(
+        self, game_session_id: int, ai_personality: AIPersonality
+    ) -> None:
+        """Deal the session's next round while this one is being judged.
+
+        Only sessions whose cursors are already in memory are prefetched, so
+        this never touches the database. Out of cards is left for the next
+        `create_game_round` to report.
+        """
+        session_deck = self.round_prefetcher.get(game_session_id)
+        if session_deck is None or session_deck.prepared is not None:
+            return
+        try:
+            with span("game.prefetch_round"):
+                deal = self._deal(
+                    session_deck.black_cursor, session_deck.white_cursor
+                )
+        except ValueError:
+            return
+        self.round_prefetcher.prepare(
+            game_session_id, PreparedRound(deal, ai_personality)
         )
-        tie = all(
-            [
-                user_card.id == ai_card.id
-                for user_card, ai_card in zip(user_cards, ai_chosen_cards)
-            ]
+        if (
+            self.ai_precomputer is not None
+            and ai_personality.engine != HEURISTIC_ENGINE
+        ):
+            self.ai_precomputer.start(
+                prefetch_key(game_session_id),
+                deal.black_card,
+                deal.white_cards,
+                ai_personality,
+            )
+
+    def _engine(
+        self, ai_personality: AIPersonality
+    ) -> Union[AnthropicService, HeuristicEngine]:
+        if ai_personality.engine == HEURISTIC_ENGINE:
+            return self.heuristic_engine
+        return self.anthropic_service
+
+    @staticmethod
+    def _is_tie(user_cards: List[WhiteCard], ai_cards: List[WhiteCard]) -> bool:
+        return all(
+            [user_card.id == ai_card.id for user_card, ai_card in zip(user_cards, ai_cards)]
         )
-        if tie:
-            winner = "tie"
-            explanation = "The AI and human both played the same cards... so boring"
+
+    def _create_game_session(
+        self, db: Session, username: str, ai_personality_id: int
+    ) -> GameSession:
+        ai_personality = db.get(AIPersonality, ai_personality_id)
+        user = self._get_or_make_user_id_by_username(db, username=username)
+        if not ai_personality:
+            raise ValueError("Invalid AI personality ID")
+
+        game_session = GameSession(user_id=user.id, ai_personality_id=ai_personality_id)
+        db.add(game_session)
+        db.commit()
+        db.refresh(game_session)
+        return game_session
+
+    def _create_game_round(
+        self,
+        db: Session,
+        game_session_id: int,
+        prepared_deal: Optional[RoundDeal] = None,
+    ) -> Tuple[GameRound, RoundDeal, Optional[AIPersonality]]:
+        game_session = db.get(GameSession, game_session_id)
+        if not game_session:
+            raise ValueError("Invalid game session ID")
+
+        black_cursor, white_cursor = self._deck_cursors(game_session)
+        if (
+            prepared_deal is not None
+            and prepared_deal.dealt_from == cursor_state(black_cursor, white_cursor)
+        ):
+            deal = prepared_deal
         else:
-            winner, explanation = await self.anthropic_service.judge_round(
-                black_card=black_card,
-                user_cards=user_cards,
-                ai_cards=ai_chosen_cards,
+            deal = self._deal(black_cursor, white_cursor)
+        game_session.black_cursor = deal.black_cursor.offset
+        game_session.white_cursor = deal.white_cursor.offset
+
+        game_session.current_round += 1
+        game_round = GameRound(
+            game_session_id=game_session_id,
+            round_number=game_session.current_round,
+            black_card_id=deal.black_card.id,
+            user_score=game_session.user_score,
+            ai_score=game_session.ai_score,
+            winner=None,
+        )
+        db.add(game_round)
+        db.flush()
+        db.add(
+            RoundHand(
+                round_id=game_round.id,
+                card_ids=encode_hand([card.id for card in deal.white_cards]),
             )
+        )
+        db.commit()
+
+        ai_personality = None
+        if self.ai_precomputer is not None and deal is not prepared_deal:
+            ai_personality = db.get(AIPersonality, game_session.ai_personality_id)
+        return game_round, deal, ai_personality
+
+    def _deck_cursors(
+        self, game_session: GameSession
+    ) -> Tuple[DeckCursor, DeckCursor]:
+        if game_session.deck_seed is None:
+            # Shuffled on the first round, this also covers sessions started
+            # before decks were per session
+            game_session.deck_seed = new_deck_seed()
+            (
+                game_session.black_deck_max_id,
+                game_session.white_deck_max_id,
+            ) = self.card_manager.deck_max_ids()
+        return (
+            DeckCursor(
+                game_session.deck_seed,
+                game_session.black_deck_max_id,
+                game_session.black_cursor,
+            ),
+            DeckCursor(
+                game_session.deck_seed ^ WHITE_DECK_SALT,
+                game_session.white_deck_max_id,
+                game_session.white_cursor,
+            ),
+        )
 
-        game_round.winner = winner
-        game_round.judge_explanation = explanation
-        if winner == "human":
-            game_round.user_score += 1
-        elif winner == "ai":
-            game_round.ai_score += 1
-
-        for i, (user_card, ai_card) in enumerate(zip(user_cards, ai_chosen_cards)):
-            card_play = CardPlay(
-                round_id=round_id,
-                user_card_id=user_card.id,
-                ai_card_id=ai_card.id,
-                play_order=i,
+    def _load_submission(
+        self,
+        db: Session,
+        round_id: int,
+        user_card_ids: List[int],
+        white_card_ids: Optional[List[int]],
+    ) -> Tuple[GameRound, BlackCard, List[WhiteCard], List[WhiteCard], AIPersonality]:
+        game_round = self._get_round(db, round_id)
+        if game_round.winner is not None or (
+            self.result_writer is not None and self.result_writer.is_pending(round_id)
+        ):
+            raise ValueError(f"Round ID {round_id} was already played")
+        black_card = self._get_black_card(db, game_round.black_card_id)
+        if len(user_card_ids) != black_card.pick:
+            raise ValueError(
+                f"Round ID {round_id} takes {black_card.pick} card(s), "
+                f"got {len(user_card_ids)}"
             )
-            self.db.add(card_play)
+        if len(set(user_card_ids)) != len(user_card_ids):
+            raise ValueError("The same card was submitted more than once")
+
+        # The client sent hand is only used for rounds dealt before hands
+        # were stored server side
+        hand = self.hand_store.get(db, round_id) or white_card_ids
+        if not hand:
+            raise ValueError(f"No hand was dealt for round ID {round_id}")
+        hand_ids = set(hand)
+        for card_id in user_card_ids:
+            if card_id not in hand_ids:
+                raise ValueError(f"Card ID {card_id} is not in the dealt hand")
 
-        self.db.commit()
-        self.db.refresh(game_round)
-        self.db.refresh(black_card)
-        for card in white_cards:
-            self.db.refresh(card)
-        for card in user_cards:
-            self.db.refresh(card)
+        white_cards = self._get_white_cards_from_ids(db, list(hand))
+        cards_by_id = {card.id: card for card in white_cards}
+        user_cards = [cards_by_id[card_id] for card_id in user_card_ids]
 
-        return (game_round, ai_chosen_cards)
+        ai_personality = self._get_ai_personality_by_session_id(
+            db, game_round.game_session_id
+        )
+        return game_round, black_card, user_cards, white_cards, ai_personality
+
+    def _record_round_result(
+        self, db: Session, game_round: GameRound, result: RoundResult
+    ) -> GameRound:
+        # A streaming submit can outlive the request scoped session, merge
+        # re-attaches the round in that case and is a no-op otherwise
+        game_round = db.merge(game_round)
+        apply_round_result(game_round, result)
+        add_round_results(db, [result])
+        db.commit()
+        return game_round
 
-    def end_game_session(self, game_session_id: int) -> GameSession:
-        game_session = self.db.get(GameSession, game_session_id)
+    def _end_game_session(self, db: Session, game_session_id: int) -> GameSession:
+        game_session = db.get(GameSession, game_session_id)
         if not game_session:
             raise ValueError("Invalid game session ID")
 
         game_session.end_time = datetime.now(timezone.utc)
-        self.db.commit()
-        self.db.refresh(game_session)
+        db.commit()
         return game_session
 
-    def _get_or_make_user_id_by_username(self, username: str) -> User:
-        user = self.db.exec(select(User).where(User.username == username)).first()
+    def _get_or_make_user_id_by_username(self, db: Session, username: str) -> User:
+        user = db.exec(select(User).where(User.username == username)).first()
         if not user:
             user = User(username=username)
-            self.db.add(user)
-            self.db.commit()
-            self.db.refresh(user)
+            db.add(user)
+            db.commit()
+            db.refresh(user)
         return user
 
-    def get_latest_game_round_information(
-        self,
-        game_session_id: int,
+    def _get_latest_game_round_information(
+        self, db: Session, game_session_id: int
     ) -> Tuple[int, int, int]:
-        statement = (
-            select(GameRound)
-            .where(GameRound.game_session_id == game_session_id)
-            .order_by(GameRound.round_number.desc())
-            .limit(1)
+        game_session = db.get(GameSession, game_session_id)
+        if not game_session:
+            raise ValueError("Invalid game session ID")
+        return (
+            game_session.current_round,
+            game_session.user_score,
+            game_session.ai_score,
         )
 
-        game_round = self.db.exec(statement).first()
-        if not game_round:
-            return 0, 0, 0
-        return game_round.round_number, game_round.user_score, game_round.ai_score
-
-    def _get_round(self, round_id: int) -> GameRound:
-        game_round = self.db.get(GameRound, round_id)
+    def _get_round(self, db: Session, round_id: int) -> GameRound:
+        game_round = db.get(GameRound, round_id)
         if not game_round:
             raise ValueError("Invalid round ID")
         return game_round
 
-    def _get_black_card(self, black_card_id: int) -> BlackCard:
-        black_card = self.db.get(BlackCard, black_card_id)
-        if not black_card:
-            raise ValueError("Invalid black card ID")
-        return black_card
-
-    def _get_white_cards_from_ids(self, card_ids: List[int]) -> List[WhiteCard]:
-
-        white_cards = []
-        for card_id in card_ids:
-            card = self.db.get(WhiteCard, card_id)
-            if not card:
-                raise ValueError(f"Invalid card ID {card_id}")
-            white_cards.append(card)
+    def _get_black_card(self, db: Session, black_card_id: int) -> BlackCard:
+        return self.card_manager.resolve_black_card(black_card_id, db=db)
 
-        return white_cards
+    def _get_white_cards_from_ids(
+        self, db: Session, card_ids: List[int]
+    ) -> List[WhiteCard]:
+        return self.card_manager.resolve_white_cards(card_ids, db=db)
 
-    def _get_ai_personality_by_session_id(self, game_session_id: int) -> AIPersonality:
+    def _get_ai_personality_by_session_id(
+        self, db: Session, game_session_id: int
+    ) -> AIPersonality:
         # Create a select statement that joins the necessary tables
-        game_session = self.db.get(GameSession, game_session_id)
+        game_session = db.get(GameSession, game_session_id)
         if game_session is None:
             raise ValueError(f"No game session found for ID {game_session_id}")
-        ai_personality = self.db.get(AIPersonality, game_session.ai_personality_id)
+        ai_personality = db.get(AIPersonality, game_session.ai_personality_id)
         if ai_personality is None:
             raise ValueError(
                 f"No AI personality found for game session ID {game_session_id}"
@@ -0,0 +1,58 @@
+import threading
+from collections import OrderedDict
+from typing import Optional, Sequence, Tuple
+
+from sqlmodel import Session
+from app.db.models import RoundHand
+
+Hand = Tuple[int, ...]
+
+
+def encode_hand(card_ids: Sequence[int]) -> str:
+    return ",".join(str(card_id) for card_id in card_ids)
+
+
+def decode_hand(card_ids: str) -> Hand:
+    return tuple(int(card_id) for card_id in card_ids.split(",") if card_id)
+
+
+class HandStore:
+    """Hands dealt to rounds, so submits never have to trust the client.
+
+    Hands are kept in memory for the rounds in play, the `round_hands` table
+    is the fallback for rounds dealt by another worker or before a restart.
+    """
+
+    def __init__(self, max_rounds: int = 10_000):
+        self.max_rounds = max_rounds
+        self._hands: "OrderedDict[int, Hand]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, round_id: int, card_ids: Sequence[int]) -> None:
+        with self._lock:
+            self._hands[round_id] = tuple(card_ids)
+            # Abandoned rounds are never submitted, cap how many we keep around
+            while len(self._hands) > self.max_rounds:
+                self._hands.popitem(last=False)
+
+    def get(self, db: Session, round_id: int) -> Optional[Hand]:
+        with self._lock:
+            hand = self._hands.get(round_id)
+        if hand is None:
+            round_hand = db.get(RoundHand, round_id)
+            if round_hand is None:
+                return None
+            hand = decode_hand(round_hand.card_ids)
+            self.put(round_id, hand)
+        return hand
+
+    def discard(self, round_id: int) -> None:
+        with self._lock:
+            self._hands.pop(round_id, None)
+
+
+_hand_store = HandStore()
+
+
+def get_hand_store() -> HandStore:
+    return _hand_store
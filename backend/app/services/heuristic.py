@@ -0,0 +1,163 @@
+import hashlib
+import re
+from functools import lru_cache
+from typing import AsyncIterator, FrozenSet, List, Sequence, Tuple
+
+from app.db.models import AIPersonality, BlackCard, WhiteCard
+
+HEURISTIC_ENGINE = "heuristic"
+
+WORD = re.compile(r"[^\W\d_]+(?:'[^\W\d_]+)?")
+
+# English and Spanish, the languages of the bundled decks
+STOPWORDS = frozenset(
+    """
+    a an and are as at be by for from has have he her his i in is it its me my
+    of on or our she so that the their them they this to was we were with you
+    your el la los las un una unos unas y o de del al en por para con que se su
+    sus lo le les mi tu es son
+    """.split()
+)
+
+EXPLANATIONS = {
+    "human": (
+        "The human's {winner} lands the joke, the AI's {loser} never stood a chance.",
+        "{winner}? Obviously. I could see that win coming from the first word.",
+        "Even a judge this brilliant has to admit {winner} beats {loser}.",
+    ),
+    "ai": (
+        "{winner} is exactly the kind of genius I expect from a fellow machine.",
+        "The AI's {winner} wipes the floor with the human's {loser}.",
+        "{winner}. Sorry human, {loser} was never going to cut it.",
+    ),
+}
+
+
+def _words(text: str) -> List[str]:
+    return [word for word in WORD.findall(text.lower()) if word not in STOPWORDS]
+
+
+@lru_cache(maxsize=4096)
+def _keywords(text: str) -> FrozenSet[str]:
+    return frozenset(_words(text))
+
+
+def _stable_fraction(*parts: str) -> float:
+    digest = hashlib.blake2b("\x1f".join(parts).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2**64
+
+
+def score_card(
+    black_card: BlackCard,
+    white_card: WhiteCard,
+    personality_keywords: FrozenSet[str] = frozenset(),
+) -> float:
+    """Lexical humor score of `white_card` as an answer to `black_card`.
+
+    Rewards specific answers (several content words, proper nouns, long rare
+    looking words), callbacks to the black card and words that match the
+    personality, and penalizes rambling. A stable hash breaks ties, so the
+    same cards always get the same score.
+    """
+    text = white_card.text
+    words = _words(text)
+    keywords = frozenset(words)
+
+    score = min(len(keywords), 6) * 0.5
+    score += sum(len(word) >= 8 for word in words) * 0.4
+    score += sum(token[:1].isupper() for token in text.split()[1:]) * 0.3
+    score += len(keywords & _keywords(black_card.text)) * 0.8
+    score += len(keywords & personality_keywords) * 0.6
+    if len(words) > 12:
+        score -= (len(words) - 12) * 0.2
+    return score + _stable_fraction(black_card.text, text) * 0.1
+
+
+class HeuristicEngine:
+    """Local stand-in for `AnthropicService`: same player and judge methods,
+    answered by lexical scoring in well under a millisecond.
+
+    Used for personalities whose engine is "heuristic", when AI_ENGINE
+    forces it for every game, and as the fallback when the remote model
+    fails. It needs no network, so it also serves load tests and degraded
+    mode.
+    """
+
+    model = HEURISTIC_ENGINE
+
+    async def generate_ai_response(
+        self,
+        black_card: BlackCard,
+        white_cards: List[WhiteCard],
+        ai_personality: AIPersonality,
+    ) -> List[WhiteCard]:
+        return self.pick(black_card, white_cards, ai_personality)
+
+    async def judge_round(
+        self,
+        black_card: BlackCard,
+        user_cards: List[WhiteCard],
+        ai_cards: List[WhiteCard],
+    ) -> Tuple[str, str]:
+        return self.judge(black_card, user_cards, ai_cards)
+
+    async def stream_judge_round(
+        self,
+        black_card: BlackCard,
+        user_cards: List[WhiteCard],
+        ai_cards: List[WhiteCard],
+    ) -> AsyncIterator[Tuple[str, str]]:
+        winner, explanation = self.judge(black_card, user_cards, ai_cards)
+        yield "winner", winner
+        yield "explanation", explanation
+
+    def pick(
+        self,
+        black_card: BlackCard,
+        white_cards: Sequence[WhiteCard],
+        ai_personality: AIPersonality,
+    ) -> List[WhiteCard]:
+        personality_keywords = _keywords(ai_personality.description or "")
+        ranked = sorted(
+            white_cards,
+            key=lambda card: score_card(black_card, card, personality_keywords),
+            reverse=True,
+        )
+        return ranked[: black_card.pick]
+
+    def judge(
+        self,
+        black_card: BlackCard,
+        user_cards: Sequence[WhiteCard],
+        ai_cards: Sequence[WhiteCard],
+    ) -> Tuple[str, str]:
+        user_score = self._answer_score(black_card, user_cards)
+        ai_score = self._answer_score(black_card, ai_cards)
+        # The house favors the human on an exact draw
+        if ai_score > user_score:
+            winner, winning_cards, losing_cards = "ai", ai_cards, user_cards
+        else:
+            winner, winning_cards, losing_cards = "human", user_cards, ai_cards
+
+        winning_text = self._quote(winning_cards)
+        losing_text = self._quote(losing_cards)
+        templates = EXPLANATIONS[winner]
+        template = templates[
+            int(_stable_fraction(black_card.text, winning_text) * len(templates))
+        ]
+        return winner, template.format(winner=winning_text, loser=losing_text)
+
+    @staticmethod
+    def _quote(cards: Sequence[WhiteCard]) -> str:
+        return " / ".join(f'"{card.text.strip().rstrip(".")}"' for card in cards)
+
+    @staticmethod
+    def _answer_score(black_card: BlackCard, cards: Sequence[WhiteCard]) -> float:
+        if not cards:
+            return 0.0
+        return sum(score_card(black_card, card) for card in cards) / len(cards)
+
+
+@lru_cache()
+def get_heuristic_engine() -> HeuristicEngine:
+    return HeuristicEngine()
@@ -0,0 +1,137 @@
+import asyncio
+import json
+import logging
+from typing import TYPE_CHECKING, List, Optional, Set, Tuple
+
+from app.db.models import BlackCard, WhiteCard
+from app.metrics import span
+from app.services import prompts
+
+if TYPE_CHECKING:
+    from app.services.anthropic import AnthropicService
+
+logger = logging.getLogger(__name__)
+
+Verdict = Tuple[str, str]
+
+
+class PendingJudgement:
+    def __init__(
+        self,
+        black_card: BlackCard,
+        user_cards: List[WhiteCard],
+        ai_cards: List[WhiteCard],
+    ):
+        self.black_card = black_card
+        self.user_cards = user_cards
+        self.ai_cards = ai_cards
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class JudgeBatcher:
+    """Micro-batches judge requests from concurrent games into one model call.
+
+    Requests are collected for at most `window_ms` milliseconds or until
+    `max_size` are waiting, then judged with a single multi-verdict prompt.
+    Any round the batch answer does not cover is judged on its own.
+    """
+
+    def __init__(
+        self, anthropic_service: "AnthropicService", window_ms: int, max_size: int
+    ):
+        self.anthropic_service = anthropic_service
+        self.window = window_ms / 1000
+        self.max_size = max_size
+        self._pending: List[PendingJudgement] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes: Set[asyncio.Task] = set()
+
+    async def judge(
+        self,
+        black_card: BlackCard,
+        user_cards: List[WhiteCard],
+        ai_cards: List[WhiteCard],
+    ) -> Verdict:
+        judgement = PendingJudgement(black_card, user_cards, ai_cards)
+        self._pending.append(judgement)
+        if len(self._pending) >= self.max_size:
+            self._schedule_flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(
+                self.window, self._schedule_flush
+            )
+        return await judgement.future
+
+    def _schedule_flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._flush(batch))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch: List[PendingJudgement]) -> None:
+        # Callers that gave up while the batch was collecting are not judged
+        batch = [judgement for judgement in batch if not judgement.future.done()]
+        verdicts: List[Optional[Verdict]] = [None] * len(batch)
+        if len(batch) > 1:
+            try:
+                verdicts = await self.anthropic_service.resilience.call(
+                    "judge_batch",
+                    lambda: self._judge_batch(batch),
+                    deadline=self.anthropic_service.judge_deadline,
+                )
+            except Exception:
+                logger.exception(
+                    "Batched judge call failed, judging %d rounds one by one",
+                    len(batch),
+                )
+
+        await asyncio.gather(
+            *[
+                self._resolve(judgement, verdict)
+                for judgement, verdict in zip(batch, verdicts)
+            ]
+        )
+
+    async def _resolve(
+        self, judgement: PendingJudgement, verdict: Optional[Verdict]
+    ) -> None:
+        if judgement.future.done():
+            return
+        try:
+            if verdict is None:
+                verdict = await self.anthropic_service._judge_single(
+                    judgement.black_card, judgement.user_cards, judgement.ai_cards
+                )
+        except Exception as e:
+            if not judgement.future.done():
+                judgement.future.set_exception(e)
+        else:
+            # The caller may have been cancelled while the round was judged
+            if not judgement.future.done():
+                judgement.future.set_result(verdict)
+
+    async def _judge_batch(
+        self, batch: List[PendingJudgement]
+    ) -> List[Optional[Verdict]]:
+        with span("anthropic.judge_batch"):
+            response = await self.anthropic_service._create_message(
+                prompts.judge_batch_message(
+                    [(j.black_card, j.user_cards, j.ai_cards) for j in batch]
+                ),
+                max_tokens=150 * len(batch),
+                system=prompts.judge_batch_system(),
+            )
+        text = response.content[0].text
+        answers = json.loads(text[text.index("[") : text.rindex("]") + 1])
+
+        verdicts: List[Optional[Verdict]] = [None] * len(batch)
+        for answer in answers:
+            position = int(answer.get("round", 0)) - 1
+            winner = str(answer.get("winner", "")).lower()
+            if 0 <= position < len(batch) and winner in ("human", "ai"):
+                verdicts[position] = (winner, str(answer.get("explanation", "")))
+        return verdicts
@@ -0,0 +1,173 @@
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import delete, text, tuple_
+from sqlmodel import Session, select
+
+from app.db.models import AIPersonality, CardStats, PersonalityStats, WhiteCard
+
+# (wins, id) of the last row of the previous page
+Cursor = Tuple[int, int]
+
+# Same ON CONFLICT syntax on SQLite and PostgreSQL. Plain text, so the
+# statement is not compiled again for every round
+RECORD_CARD = text("""
+    INSERT INTO card_stats (card_id, plays, wins) VALUES (:card_id, :plays, :wins)
+    ON CONFLICT (card_id) DO UPDATE SET
+        plays = card_stats.plays + excluded.plays,
+        wins = card_stats.wins + excluded.wins
+""")
+
+RECORD_PERSONALITY = text("""
+    INSERT INTO personality_stats (ai_personality_id, wins, losses, ties)
+    VALUES (:ai_personality_id, :wins, :losses, :ties)
+    ON CONFLICT (ai_personality_id) DO UPDATE SET
+        wins = personality_stats.wins + excluded.wins,
+        losses = personality_stats.losses + excluded.losses,
+        ties = personality_stats.ties + excluded.ties
+""")
+
+REBUILD_CARD_STATS = """
+    INSERT INTO card_stats (card_id, plays, wins)
+    SELECT card_id, COUNT(*), SUM(won)
+    FROM (
+        SELECT cp.user_card_id AS card_id,
+               CASE WHEN r.winner = 'human' THEN 1 ELSE 0 END AS won
+        FROM card_plays AS cp JOIN game_rounds AS r ON r.id = cp.round_id
+        WHERE r.winner IS NOT NULL
+        UNION ALL
+        SELECT cp.ai_card_id AS card_id,
+               CASE WHEN r.winner = 'ai' THEN 1 ELSE 0 END AS won
+        FROM card_plays AS cp JOIN game_rounds AS r ON r.id = cp.round_id
+        WHERE r.winner IS NOT NULL
+    ) AS played
+    GROUP BY card_id
+"""
+
+REBUILD_PERSONALITY_STATS = """
+    INSERT INTO personality_stats (ai_personality_id, wins, losses, ties)
+    SELECT s.ai_personality_id,
+           SUM(CASE WHEN r.winner = 'ai' THEN 1 ELSE 0 END),
+           SUM(CASE WHEN r.winner = 'human' THEN 1 ELSE 0 END),
+           SUM(CASE WHEN r.winner = 'tie' THEN 1 ELSE 0 END)
+    FROM game_rounds AS r JOIN game_sessions AS s ON s.id = r.game_session_id
+    WHERE r.winner IS NOT NULL
+    GROUP BY s.ai_personality_id
+"""
+
+
+def encode_cursor(cursor: Cursor) -> str:
+    return f"{cursor[0]}:{cursor[1]}"
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    try:
+        wins, row_id = cursor.split(":")
+        return int(wins), int(row_id)
+    except ValueError:
+        raise ValueError(f"Invalid leaderboard cursor {cursor!r}") from None
+
+
+# (ai_personality_id, winner, user card ids, ai card ids) of a judged round
+PlayedRound = Tuple[int, str, Sequence[int], Sequence[int]]
+
+
+def record_rounds(db: Session, rounds: Iterable[PlayedRound]) -> None:
+    """Count judged rounds, in the caller's transaction. Counts are summed
+    first, so a batch of rounds costs two statements."""
+    plays, wins = Counter(), Counter()
+    personalities: Dict[int, Counter] = defaultdict(Counter)
+    for ai_personality_id, winner, user_card_ids, ai_card_ids in rounds:
+        for side, card_ids in (("human", user_card_ids), ("ai", ai_card_ids)):
+            for card_id in card_ids:
+                plays[card_id] += 1
+                wins[card_id] += winner == side
+        personalities[ai_personality_id][winner] += 1
+    if plays:
+        db.exec(
+            RECORD_CARD,
+            params=[
+                {"card_id": card_id, "plays": plays[card_id], "wins": wins[card_id]}
+                for card_id in sorted(plays)
+            ],
+        )
+    if personalities:
+        db.exec(
+            RECORD_PERSONALITY,
+            params=[
+                {
+                    "ai_personality_id": ai_personality_id,
+                    "wins": winners["ai"],
+                    "losses": winners["human"],
+                    "ties": winners["tie"],
+                }
+                for ai_personality_id, winners in sorted(personalities.items())
+            ],
+        )
+
+
+def _page(db: Session, model, id_column, target, limit: int, after: Optional[Cursor]):
+    """Rows by wins, most first, ties by id, newest first, each with the
+    `target` row it counts. Keyset paginated with a row-value cursor: the page
+    is read backwards off the (wins, id) index, no sort, so every page costs
+    the same however deep it is. Stats of a card or personality that no
+    longer exists are left out by the join."""
+    query = select(model, target).join(target, target.id == id_column)
+    if after is not None:
+        query = query.where(tuple_(model.wins, id_column) < tuple_(*after))
+    return db.exec(
+        query.order_by(model.wins.desc(), id_column.desc()).limit(limit)
+    ).all()
+
+
+def card_leaderboard(
+    db: Session, limit: int, after: Optional[Cursor] = None
+) -> List[Tuple[CardStats, WhiteCard]]:
+    return _page(db, CardStats, CardStats.card_id, WhiteCard, limit, after)
+
+
+def personality_leaderboard(
+    db: Session, limit: int, after: Optional[Cursor] = None
+) -> List[Tuple[PersonalityStats, AIPersonality]]:
+    return _page(
+        db,
+        PersonalityStats,
+        PersonalityStats.ai_personality_id,
+        AIPersonality,
+        limit,
+        after,
+    )
+
+
+def rebuild(db: Session) -> Tuple[int, int]:
+    """Recount every stat from the played rounds, e.g. for rounds played
+    before the stats existed. Returns the number of cards and personalities."""
+    db.exec(delete(CardStats))
+    db.exec(delete(PersonalityStats))
+    db.exec(text(REBUILD_CARD_STATS))
+    db.exec(text(REBUILD_PERSONALITY_STATS))
+    db.commit()
+    return (
+        len(db.exec(select(CardStats.card_id)).all()),
+        len(db.exec(select(PersonalityStats.ai_personality_id)).all()),
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+
+    from app.db.database import create_db_and_tables, open_session, run_db
+
+    parser = argparse.ArgumentParser(
+        description="Rebuild the card and personality leaderboards from played rounds"
+    )
+    parser.parse_args()
+
+    async def main():
+        await create_db_and_tables()
+        async with open_session() as db:
+            cards, personalities = await run_db(db, rebuild)
+        print(f"Leaderboards rebuilt: {cards} cards, {personalities} personalities")
+
+    asyncio.run(main())
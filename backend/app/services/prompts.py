@@ -0,0 +1,169 @@
+"""Prompt templates for the AI player and the judge.
+
+Everything that does not change between calls lives in the system prompt,
+rendered once and marked with `cache_control` so the provider can reuse the
+prefix. The per-round message only carries the cards, one `id|text` line per
+white card.
+
+Prefixes shorter than the model's minimum cacheable length are simply not
+cached, the marker costs nothing in that case.
+
+Print the token count of every template with:
+
+    python -m app.services.prompts [--api]
+
+`--api` asks the Anthropic token counting endpoint, otherwise the count is
+estimated locally.
+"""
+
+from functools import lru_cache
+from typing import Dict, List, Sequence, Tuple
+
+from app.db.models import AIPersonality, BlackCard, WhiteCard
+
+SystemPrompt = List[Dict[str, object]]
+
+PICK_INSTRUCTIONS = """You are playing Cards Against Humanity with the personality described below.
+Each turn you get the black card and your hand, one white card per line as id|text.
+Choose the funniest white cards to play, staying in character. Avoid inappropriate content.
+Answer with the ids of the chosen cards only, separated by commas and in play order, e.g. 2,5. No other text."""
+
+JUDGE_INSTRUCTIONS = """You are the judge in a game similar to Cards Against Humanity.
+Determine the winner based on which answer is funnier or more fitting.
+Provide a very brief explanation for your decision and be cocky.
+Return your response in the format: "Winner: [human/ai]\nExplanation: [Your explanation here]\""""
+
+JUDGE_BATCH_INSTRUCTIONS = """You are the judge in independent rounds of a game similar to Cards Against Humanity.
+For every round, determine the winner based on which answer is funnier or more fitting.
+Provide a very brief explanation for each decision and be cocky.
+Return only a JSON array with one object per round, in order:
+[{"round": 1, "winner": "human or ai", "explanation": "Your explanation here"}]"""
+
+
+def _cached_system(text: str) -> SystemPrompt:
+    return [{"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}]
+
+
+def _compact(text: str) -> str:
+    return " ".join(text.split())
+
+
+def _answer(cards: Sequence[WhiteCard]) -> str:
+    return " / ".join(_compact(card.text) for card in cards)
+
+
+@lru_cache(maxsize=256)
+def _pick_system_text(personality_description: str) -> str:
+    return f"{PICK_INSTRUCTIONS}\n\nYour personality: {_compact(personality_description)}"
+
+
+def pick_system(ai_personality: AIPersonality) -> SystemPrompt:
+    return _cached_system(_pick_system_text(ai_personality.description or ""))
+
+
+def pick_message(black_card: BlackCard, white_cards: Sequence[WhiteCard]) -> str:
+    hand = "\n".join(f"{card.id}|{_compact(card.text)}" for card in white_cards)
+    return (
+        f"Black card: {_compact(black_card.text)}\n"
+        f"Choose the funniest {black_card.pick}.\n{hand}"
+    )
+
+
+def judge_system() -> SystemPrompt:
+    return _cached_system(JUDGE_INSTRUCTIONS)
+
+
+def judge_message(
+    black_card: BlackCard,
+    user_cards: Sequence[WhiteCard],
+    ai_cards: Sequence[WhiteCard],
+) -> str:
+    return (
+        f"Black card: {_compact(black_card.text)}\n"
+        f"Human: {_answer(user_cards)}\n"
+        f"AI: {_answer(ai_cards)}"
+    )
+
+
+def judge_batch_system() -> SystemPrompt:
+    return _cached_system(JUDGE_BATCH_INSTRUCTIONS)
+
+
+def judge_batch_message(
+    rounds: Sequence[Tuple[BlackCard, Sequence[WhiteCard], Sequence[WhiteCard]]],
+) -> str:
+    return "\n".join(
+        f"{i}. Black card: {_compact(black_card.text)} | "
+        f"Human: {_answer(user_cards)} | AI: {_answer(ai_cards)}"
+        for i, (black_card, user_cards, ai_cards) in enumerate(rounds, start=1)
+    )
+
+
+def _sample_prompts() -> Dict[str, Tuple[SystemPrompt, str]]:
+    black_card = BlackCard(
+        id=1, text="What's that smell? ____.", pick=1, watermark="", language="EN"
+    )
+    white_cards = [
+        WhiteCard(id=1000 + i, text=f"A sample white card number {i}.", language="EN")
+        for i in range(10)
+    ]
+    personality = AIPersonality(
+        name="Sarcastic Susan",
+        description="A quick-witted, dry-humored AI that always has a snarky comment ready.",
+    )
+    user_cards, ai_cards = white_cards[:1], white_cards[1:2]
+    return {
+        "pick": (pick_system(personality), pick_message(black_card, white_cards)),
+        "judge": (judge_system(), judge_message(black_card, user_cards, ai_cards)),
+        "judge_batch (8 rounds)": (
+            judge_batch_system(),
+            judge_batch_message([(black_card, user_cards, ai_cards)] * 8),
+        ),
+    }
+
+
+def _estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for English text
+    return max(1, round(len(text) / 4))
+
+
+def token_report(use_api: bool = False) -> None:
+    count = _estimate_tokens
+    if use_api:
+        import anthropic
+
+        from app.config import get_settings
+
+        settings = get_settings()
+        client = anthropic.Anthropic(
+            api_key=settings.ANTHROPIC_API_KEY, base_url=settings.ANTHROPIC_BASE_URL
+        )
+
+        def count_with_api(text: str) -> int:
+            return client.messages.count_tokens(
+                model=settings.ANTHROPIC_MODEL,
+                messages=[{"role": "user", "content": text}],
+            ).input_tokens
+
+        count = count_with_api
+
+    print(f"{'template':24} {'system':>8} {'message':>8} {'total':>8}")
+    for name, (system, message) in _sample_prompts().items():
+        system_tokens = count(system[0]["text"])
+        message_tokens = count(message)
+        print(
+            f"{name:24} {system_tokens:>8} {message_tokens:>8} "
+            f"{system_tokens + message_tokens:>8}"
+        )
+    if not use_api:
+        print("Estimated at ~4 characters per token, pass --api for exact counts")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Token count per prompt template")
+    parser.add_argument(
+        "--api", action="store_true", help="Count with the Anthropic API"
+    )
+    token_report(parser.parse_args().api)
@@ -0,0 +1,286 @@
+import asyncio
+import time
+from collections import deque
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Set,
+    TypeVar,
+)
+
+from app.config import Settings
+from app.metrics import registry
+
+T = TypeVar("T")
+
+BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the model while the circuit is open."""
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failed calls.
+
+    While open every call is short-circuited. After `reset_timeout` seconds a
+    single probe call is let through (half open): success closes the circuit,
+    failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self._set_state("half_open")
+        if self.state == "half_open":
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def release(self) -> None:
+        """Give back a half open probe that ended without an outcome."""
+        self._probing = False
+
+    def record_success(self) -> None:
+        self.consecutive_failures = 0
+        self._probing = False
+        self._set_state("closed")
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        self._probing = False
+        if (
+            self.state == "half_open"
+            or self.consecutive_failures >= self.failure_threshold
+        ):
+            self.opened_at = time.monotonic()
+            self._set_state("open")
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        registry.set(
+            "caai_model_circuit_state",
+            BREAKER_STATES[state],
+            help="Model circuit breaker state, 0 closed, 1 half open, 2 open",
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "open_for_s": (
+                max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+                if self.state == "open"
+                else 0.0
+            ),
+        }
+
+
+class RetryBudget:
+    """Caps retries and hedges at `ratio` of the calls of the last `window`
+    seconds, plus `min_retries` so a quiet service can still retry.
+
+    Extra attempts then never multiply the load on a provider that is
+    already struggling.
+    """
+
+    def __init__(self, ratio: float, min_retries: int, window: float = 10.0):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._calls: Deque[float] = deque()
+        self._retries: Deque[float] = deque()
+
+    def record_call(self) -> None:
+        self._calls.append(time.monotonic())
+
+    def try_spend(self) -> bool:
+        self._expire()
+        if len(self._retries) >= self.available():
+            return False
+        self._retries.append(time.monotonic())
+        return True
+
+    def available(self) -> int:
+        return self.min_retries + int(len(self._calls) * self.ratio)
+
+    def _expire(self) -> None:
+        horizon = time.monotonic() - self.window
+        for events in (self._calls, self._retries):
+            while events and events[0] < horizon:
+                events.popleft()
+
+    def stats(self) -> Dict[str, Any]:
+        self._expire()
+        return {
+            "calls": len(self._calls),
+            "retries": len(self._retries),
+            "available": self.available(),
+        }
+
+
+class LatencyTracker:
+    """Rolling p95 of successful call latencies, per kind of call."""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self.size = size
+        self.min_samples = min_samples
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def observe(self, name: str, seconds: float) -> None:
+        self._samples.setdefault(name, deque(maxlen=self.size)).append(seconds)
+
+    def names(self) -> List[str]:
+        return list(self._samples)
+
+    def p95(self, name: str) -> Optional[float]:
+        samples = self._samples.get(name)
+        if samples is None or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+
+class ResiliencePolicy:
+    """Deadline, hedging, retry budget and circuit breaker around model calls.
+
+    `call` runs `attempt()` with a hard deadline. When it is still running
+    past the observed p95 a duplicate (hedged) attempt is started and the
+    first success wins. Failed attempts are retried while time and the retry
+    budget allow. Sustained failure opens the circuit, and callers then get
+    `CircuitOpenError` right away so they can switch to their fallback.
+    """
+
+    def __init__(
+        self,
+        breaker: CircuitBreaker,
+        budget: RetryBudget,
+        hedging: bool = True,
+        min_hedge_delay: float = 0.25,
+        max_attempts: int = 3,
+    ):
+        self.breaker = breaker
+        self.budget = budget
+        self.hedging = hedging
+        self.min_hedge_delay = min_hedge_delay
+        self.max_attempts = max_attempts
+        self.latency = LatencyTracker()
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "ResiliencePolicy":
+        return cls(
+            CircuitBreaker(
+                failure_threshold=settings.ANTHROPIC_BREAKER_FAILURES,
+                reset_timeout=settings.ANTHROPIC_BREAKER_RESET_S,
+            ),
+            RetryBudget(
+                ratio=settings.ANTHROPIC_RETRY_BUDGET_RATIO,
+                min_retries=settings.ANTHROPIC_RETRY_BUDGET_MIN,
+            ),
+            hedging=settings.ANTHROPIC_HEDGING,
+            min_hedge_delay=settings.ANTHROPIC_HEDGE_MIN_DELAY_MS / 1000,
+        )
+
+    async def call(
+        self, name: str, attempt: Callable[[], Awaitable[T]], deadline: float
+    ) -> T:
+        if not self.breaker.allow():
+            self._record(name, "short_circuit")
+            raise CircuitOpenError(f"Model circuit is open, {name} call skipped")
+
+        self.budget.record_call()
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(self._race(name, attempt), deadline)
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        except asyncio.TimeoutError:
+            self.breaker.record_failure()
+            self._record(name, "timeout")
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            self._record(name, "failure")
+            raise
+        self.breaker.record_success()
+        self.latency.observe(name, time.perf_counter() - started)
+        self._record(name, "success")
+        return result
+
+    def hedge_delay(self, name: str) -> Optional[float]:
+        if not self.hedging:
+            return None
+        p95 = self.latency.p95(name)
+        return None if p95 is None else max(self.min_hedge_delay, p95)
+
+    async def _race(self, name: str, attempt: Callable[[], Awaitable[T]]) -> T:
+        pending: Set[asyncio.Task] = {asyncio.ensure_future(attempt())}
+        attempts = 1
+        hedge_delay = self.hedge_delay(name)
+        last_error: Optional[BaseException] = None
+        try:
+            while True:
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=hedge_delay if attempts < self.max_attempts else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    last_error = task.exception()
+
+                if done and pending:
+                    # Another attempt is still in flight, wait for it
+                    continue
+                kind = "hedge" if not done else "retry"
+                if attempts < self.max_attempts and self.budget.try_spend():
+                    pending.add(asyncio.ensure_future(attempt()))
+                    attempts += 1
+                    registry.inc(
+                        "caai_model_extra_attempts_total",
+                        help="Hedged and retried model attempts",
+                        call=name,
+                        kind=kind,
+                    )
+                elif not pending:
+                    raise last_error
+                else:
+                    # Out of budget, stop hedging and wait for the slow attempt
+                    hedge_delay = None
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _record(self, name: str, outcome: str) -> None:
+        registry.inc(
+            "caai_model_calls_total",
+            help="Model calls by outcome",
+            call=name,
+            outcome=outcome,
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "circuit": self.breaker.stats(),
+            "retry_budget": self.budget.stats(),
+            "hedge_delay_s": {
+                name: self.hedge_delay(name) for name in self.latency.names()
+            },
+        }
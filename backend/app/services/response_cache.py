@@ -0,0 +1,135 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.config import Settings
+from app.metrics import registry
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.split()).lower()
+
+
+def make_cache_key(kind: str, model: str, payload: Any) -> str:
+    raw = json.dumps(
+        [kind, model, payload], sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    return f"{kind}:{hashlib.sha256(raw.encode()).hexdigest()}"
+
+
+class ResponseCache:
+    """Content-addressed cache for model answers.
+
+    Values must be JSON serializable so every backend can store them.
+    """
+
+    backend = "none"
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = await self._get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        registry.inc(
+            "caai_response_cache_requests_total",
+            help="Response cache lookups",
+            kind=key.split(":", 1)[0],
+            result="miss" if value is None else "hit",
+        )
+        return value
+
+    async def set(self, key: str, value: Any) -> None:
+        await self._set(key, value)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "backend": self.backend,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+    async def _get(self, key: str) -> Optional[Any]:
+        return None
+
+    async def _set(self, key: str, value: Any) -> None:
+        return None
+
+
+class InMemoryResponseCache(ResponseCache):
+    backend = "memory"
+
+    def __init__(self, max_entries: int, ttl: int):
+        super().__init__()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def _get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    async def _set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class RedisResponseCache(ResponseCache):
+    """Redis backed cache; LRU eviction is delegated to the server's
+    ``maxmemory-policy allkeys-lru``, entries expire after ``ttl`` seconds."""
+
+    backend = "redis"
+
+    def __init__(self, redis_client, ttl: int, prefix: str = "caai:response:"):
+        super().__init__()
+        self.redis = redis_client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    async def _get(self, key: str) -> Optional[Any]:
+        raw = await self.redis.get(self.prefix + key)
+        return None if raw is None else json.loads(raw)
+
+    async def _set(self, key: str, value: Any) -> None:
+        await self.redis.set(self.prefix + key, json.dumps(value), ex=self.ttl)
+
+
+def make_response_cache(settings: Settings) -> ResponseCache:
+    backend = settings.RESPONSE_CACHE_BACKEND or (
+        "redis" if settings.SHARED_STATE == "redis" else "memory"
+    )
+    if backend == "memory":
+        return InMemoryResponseCache(
+            max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+            ttl=settings.RESPONSE_CACHE_TTL,
+        )
+    if backend == "redis":
+        from app.services.shared_state import get_redis_client
+
+        return RedisResponseCache(
+            get_redis_client(settings.REDIS_URL), ttl=settings.RESPONSE_CACHE_TTL
+        )
+    if backend == "none":
+        return ResponseCache()
+    raise ValueError(f"Unknown RESPONSE_CACHE_BACKEND {backend!r}")
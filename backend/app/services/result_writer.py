@@ -0,0 +1,383 @@
+import asyncio
+import json
+import logging
+import os
+from collections import Counter, defaultdict
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from sqlalchemy import DateTime, bindparam, text
+from sqlmodel import Session, select
+
+from app.config import get_settings
+from app.db.database import open_session, run_db
+from app.db.models import GameRound
+from app.metrics import registry
+from app.services.leaderboard import record_rounds
+
+logger = logging.getLogger(__name__)
+
+RECORD_ROUND = text("""
+    UPDATE game_rounds SET
+        winner = :winner,
+        judge_explanation = :explanation,
+        completed_at = :completed_at,
+        user_score = user_score + :user_points,
+        ai_score = ai_score + :ai_points
+    WHERE id = :round_id
+""").bindparams(bindparam("completed_at", type_=DateTime))
+
+ADD_SESSION_POINTS = text("""
+    UPDATE game_sessions SET
+        user_score = user_score + :user_points,
+        ai_score = ai_score + :ai_points
+    WHERE id = :game_session_id
+""")
+
+ADD_CARD_PLAYS = text("""
+    INSERT INTO card_plays (round_id, user_card_id, ai_card_id, play_order)
+    VALUES (:round_id, :user_card_id, :ai_card_id, :play_order)
+""")
+
+
+class RoundResult:
+    """Everything needed to persist a judged round, and to replay it."""
+
+    def __init__(
+        self,
+        round_id: int,
+        game_session_id: int,
+        ai_personality_id: int,
+        winner: str,
+        explanation: str,
+        completed_at: datetime,
+        user_card_ids: List[int],
+        ai_card_ids: List[int],
+    ):
+        self.round_id = round_id
+        self.game_session_id = game_session_id
+        self.ai_personality_id = ai_personality_id
+        self.winner = winner
+        self.explanation = explanation
+        self.completed_at = completed_at
+        # Played in pairs, a card play per pair
+        played = min(len(user_card_ids), len(ai_card_ids))
+        self.user_card_ids = user_card_ids[:played]
+        self.ai_card_ids = ai_card_ids[:played]
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "round_id": self.round_id,
+                "game_session_id": self.game_session_id,
+                "ai_personality_id": self.ai_personality_id,
+                "winner": self.winner,
+                "explanation": self.explanation,
+                "completed_at": self.completed_at.isoformat(),
+                "user_card_ids": self.user_card_ids,
+                "ai_card_ids": self.ai_card_ids,
+            }
+        )
+
+    @classmethod
+    def from_json(cls, line: str) -> "RoundResult":
+        data = json.loads(line)
+        data["completed_at"] = datetime.fromisoformat(data["completed_at"])
+        return cls(**data)
+
+
+def apply_round_result(game_round: GameRound, result: RoundResult) -> None:
+    """Set the verdict and the new scores on the round, in memory only."""
+    game_round.winner = result.winner
+    game_round.judge_explanation = result.explanation
+    game_round.completed_at = result.completed_at
+    if result.winner == "human":
+        game_round.user_score += 1
+    elif result.winner == "ai":
+        game_round.ai_score += 1
+
+
+def add_round_results(db: Session, results: List[RoundResult]) -> None:
+    """Add the session scores, card plays and leaderboard counts of judged
+    rounds to the caller's transaction. The rounds are updated by the caller."""
+    points: Dict[int, Counter] = defaultdict(Counter)
+    for result in results:
+        if result.winner in ("human", "ai"):
+            points[result.game_session_id][result.winner] += 1
+    if points:
+        # Incremented in SQL so concurrent submits on a session cannot lose a point
+        db.exec(
+            ADD_SESSION_POINTS,
+            params=[
+                {
+                    "game_session_id": game_session_id,
+                    "user_points": winners["human"],
+                    "ai_points": winners["ai"],
+                }
+                for game_session_id, winners in sorted(points.items())
+            ],
+        )
+    card_plays = [
+        {
+            "round_id": result.round_id,
+            "user_card_id": user_card_id,
+            "ai_card_id": ai_card_id,
+            "play_order": i,
+        }
+        for result in results
+        for i, (user_card_id, ai_card_id) in enumerate(
+            zip(result.user_card_ids, result.ai_card_ids)
+        )
+    ]
+    if card_plays:
+        db.exec(ADD_CARD_PLAYS, params=card_plays)
+    record_rounds(
+        db,
+        [
+            (
+                result.ai_personality_id,
+                result.winner,
+                result.user_card_ids,
+                result.ai_card_ids,
+            )
+            for result in results
+        ],
+    )
+
+
+def write_round_results(db: Session, results: List[RoundResult]) -> int:
+    """Persist a batch of results in one transaction, a few statements for
+    the whole batch. Rounds that already have a winner are skipped, so a
+    replayed journal cannot count a round twice. Returns how many were
+    written."""
+    open_round_ids = set(
+        db.exec(
+            select(GameRound.id).where(
+                GameRound.id.in_([result.round_id for result in results]),
+                GameRound.winner.is_(None),
+            )
+        )
+    )
+    unwritten = []
+    for result in results:
+        if result.round_id in open_round_ids:
+            open_round_ids.discard(result.round_id)
+            unwritten.append(result)
+    results = unwritten
+    if results:
+        db.exec(
+            RECORD_ROUND,
+            params=[
+                {
+                    "round_id": result.round_id,
+                    "winner": result.winner,
+                    "explanation": result.explanation,
+                    "completed_at": result.completed_at,
+                    "user_points": int(result.winner == "human"),
+                    "ai_points": int(result.winner == "ai"),
+                }
+                for result in results
+            ],
+        )
+        add_round_results(db, results)
+    db.commit()
+    return len(results)
+
+
+class RoundResultWriter:
+    """Write-behind persistence of round results.
+
+    `submit` appends the result to a journal and queues it, the submit
+    request answers from memory. A background task writes whatever is
+    queued in one transaction, so concurrent games share a commit instead of
+    queueing on SQLite's write lock one by one.
+
+    The queue is bounded: once `max_pending` results wait, `submit` waits
+    for the writer. Reads that need a session's results in the database
+    (its scores, the next round) wait for them with `flush_session`.
+
+    The journal is flushed to the OS before `submit` returns and replayed by
+    `start`, so results survive the process dying. It is truncated whenever
+    nothing is pending. Only for a single worker, the pending results live
+    in its memory.
+
+    A batch that fails is retried result by result, so one bad result cannot
+    hold back the others. A result still failing after `max_attempts` goes
+    to the dead-letter journal next to the journal and stops being pending.
+    """
+
+    def __init__(
+        self,
+        journal_path: Path,
+        max_pending: int = 1_000,
+        batch_size: int = 200,
+        max_journal_bytes: int = 1 << 20,
+        retry_delay: float = 0.5,
+        max_attempts: int = 3,
+    ):
+        self.journal_path = Path(journal_path)
+        self.dead_letter_path = self.journal_path.with_name(
+            f"{self.journal_path.name}.dead"
+        )
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.max_journal_bytes = max_journal_bytes
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+        self._pending: Dict[int, RoundResult] = {}
+        self._pending_sessions: Counter = Counter()
+        self._queue: Optional[asyncio.Queue] = None
+        self._written: Optional[asyncio.Condition] = None
+        self._journal = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        """Replay the journal left by a previous process, then start writing."""
+        self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+        if self.journal_path.exists():
+            with self.journal_path.open(encoding="utf-8") as journal:
+                # A torn last line is a result whose submit never returned
+                results = []
+                for line in journal:
+                    try:
+                        results.append(RoundResult.from_json(line))
+                    except (KeyError, TypeError, ValueError):
+                        logger.warning("Skipping a torn journal line")
+            if results:
+                written = await self._write(results)
+                logger.info(
+                    "Replayed %d of %d journaled round results", written, len(results)
+                )
+        self._journal = self.journal_path.open("a", encoding="utf-8")
+        self._journal.truncate(0)
+        self._queue = asyncio.Queue(self.max_pending)
+        self._written = asyncio.Condition()
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Write everything still queued, then stop. Anything that could not
+        be written stays in the journal for the next start."""
+        if self._task is None:
+            return
+        await self.flush()
+        self._task.cancel()
+        self._task = None
+        self._journal.close()
+
+    def is_pending(self, round_id: int) -> bool:
+        return round_id in self._pending
+
+    async def submit(self, result: RoundResult) -> None:
+        if self._queue.full():
+            registry.inc(
+                "caai_write_behind_backpressure_total",
+                help="Round results that waited for room in the write queue",
+            )
+        await self._queue.put(result)
+        self._pending[result.round_id] = result
+        self._pending_sessions[result.game_session_id] += 1
+        self._journal.write(result.to_json() + "\n")
+        self._journal.flush()
+        registry.set(
+            "caai_write_behind_pending",
+            len(self._pending),
+            help="Round results not written to the database yet",
+        )
+
+    async def flush(self) -> None:
+        await self._queue.join()
+
+    async def flush_session(self, game_session_id: int) -> None:
+        if not self._pending_sessions.get(game_session_id):
+            return
+        async with self._written:
+            await self._written.wait_for(
+                lambda: not self._pending_sessions.get(game_session_id)
+            )
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            await self._write_batch(batch)
+            for result in batch:
+                del self._pending[result.round_id]
+                self._pending_sessions[result.game_session_id] -= 1
+                if not self._pending_sessions[result.game_session_id]:
+                    del self._pending_sessions[result.game_session_id]
+                self._queue.task_done()
+            registry.set("caai_write_behind_pending", len(self._pending))
+            registry.observe(
+                "caai_write_behind_batch_size",
+                len(batch),
+                buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500),
+                help="Round results written per transaction",
+            )
+            self._compact()
+            async with self._written:
+                self._written.notify_all()
+
+    async def _write(self, results: List[RoundResult]) -> int:
+        async with open_session() as db:
+            return await run_db(db, write_round_results, results)
+
+    async def _write_batch(self, batch: List[RoundResult]) -> None:
+        try:
+            await self._write(batch)
+            return
+        except Exception:
+            logger.exception(
+                "Writing %d round results failed, retrying one by one", len(batch)
+            )
+        for result in batch:
+            await self._write_one(result)
+
+    async def _write_one(self, result: RoundResult) -> None:
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                await self._write([result])
+                return
+            except Exception:
+                if attempt < self.max_attempts:
+                    await asyncio.sleep(self.retry_delay * attempt)
+                    continue
+                logger.exception(
+                    "Round %d result failed %d times, moved to %s",
+                    result.round_id,
+                    attempt,
+                    self.dead_letter_path,
+                )
+        with self.dead_letter_path.open("a", encoding="utf-8") as dead_letters:
+            dead_letters.write(result.to_json() + "\n")
+        registry.inc(
+            "caai_write_behind_dead_letters_total",
+            help="Round results that could not be written to the database",
+        )
+
+    def _compact(self) -> None:
+        if not self._pending:
+            self._journal.truncate(0)
+        elif self._journal.tell() > self.max_journal_bytes:
+            # Never idle under sustained load, keep only what is pending
+            tmp = self.journal_path.with_name(f".{self.journal_path.name}.tmp")
+            with tmp.open("w", encoding="utf-8") as journal:
+                for result in self._pending.values():
+                    journal.write(result.to_json() + "\n")
+            self._journal.close()
+            os.replace(tmp, self.journal_path)
+            self._journal = self.journal_path.open("a", encoding="utf-8")
+
+
+@lru_cache()
+def get_result_writer() -> RoundResultWriter:
+    settings = get_settings()
+    if settings.WORKERS > 1:
+        raise ValueError("WRITE_BEHIND keeps pending results in memory, use WORKERS=1")
+    return RoundResultWriter(
+        Path(settings.WRITE_BEHIND_JOURNAL),
+        max_pending=settings.WRITE_BEHIND_MAX_PENDING,
+        batch_size=settings.WRITE_BEHIND_BATCH_SIZE,
+    )
@@ -0,0 +1,107 @@
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from app.db.models import AIPersonality, BlackCard, WhiteCard
+from app.services.deck_cursor import DeckCursor
+
+CursorState = Tuple[int, int, int]
+
+
+def prefetch_key(game_session_id: int) -> Tuple[str, int]:
+    """Precompute key of a pick started for a round that is not dealt yet."""
+    return ("next_round", game_session_id)
+
+
+def cursor_state(black_cursor: DeckCursor, white_cursor: DeckCursor) -> CursorState:
+    return black_cursor.seed, black_cursor.offset, white_cursor.offset
+
+
+class RoundDeal:
+    """A black card and hand dealt from a session's deck cursors.
+
+    `dealt_from` is the cursor state the cards were dealt at, a prepared deal
+    is only used while the session's stored cursors still match it.
+    """
+
+    def __init__(
+        self,
+        black_card: BlackCard,
+        white_cards: List[WhiteCard],
+        dealt_from: CursorState,
+        black_cursor: DeckCursor,
+        white_cursor: DeckCursor,
+    ):
+        self.black_card = black_card
+        self.white_cards = white_cards
+        self.dealt_from = dealt_from
+        self.black_cursor = black_cursor
+        self.white_cursor = white_cursor
+
+
+class PreparedRound:
+    def __init__(self, deal: RoundDeal, ai_personality: AIPersonality):
+        self.deal = deal
+        self.ai_personality = ai_personality
+
+
+class SessionDeck:
+    """Last known deck cursors of a session and its next round, once prepared."""
+
+    def __init__(self, black_cursor: DeckCursor, white_cursor: DeckCursor):
+        self.black_cursor = black_cursor
+        self.white_cursor = white_cursor
+        self.prepared: Optional[PreparedRound] = None
+
+
+class RoundPrefetcher:
+    """Per session queue of the next round, prepared while the current one is
+    being judged so `create_game_round` only has to insert it.
+
+    The cursors stored on the session stay the source of truth: a prepared
+    round dealt from cursors another worker has moved since is dropped and
+    dealt again.
+
+    Only used from the event loop, so it needs no lock.
+    """
+
+    def __init__(self, max_sessions: int = 10_000):
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[int, SessionDeck]" = OrderedDict()
+
+    def get(self, game_session_id: int) -> Optional[SessionDeck]:
+        session_deck = self._sessions.get(game_session_id)
+        if session_deck is not None:
+            self._sessions.move_to_end(game_session_id)
+        return session_deck
+
+    def track(self, game_session_id: int, deal: RoundDeal) -> None:
+        """Remember the cursors a session was left at by `deal`."""
+        self._sessions[game_session_id] = SessionDeck(
+            deal.black_cursor, deal.white_cursor
+        )
+        self._sessions.move_to_end(game_session_id)
+        # Abandoned sessions never end, cap how many we keep around
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def prepare(self, game_session_id: int, prepared: PreparedRound) -> None:
+        session_deck = self.get(game_session_id)
+        if session_deck is not None:
+            session_deck.prepared = prepared
+
+    def take(self, game_session_id: int) -> Optional[PreparedRound]:
+        session_deck = self.get(game_session_id)
+        if session_deck is None:
+            return None
+        prepared, session_deck.prepared = session_deck.prepared, None
+        return prepared
+
+    def discard(self, game_session_id: int) -> None:
+        self._sessions.pop(game_session_id, None)
+
+
+_round_prefetcher = RoundPrefetcher()
+
+
+def get_round_prefetcher() -> RoundPrefetcher:
+    return _round_prefetcher
@@ -0,0 +1,257 @@
+import asyncio
+import logging
+import secrets
+import time
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from app.config import Settings, get_settings
+from app.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+
+class LockTimeoutError(ValueError):
+    """Raised when a keyed lock is still held by someone else after the timeout."""
+
+
+class RateLimiter:
+    """Token bucket of `rate` model calls per second, `burst` at once.
+
+    A rate of 0 disables the limiter. `acquire` waits for a token instead of
+    failing, the caller's deadline bounds the wait.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            wait = await self._take()
+            if wait <= 0:
+                return
+            registry.inc(
+                "caai_model_rate_limited_total",
+                help="Model calls delayed by the rate limiter",
+            )
+            await asyncio.sleep(wait)
+
+    async def _take(self) -> float:
+        """Take a token, or return how long to wait for the next one."""
+        now = time.monotonic()
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+
+class RedisRateLimiter(RateLimiter):
+    """Rate limit shared by every worker, counted in one second windows.
+
+    `burst` is unused, each window allows `rate` calls.
+    """
+
+    def __init__(self, redis_client, rate: float, prefix: str = "caai:ratelimit:"):
+        super().__init__(rate, burst=1)
+        self.redis = redis_client
+        self.prefix = prefix
+
+    async def _take(self) -> float:
+        now = time.time()
+        window = int(now)
+        key = f"{self.prefix}model:{window}"
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.incr(key)
+            pipe.expire(key, 2)
+            calls, _ = await pipe.execute()
+        if calls <= self.rate:
+            return 0.0
+        return window + 1 - now
+
+
+class SharedState:
+    """State the workers of a deployment have to agree on.
+
+    This in-process variant is enough for a single worker: locks are
+    asyncio locks, the rate limit is a local token bucket and the card index
+    version is a plain counter. `RedisSharedState` shares all of it through
+    Redis so the app can run any number of workers.
+    """
+
+    backend = "local"
+
+    def __init__(self, rate_limiter: RateLimiter, lock_timeout: float):
+        self.rate_limiter = rate_limiter
+        self.lock_timeout = lock_timeout
+        self.card_index_version = 0
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._waiters: Dict[str, int] = {}
+
+    @asynccontextmanager
+    async def lock(self, name: str) -> AsyncIterator[None]:
+        """Hold the `name` lock, waiting at most `lock_timeout` seconds."""
+        lock = self._locks.setdefault(name, asyncio.Lock())
+        self._waiters[name] = self._waiters.get(name, 0) + 1
+        try:
+            if not lock.locked():
+                # Uncontended, skips the task wait_for would wrap around it
+                await lock.acquire()
+            else:
+                try:
+                    await asyncio.wait_for(lock.acquire(), self.lock_timeout)
+                except asyncio.TimeoutError:
+                    raise LockTimeoutError(f"{name} is busy, try again") from None
+            try:
+                yield
+            finally:
+                lock.release()
+        finally:
+            self._waiters[name] -= 1
+            if not self._waiters[name]:
+                del self._waiters[name]
+                del self._locks[name]
+
+    async def get_card_index_version(self) -> int:
+        return self.card_index_version
+
+    async def bump_card_index_version(self) -> int:
+        self.card_index_version += 1
+        return self.card_index_version
+
+    async def watch_card_index(
+        self, refresh: Callable[[], Awaitable[Any]], interval: float
+    ) -> None:
+        """Refresh the local card index whenever another worker bumped the
+        version. Nothing to watch with a single worker."""
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "card_index_version": self.card_index_version,
+            "held_locks": len(self._locks),
+        }
+
+
+class RedisSharedState(SharedState):
+    """`SharedState` on Redis. Takes any `redis.asyncio` compatible client,
+    fakeredis included."""
+
+    backend = "redis"
+
+    def __init__(
+        self,
+        redis_client,
+        rate_limiter: RateLimiter,
+        lock_timeout: float,
+        lock_ttl: float = 60.0,
+        prefix: str = "caai:",
+    ):
+        super().__init__(rate_limiter, lock_timeout)
+        self.redis = redis_client
+        self.lock_ttl = lock_ttl
+        self.prefix = prefix
+
+    @asynccontextmanager
+    async def lock(self, name: str) -> AsyncIterator[None]:
+        # The ttl frees the lock of a worker that died while holding it
+        key = f"{self.prefix}lock:{name}"
+        token = secrets.token_hex(8)
+        deadline = time.monotonic() + self.lock_timeout
+        while not await self.redis.set(
+            key, token, nx=True, px=int(self.lock_ttl * 1000)
+        ):
+            if time.monotonic() >= deadline:
+                raise LockTimeoutError(f"{name} is busy, try again")
+            await asyncio.sleep(0.05)
+        try:
+            yield
+        finally:
+            await self._release(key, token)
+
+    async def _release(self, key: str, token: str) -> None:
+        # Only delete the lock if it is still ours, it may have expired and
+        # been taken by another worker meanwhile
+        async with self.redis.pipeline(transaction=True) as pipe:
+            await pipe.watch(key)
+            current = await pipe.get(key)
+            if current is not None and current.decode() == token:
+                pipe.multi()
+                pipe.delete(key)
+                try:
+                    await pipe.execute()
+                except Exception:
+                    logger.warning("Lock %s changed while releasing it", key)
+            else:
+                await pipe.unwatch()
+
+    async def get_card_index_version(self) -> int:
+        version = await self.redis.get(f"{self.prefix}card_index:version")
+        return int(version or 0)
+
+    async def bump_card_index_version(self) -> int:
+        version = await self.redis.incr(f"{self.prefix}card_index:version")
+        self.card_index_version = version
+        return version
+
+    async def watch_card_index(
+        self, refresh: Callable[[], Awaitable[Any]], interval: float
+    ) -> None:
+        self.card_index_version = await self.get_card_index_version()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                version = await self.get_card_index_version()
+                if version != self.card_index_version:
+                    await refresh()
+                    self.card_index_version = version
+            except Exception as e:
+                logger.warning("Card index version check failed: %r", e)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "card_index_version": self.card_index_version,
+        }
+
+
+@lru_cache()
+def get_redis_client(redis_url: Optional[str] = None):
+    """One client, and so one connection pool, per process."""
+    import redis.asyncio as redis
+
+    return redis.Redis.from_url(redis_url or get_settings().REDIS_URL)
+
+
+def make_shared_state(settings: Settings) -> SharedState:
+    lock_timeout = settings.SESSION_LOCK_TIMEOUT
+    if settings.SHARED_STATE == "local":
+        return SharedState(
+            RateLimiter(
+                settings.ANTHROPIC_RATE_LIMIT, settings.ANTHROPIC_RATE_LIMIT_BURST
+            ),
+            lock_timeout=lock_timeout,
+        )
+    if settings.SHARED_STATE == "redis":
+        redis_client = get_redis_client(settings.REDIS_URL)
+        return RedisSharedState(
+            redis_client,
+            RedisRateLimiter(redis_client, settings.ANTHROPIC_RATE_LIMIT),
+            lock_timeout=lock_timeout,
+        )
+    raise ValueError(f"Unknown SHARED_STATE {settings.SHARED_STATE!r}")
+
+
+@lru_cache()
+def get_shared_state() -> SharedState:
+    return make_shared_state(get_settings())
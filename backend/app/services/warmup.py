@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import time
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# (name, step, critical)
+WarmupStep = Tuple[str, Callable[[], Awaitable[Any]], bool]
+
+
+class Warmup:
+    """Readiness of this process.
+
+    Services are built on first use, so a fresh process answers its first
+    requests slowly: the model SDK gets imported, pooled connections opened,
+    caches filled. `run` does that work once up front, step by step, and
+    `GET /ready` reports it so a load balancer only routes to warm replicas.
+
+    A failed step is logged. If it is critical (the database, the shared
+    state) the process is not ready and the step is retried every
+    `retry_interval` seconds until it succeeds. Anything else is left to be
+    built lazily by the first request that needs it.
+    """
+
+    def __init__(self, retry_interval: float = 5.0):
+        self.retry_interval = retry_interval
+        self.started_at: Optional[float] = None
+        self.durations: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self.failed: List[str] = []
+        self.done = False
+        self._first_pass = asyncio.Event()
+
+    @property
+    def ready(self) -> bool:
+        return self.done and not self.failed
+
+    async def run(self, steps: List[WarmupStep]) -> None:
+        self.started_at = time.perf_counter()
+        for step in steps:
+            await self._run_step(step)
+        self.done = True
+        self._first_pass.set()
+        logger.info(
+            "Warmup ran in %.0f ms: %s",
+            (time.perf_counter() - self.started_at) * 1000,
+            ", ".join(f"{n} {d * 1000:.0f} ms" for n, d in self.durations.items()),
+        )
+        failed = [step for step in steps if step[0] in self.failed]
+        if not failed:
+            return
+        while failed:
+            await asyncio.sleep(self.retry_interval)
+            for step in failed:
+                await self._run_step(step)
+            failed = [step for step in failed if step[0] in self.failed]
+        logger.info("Warmup steps recovered, ready")
+
+    async def wait_first_pass(self) -> None:
+        """Wait until every step ran once, failed or not."""
+        await self._first_pass.wait()
+
+    async def _run_step(self, step: WarmupStep) -> None:
+        name, run_step, critical = step
+        started = time.perf_counter()
+        try:
+            await run_step()
+        except Exception as e:
+            logger.warning("Warmup step %s failed: %r", name, e)
+            self.errors[name] = repr(e)
+            if critical and name not in self.failed:
+                self.failed.append(name)
+        else:
+            self.errors.pop(name, None)
+            if name in self.failed:
+                self.failed.remove(name)
+        self.durations[name] = time.perf_counter() - started
+        registry.set(
+            "caai_warmup_seconds",
+            self.durations[name],
+            help="Time spent in each startup warmup step",
+            step=name,
+        )
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "failed": list(self.failed),
+            "steps_ms": {
+                name: round(duration * 1000, 1)
+                for name, duration in self.durations.items()
+            },
+            "errors": self.errors,
+        }
+
+
+@lru_cache()
+def get_warmup() -> Warmup:
+    return Warmup()
@@ -0,0 +1,114 @@
+"""Import-time budget of the app.
+
+Imports `app.main` in fresh interpreters under `python -X importtime`, reports
+the slowest modules of the fastest run and fails when the import takes longer
+than --budget-ms, when a module that must stay lazy got imported, or when
+the import reads the settings (it runs without ANTHROPIC_API_KEY).
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --budget-ms 800 --runs 5
+
+Run from the `backend` directory. Everything a cold start pays for before
+the server can accept its first connection shows up here.
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List, Set, Tuple
+
+# Only loaded once the app talks to the model, see AnthropicService
+LAZY_MODULES = ("anthropic",)
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=1_500.0,
+        help="Max cumulative import time of --module",
+    )
+    parser.add_argument(
+        "--runs", type=int, default=3, help="Fresh interpreters, the fastest counts"
+    )
+    parser.add_argument("--top", type=int, default=15, help="Slowest modules shown")
+    return parser.parse_args(argv)
+
+
+Imports = Dict[str, Tuple[int, List[Tuple[str, int]]]]
+
+
+def measure(module: str) -> Tuple[Imports, Set[str]]:
+    """Module -> (cumulative us, [(direct dependency, cumulative us)]) for
+    every top-level import of one cold start, `module` and the interpreter's
+    own startup, and the name of every module loaded."""
+    env = dict(os.environ)
+    # The API key has no default, the import fails if it reads the settings
+    env.pop("ANTHROPIC_API_KEY", None)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode:
+        error = [
+            line
+            for line in result.stderr.splitlines()
+            if not line.startswith("import time:")
+        ]
+        raise SystemExit(f"IMPORT FAILED {error[-1]}")
+    imports: Imports = {}
+    loaded = set()
+    # Dependencies are printed before the module importing them
+    children: List[Tuple[str, int]] = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        _, cumulative_us, indent, name = match.groups()
+        loaded.add(name)
+        depth = len(indent) // 2
+        if depth == 0:
+            imports[name] = (int(cumulative_us), children)
+            children = []
+        elif depth == 1:
+            children.append((name, int(cumulative_us)))
+    return imports, loaded
+
+
+def print_report(module: str, imports: Imports, top: int) -> None:
+    total_us, children = imports[module]
+    print(f"{module} imported in {total_us / 1000:.0f} ms")
+    # Direct dependencies are where a lazy import can make a difference
+    print(f"{'module':40} {'cumulative ms':>14}")
+    for name, cumulative_us in sorted(children, key=lambda child: -child[1])[:top]:
+        print(f"{name:40} {cumulative_us / 1000:14.1f}")
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    runs = [measure(args.module) for _ in range(args.runs)]
+    imports, loaded = min(runs, key=lambda run: run[0][args.module][0])
+    print_report(args.module, imports, args.top)
+
+    failed = False
+    total_ms = imports[args.module][0] / 1000
+    if total_ms > args.budget_ms:
+        print(f"OVER BUDGET {total_ms:.0f} ms > {args.budget_ms:.0f} ms")
+        failed = True
+    for name in LAZY_MODULES:
+        if name in loaded:
+            print(f"EAGER IMPORT {name} is loaded by {args.module}")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
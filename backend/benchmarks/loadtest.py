@@ -0,0 +1,405 @@
+"""Load test for the game API.
+
+Drives the full game loop (session, rounds, submits, end) against the
+in-process FastAPI app with a deterministic fake model, and reports latency
+percentiles, throughput, SQL statements and response bytes on the wire per
+request for every endpoint.
+
+    python -m benchmarks.loadtest --games 40 --rounds 10 --model-latency-ms 50
+    python -m benchmarks.loadtest --engine heuristic
+    python -m benchmarks.loadtest --save-baseline benchmarks/baseline.json
+    python -m benchmarks.loadtest --baseline benchmarks/baseline.json
+
+Run from the `backend` directory. Unless --database-url is given, a temporary
+SQLite database seeded with a synthetic deck of --deck-size cards is used.
+
+A few warm-up games are played first and not recorded. The load is then
+played --runs times and every latency percentile reported is the median of
+the runs, so a baseline comparison is not decided by one noisy run.
+"""
+
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List
+
+STATEMENTS: contextvars.ContextVar[List[str]] = contextvars.ContextVar("statements")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--games", type=int, default=20, help="Concurrent games")
+    parser.add_argument("--rounds", type=int, default=10, help="Rounds per game")
+    parser.add_argument(
+        "--runs", type=int, default=5, help="Runs, percentiles are their median"
+    )
+    parser.add_argument(
+        "--warmup-games", type=int, default=5, help="Unrecorded games played first"
+    )
+    parser.add_argument(
+        "--engine",
+        choices=("fake", "heuristic"),
+        default="fake",
+        help="Stub the model with a fixed-latency fake or run the local heuristic engine",
+    )
+    parser.add_argument("--model-latency-ms", type=float, default=0.0)
+    parser.add_argument("--deck-size", type=int, default=2_000)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--write-behind",
+        action="store_true",
+        help="Persist round results from the background writer",
+    )
+    parser.add_argument("--save-baseline", type=Path, default=None)
+    parser.add_argument("--baseline", type=Path, default=None)
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=0.3,
+        help="Allowed p95 latency increase over the baseline, as a fraction",
+    )
+    return parser.parse_args(argv)
+
+
+def configure_environment(args) -> None:
+    # Settings are read at import time, set them before importing the app
+    if args.database_url is None:
+        path = Path(tempfile.mkdtemp()) / "loadtest.db"
+        args.database_url = f"sqlite:///{path}"
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("ANTHROPIC_API_KEY", "loadtest")
+    os.environ.setdefault("RESPONSE_CACHE_BACKEND", "none")
+    # Measure a warm server, not the startup warmup competing with the load
+    os.environ.setdefault("WARMUP_BEFORE_SERVING", "true")
+    if args.engine == "heuristic":
+        os.environ["AI_ENGINE"] = "heuristic"
+    if args.write_behind:
+        os.environ["WRITE_BEHIND"] = "true"
+        os.environ["WRITE_BEHIND_JOURNAL"] = str(
+            Path(tempfile.mkdtemp()) / "round_results.journal"
+        )
+
+
+async def seed_database(deck_size: int) -> None:
+    from sqlmodel import Session
+
+    from app.db.database import create_db_and_tables, open_session, run_db
+    from app.db.models import AIPersonality, BlackCard, WhiteCard
+
+    await create_db_and_tables()
+
+    def seed(db: Session):
+        if db.get(AIPersonality, 1) is not None:
+            return
+        db.add(AIPersonality(id=1, name="Load Tester", description="A benchmark bot."))
+        for i in range(1, deck_size // 4 + 1):
+            db.add(
+                BlackCard(
+                    text=f"Black card {i} ____.",
+                    pick=1 + (i % 3 == 0),
+                    watermark="BENCH",
+                    category="SAFE",
+                    language="EN",
+                )
+            )
+        for i in range(1, deck_size + 1):
+            db.add(
+                WhiteCard(
+                    text=f"White card {i}",
+                    watermark="BENCH",
+                    category="SAFE",
+                    language="EN",
+                )
+            )
+        db.commit()
+
+    async with open_session() as db:
+        await run_db(db, seed)
+
+
+def make_fake_anthropic_service(latency: float):
+    from app.services.anthropic import AnthropicService
+
+    class FakeAnthropicService(AnthropicService):
+        """Deterministic model stand-in: picks the lowest card ids and lets
+        the lexicographically smaller answer win."""
+
+        def __init__(self):
+            self.model = "fake"
+
+        async def generate_ai_response(self, black_card, white_cards, ai_personality):
+            await asyncio.sleep(latency)
+            return sorted(white_cards, key=lambda card: card.id)[: black_card.pick]
+
+        async def judge_round(self, black_card, user_cards, ai_cards):
+            await asyncio.sleep(latency)
+            user_answer = [card.text for card in user_cards]
+            ai_answer = [card.text for card in ai_cards]
+            winner = "human" if user_answer < ai_answer else "ai"
+            return winner, "Deterministic verdict."
+
+        async def stream_judge_round(self, black_card, user_cards, ai_cards):
+            winner, explanation = await self.judge_round(
+                black_card, user_cards, ai_cards
+            )
+            yield "winner", winner
+            yield "explanation", explanation
+
+    return FakeAnthropicService()
+
+
+def install_fakes(app, fake_service) -> None:
+    from fastapi import Depends
+
+    from app.db.database import AnySession, get_session
+    from app.config import get_settings
+    from app.main import get_game_service
+    from app.services.ai_precompute import AIPickPrecomputer
+    from app.services.card_manager import CardManagerService
+    from app.services.game import GameService
+    from app.services.result_writer import get_result_writer
+
+    precomputer = AIPickPrecomputer(fake_service)
+    result_writer = get_result_writer() if get_settings().WRITE_BEHIND else None
+
+    def get_fake_game_service(db: AnySession = Depends(get_session)):
+        return GameService(
+            db,
+            fake_service,
+            CardManagerService(db),
+            precomputer,
+            result_writer=result_writer,
+        )
+
+    app.dependency_overrides[get_game_service] = get_fake_game_service
+
+
+def install_statement_counter() -> None:
+    from sqlalchemy import event
+
+    from app.db.database import get_engine
+
+    engine = get_engine()
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements = STATEMENTS.get(None)
+        if statements is not None:
+            statements.append(statement)
+
+    event.listen(sync_engine, "before_cursor_execute", count)
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statements: Dict[str, List[int]] = defaultdict(list)
+        self.bytes: Dict[str, List[int]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def request(self, client, endpoint: str, url: str, payload=None):
+        method, _ = endpoint.split(" ", 1)
+        statements: List[str] = []
+        token = STATEMENTS.set(statements)
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, json=payload)
+        finally:
+            STATEMENTS.reset(token)
+        self.latencies[endpoint].append(time.perf_counter() - started)
+        self.statements[endpoint].append(len(statements))
+        # Compressed size, before httpx decodes the body
+        self.bytes[endpoint].append(response.num_bytes_downloaded)
+        if response.status_code >= 400:
+            self.errors[endpoint] += 1
+            raise RuntimeError(f"{endpoint} failed: {response.text}")
+        return response.json()
+
+
+async def play_game(client, recorder: Recorder, rng: random.Random, rounds: int):
+    await recorder.request(client, "GET /ai-personalities", "/ai-personalities")
+    session = await recorder.request(
+        client,
+        "POST /game-sessions",
+        "/game-sessions",
+        {"username": f"player-{rng.getrandbits(32)}", "ai_personality_id": 1},
+    )
+    for _ in range(rounds):
+        dealt = await recorder.request(
+            client, "POST /game-rounds", "/game-rounds", {"game_session_id": session["id"]}
+        )
+        hand = [card["id"] for card in dealt["white_cards"]]
+        await recorder.request(
+            client,
+            "POST /game-rounds/{id}/submit",
+            f"/game-rounds/{dealt['game_round']['id']}/submit",
+            {"user_card_ids": rng.sample(hand, dealt["black_card"]["pick"])},
+        )
+    await recorder.request(
+        client, "POST /game-sessions/{id}/end", f"/game-sessions/{session['id']}/end"
+    )
+
+
+def percentile(values: List[float], q: float) -> float:
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(q) - 1]
+
+
+def summarize(recorder: Recorder, elapsed: float) -> dict:
+    endpoints = {}
+    for endpoint, latencies in recorder.latencies.items():
+        endpoints[endpoint] = {
+            "requests": len(latencies),
+            "errors": recorder.errors[endpoint],
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "sql_per_request": statistics.mean(recorder.statements[endpoint]),
+            "bytes_per_request": statistics.mean(recorder.bytes[endpoint]),
+        }
+    total = sum(len(latencies) for latencies in recorder.latencies.values())
+    return {
+        "requests": total,
+        "elapsed_s": elapsed,
+        "requests_per_s": total / elapsed if elapsed else 0.0,
+        "endpoints": endpoints,
+    }
+
+
+def median_report(reports: List[dict]) -> dict:
+    """One report for several runs: request counts add up, latencies and
+    throughput are the median of the runs."""
+    endpoints = {}
+    for endpoint in reports[0]["endpoints"]:
+        runs = [report["endpoints"][endpoint] for report in reports]
+        endpoints[endpoint] = {
+            "requests": sum(run["requests"] for run in runs),
+            "errors": sum(run["errors"] for run in runs),
+            **{
+                key: statistics.median(run[key] for run in runs)
+                for key in ("p50_ms", "p95_ms", "p99_ms")
+            },
+            **{
+                key: statistics.mean(run[key] for run in runs)
+                for key in ("sql_per_request", "bytes_per_request")
+            },
+        }
+    return {
+        "runs": len(reports),
+        "requests": sum(report["requests"] for report in reports),
+        "elapsed_s": sum(report["elapsed_s"] for report in reports),
+        "requests_per_s": statistics.median(
+            report["requests_per_s"] for report in reports
+        ),
+        "endpoints": endpoints,
+    }
+
+
+def print_report(report: dict, baseline: dict = None) -> None:
+    print(
+        f"{report['requests']} requests in {report['elapsed_s']:.2f}s over "
+        f"{report.get('runs', 1)} run(s) ({report['requests_per_s']:.1f} req/s)"
+    )
+    header = (
+        f"{'endpoint':34} {'n':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+        f"{'sql/req':>8} {'bytes/req':>10}"
+    )
+    if baseline:
+        header += f" {'p95 vs base':>12}"
+    print(header)
+    for endpoint, stats in report["endpoints"].items():
+        line = (
+            f"{endpoint:34} {stats['requests']:>5} {stats['p50_ms']:>8.2f} "
+            f"{stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f} {stats['sql_per_request']:>8.1f} "
+            f"{stats.get('bytes_per_request', 0):>10.0f}"
+        )
+        base = (baseline or {}).get("endpoints", {}).get(endpoint)
+        if base:
+            line += f" {stats['p95_ms'] / base['p95_ms'] - 1:>+11.0%}"
+        print(line)
+
+
+def regressions(report: dict, baseline: dict, max_regression: float) -> List[str]:
+    found = []
+    for endpoint, stats in report["endpoints"].items():
+        base = baseline["endpoints"].get(endpoint)
+        if base is None:
+            continue
+        if stats["p95_ms"] > base["p95_ms"] * (1 + max_regression):
+            found.append(f"{endpoint}: p95 {base['p95_ms']:.2f}ms -> {stats['p95_ms']:.2f}ms")
+        # Ties skip the score update, allow for a different tie ratio
+        if stats["sql_per_request"] > base["sql_per_request"] + 0.5:
+            found.append(
+                f"{endpoint}: sql/request {base['sql_per_request']:.1f} -> "
+                f"{stats['sql_per_request']:.1f}"
+            )
+    return found
+
+
+async def run(args) -> dict:
+    import httpx
+
+    from app.main import app
+
+    await seed_database(args.deck_size)
+    if args.engine == "fake":
+        install_fakes(app, make_fake_anthropic_service(args.model_latency_ms / 1000))
+    install_statement_counter()
+
+    rng = random.Random(args.seed)
+    transport = httpx.ASGITransport(app=app)
+
+    async def play(client, recorder: Recorder, games: int) -> float:
+        started = time.perf_counter()
+        await asyncio.gather(
+            *[
+                play_game(client, recorder, random.Random(rng.random()), args.rounds)
+                for _ in range(games)
+            ]
+        )
+        return time.perf_counter() - started
+
+    reports = []
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            # Fills the connection pool, caches and code paths first
+            await play(client, Recorder(), args.warmup_games)
+            for _ in range(args.runs):
+                recorder = Recorder()
+                elapsed = await play(client, recorder, args.games)
+                reports.append(summarize(recorder, elapsed))
+    return median_report(reports)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    configure_environment(args)
+    random.seed(args.seed)
+    report = asyncio.run(run(args))
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline else None
+    print_report(report, baseline)
+    if args.save_baseline:
+        args.save_baseline.write_text(json.dumps(report, indent=2))
+        print(f"Baseline saved to {args.save_baseline}")
+    if baseline:
+        found = regressions(report, baseline, args.max_regression)
+        for regression in found:
+            print(f"REGRESSION {regression}")
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
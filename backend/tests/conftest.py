@@ -0,0 +1,126 @@
+import asyncio
+import os
+import tempfile
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+
+# The API key has no default, and a test must never reach the real API. App
+# level tests play on a throwaway database with the local engine
+os.environ.setdefault("ANTHROPIC_API_KEY", "test")
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/test.db"
+os.environ["AI_ENGINE"] = "heuristic"
+
+from app.config import Settings
+from app.db.models import AIPersonality, BlackCard, WhiteCard
+from app.services.anthropic import AnthropicService
+from app.services.heuristic import HeuristicEngine
+from app.services.shared_state import RateLimiter, SharedState
+
+
+class FakeStream:
+    def __init__(self, chunks: List[str]):
+        self.chunks = chunks
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    @property
+    async def text_stream(self):
+        for chunk in self.chunks:
+            yield chunk
+
+    async def get_final_message(self):
+        return SimpleNamespace(usage=None)
+
+
+class FakeMessages:
+    """Stands in for `AsyncAnthropic.messages`. Each call takes the next
+    reply: text, a list of streamed chunks, or an exception to raise."""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.calls = 0
+
+    def _next(self):
+        self.calls += 1
+        reply = self.replies.pop(0) if len(self.replies) > 1 else self.replies[0]
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    async def create(self, **kwargs):
+        text = self._next()
+        return SimpleNamespace(content=[SimpleNamespace(text=text)], usage=None)
+
+    def stream(self, **kwargs):
+        reply = self._next()
+        return FakeStream([reply] if isinstance(reply, str) else reply)
+
+
+def make_settings(**overrides) -> Settings:
+    values = dict(
+        ANTHROPIC_API_KEY="test",
+        RESPONSE_CACHE_BACKEND="memory",
+        ANTHROPIC_HEDGING=False,
+    )
+    values.update(overrides)
+    return Settings(**values)
+
+
+def make_service(messages: FakeMessages, **overrides) -> AnthropicService:
+    service = AnthropicService(
+        make_settings(**overrides),
+        fallback_engine=HeuristicEngine(),
+        shared_state=SharedState(RateLimiter(0, 1), lock_timeout=1.0),
+    )
+    service.client = SimpleNamespace(messages=messages)
+    return service
+
+
+@pytest.fixture
+def black_card() -> BlackCard:
+    return BlackCard(id=1, text="What ruined the party? ____.", pick=1, language="EN")
+
+
+@pytest.fixture
+def white_cards() -> List[WhiteCard]:
+    return [
+        WhiteCard(id=i, text=f"White card {i}", language="EN") for i in range(1, 11)
+    ]
+
+
+@pytest.fixture
+def ai_personality() -> AIPersonality:
+    return AIPersonality(id=1, name="Tester", description="Dry humour.")
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+    from benchmarks.loadtest import seed_database
+
+    asyncio.run(seed_database(deck_size=200))
+    with TestClient(app) as client:
+        yield client
+
+
+def deal_round(client, pick=None) -> dict:
+    """Start a game and deal its first round, until its black card takes
+    `pick` cards when given."""
+    for _ in range(50):
+        game_session = client.post(
+            "/game-sessions", json={"username": "tester", "ai_personality_id": 1}
+        ).json()
+        dealt = client.post(
+            "/game-rounds", json={"game_session_id": game_session["id"]}
+        ).json()
+        if pick is None or dealt["black_card"]["pick"] == pick:
+            return dealt
+    raise AssertionError(f"No black card with pick {pick} was dealt")
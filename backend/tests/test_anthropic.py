@@ -0,0 +1,98 @@
+import asyncio
+
+from tests.conftest import FakeMessages, make_service
+
+
+def stream_events(service, black_card, user_cards, ai_cards):
+    async def collect():
+        return [
+            event
+            async for event in service.stream_judge_round(
+                black_card, user_cards, ai_cards
+            )
+        ]
+
+    return asyncio.run(collect())
+
+
+def cached(service, black_card, user_cards, ai_cards):
+    key = service._judge_cache_key(black_card, user_cards, ai_cards)
+    return asyncio.run(service.cache.get(key))
+
+
+def test_stream_judge_parses_chunked_answer(black_card, white_cards):
+    service = make_service(
+        FakeMessages(["Winner: ", "human\nExpl", "anation: so", " funny"])
+    )
+    user_cards, ai_cards = white_cards[:1], white_cards[1:2]
+
+    events = stream_events(service, black_card, user_cards, ai_cards)
+
+    assert events == [
+        ("winner", "human"),
+        ("explanation", "so"),
+        ("explanation", " funny"),
+    ]
+    assert cached(service, black_card, user_cards, ai_cards) == ["human", "so funny"]
+    assert service.resilience.breaker.consecutive_failures == 0
+
+
+def test_stream_judge_parses_answer_without_newline(black_card, white_cards):
+    service = make_service(FakeMessages(["Winner: ", "AI"]))
+    user_cards, ai_cards = white_cards[:1], white_cards[1:2]
+
+    events = stream_events(service, black_card, user_cards, ai_cards)
+
+    assert events == [("winner", "ai")]
+    assert cached(service, black_card, user_cards, ai_cards) == ["ai", ""]
+    assert service.resilience.breaker.consecutive_failures == 0
+
+
+def test_stream_judge_parses_answer_with_trailing_newline(black_card, white_cards):
+    service = make_service(FakeMessages(["Winner: human\n"]))
+    user_cards, ai_cards = white_cards[:1], white_cards[1:2]
+
+    events = stream_events(service, black_card, user_cards, ai_cards)
+
+    assert events == [("winner", "human")]
+    assert cached(service, black_card, user_cards, ai_cards) == ["human", ""]
+
+
+def test_stream_judge_invalid_winner_falls_back(black_card, white_cards):
+    service = make_service(FakeMessages(["Winner: nobody"]))
+    user_cards, ai_cards = white_cards[:1], white_cards[1:2]
+
+    events = stream_events(service, black_card, user_cards, ai_cards)
+
+    assert [event for event, _ in events] == ["winner", "explanation"]
+    assert events[0][1] in ("human", "ai")
+    # A failure for the breaker, and nothing cached for the next submit
+    assert service.resilience.breaker.consecutive_failures == 1
+    assert cached(service, black_card, user_cards, ai_cards) is None
+
+
+def test_stream_judge_skips_model_while_circuit_is_open(black_card, white_cards):
+    messages = FakeMessages("Winner: human\nExplanation: funny")
+    service = make_service(messages, ANTHROPIC_BREAKER_FAILURES=1)
+    service.resilience.breaker.record_failure()
+
+    events = stream_events(service, black_card, white_cards[:1], white_cards[1:2])
+
+    assert events[0][0] == "winner"
+    assert messages.calls == 0
+
+
+def test_pick_keeps_the_model_play_order(black_card, white_cards, ai_personality):
+    black_card.pick = 2
+    messages = FakeMessages("7, 3")
+    service = make_service(messages)
+
+    def pick():
+        return asyncio.run(
+            service.generate_ai_response(black_card, white_cards, ai_personality)
+        )
+
+    assert [card.id for card in pick()] == [7, 3]
+    # Served from the cache, in the same order
+    assert [card.id for card in pick()] == [7, 3]
+    assert messages.calls == 1
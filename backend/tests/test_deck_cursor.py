@@ -0,0 +1,69 @@
+from sqlalchemy import text
+from sqlmodel import Session, SQLModel, create_engine
+
+from app.services.card_index import CardIndex
+from app.services.deck_cursor import DeckCursor
+
+
+def make_db() -> Session:
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    db = Session(engine)
+    db.exec(
+        text(
+            "INSERT INTO white_cards (id, text, watermark, category, language) "
+            "VALUES (:id, 'card', 'TEST', :category, 'EN')"
+        ),
+        params=[
+            {"id": i, "category": "NSFW" if i % 10 == 0 else "SAFE"}
+            for i in range(1, 61)
+        ],
+    )
+    db.commit()
+    return db
+
+
+def deal_all(index: CardIndex, cursor: DeckCursor, count: int):
+    return [card.id for card in index.deal_white_cards(cursor, count, category="SAFE")]
+
+
+def test_a_pass_deals_every_card_once():
+    index = CardIndex().refresh(make_db())
+    dealt = deal_all(index, DeckCursor(7, 60), 54)
+
+    assert sorted(dealt) == [i for i in range(1, 61) if i % 10]
+
+
+def test_removing_a_card_keeps_the_others_in_place():
+    db = make_db()
+    index = CardIndex().refresh(db)
+    before = deal_all(index, DeckCursor(7, 60), 54)
+
+    removed = before[3]
+    db.exec(text("DELETE FROM white_cards WHERE id = :id"), params={"id": removed})
+    db.exec(
+        text(
+            "INSERT INTO white_cards (id, text, watermark, category, language) "
+            "VALUES (61, 'new', 'TEST', 'SAFE', 'EN')"
+        )
+    )
+    db.commit()
+    index.refresh(db)
+    after = deal_all(index, DeckCursor(7, 60), 53)
+
+    assert after == [card_id for card_id in before if card_id != removed]
+
+
+def test_deal_resumes_from_the_stored_offset_after_a_refresh():
+    db = make_db()
+    index = CardIndex().refresh(db)
+    cursor = DeckCursor(7, 60)
+    first = deal_all(index, cursor, 10)
+    uninterrupted = deal_all(index, cursor.copy(), 10)
+
+    # A restart, or another worker, rebuilds the cursor from the session row
+    restarted = CardIndex().refresh(db)
+    resumed = deal_all(restarted, DeckCursor(7, 60, cursor.offset), 10)
+
+    assert resumed == uninterrupted
+    assert not set(first) & set(resumed)
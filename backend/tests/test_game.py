@@ -0,0 +1,82 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from tests.conftest import deal_round
+
+
+def submit(client, dealt, card_ids):
+    return client.post(
+        f"/game-rounds/{dealt['game_round']['id']}/submit",
+        json={"user_card_ids": card_ids},
+    )
+
+
+def test_submit_plays_a_round(client):
+    dealt = deal_round(client)
+    hand = [card["id"] for card in dealt["white_cards"]]
+
+    response = submit(client, dealt, hand[: dealt["black_card"]["pick"]])
+
+    assert response.status_code == 200
+    assert response.json()["game_round"]["winner"] in ("human", "ai", "tie")
+
+
+def test_submit_rejects_the_wrong_number_of_cards(client):
+    dealt = deal_round(client, pick=1)
+    hand = [card["id"] for card in dealt["white_cards"]]
+
+    assert submit(client, dealt, hand[:2]).status_code == 400
+    assert submit(client, dealt, []).status_code == 400
+    # Nothing was recorded, the round can still be played
+    assert submit(client, dealt, hand[:1]).status_code == 200
+
+
+def test_submit_rejects_duplicate_cards(client):
+    dealt = deal_round(client, pick=2)
+    hand = [card["id"] for card in dealt["white_cards"]]
+
+    response = submit(client, dealt, [hand[0], hand[0]])
+
+    assert response.status_code == 400
+    assert submit(client, dealt, hand[:2]).status_code == 200
+
+
+def test_streamed_submit_rejects_duplicate_cards(client):
+    dealt = deal_round(client, pick=2)
+    hand = [card["id"] for card in dealt["white_cards"]]
+
+    response = client.post(
+        f"/game-rounds/{dealt['game_round']['id']}/submit/stream",
+        json={"user_card_ids": [hand[1], hand[1]]},
+    )
+
+    assert response.status_code == 400
+
+
+def test_concurrent_submits_play_the_round_once(client):
+    dealt = deal_round(client, pick=1)
+    card_ids = [dealt["white_cards"][0]["id"]]
+
+    with ThreadPoolExecutor(4) as pool:
+        responses = list(pool.map(lambda _: submit(client, dealt, card_ids), range(4)))
+
+    assert sorted(response.status_code for response in responses) == [
+        200,
+        400,
+        400,
+        400,
+    ]
+
+
+def test_new_session_hides_the_deck_state(client):
+    response = client.post(
+        "/game-sessions", json={"username": "tester", "ai_personality_id": 1}
+    )
+
+    assert response.status_code == 201
+    assert set(response.json()) == {
+        "id",
+        "user_id",
+        "ai_personality_id",
+        "start_time",
+        "end_time",
+    }
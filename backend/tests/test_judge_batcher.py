@@ -0,0 +1,46 @@
+import asyncio
+import logging
+
+from app.services.judge_batcher import JudgeBatcher
+from tests.conftest import FakeMessages, make_service
+
+
+def test_failed_batch_is_logged_and_judged_one_by_one(black_card, white_cards, caplog):
+    messages = FakeMessages(
+        RuntimeError("batch call failed"), "Winner: ai\nExplanation: sharper"
+    )
+    service = make_service(messages, ANTHROPIC_RETRY_BUDGET_MIN=0)
+    rounds = [(white_cards[i : i + 1], white_cards[i + 5 : i + 6]) for i in range(3)]
+
+    async def judge_all():
+        batcher = JudgeBatcher(service, window_ms=10, max_size=8)
+        return await asyncio.gather(
+            *[batcher.judge(black_card, user, ai) for user, ai in rounds]
+        )
+
+    with caplog.at_level(logging.ERROR, logger="app.services.judge_batcher"):
+        verdicts = asyncio.run(judge_all())
+
+    assert verdicts == [("ai", "sharper")] * 3
+    assert "Batched judge call failed" in caplog.text
+
+
+def test_cancelled_caller_is_skipped(black_card, white_cards):
+    messages = FakeMessages("Winner: human\nExplanation: fine")
+    service = make_service(messages)
+
+    async def judge_with_one_cancelled():
+        batcher = JudgeBatcher(service, window_ms=10, max_size=8)
+        gone = asyncio.create_task(
+            batcher.judge(black_card, white_cards[:1], white_cards[1:2])
+        )
+        kept = asyncio.create_task(
+            batcher.judge(black_card, white_cards[2:3], white_cards[3:4])
+        )
+        await asyncio.sleep(0)
+        gone.cancel()
+        return await kept
+
+    assert asyncio.run(judge_with_one_cancelled()) == ("human", "fine")
+    # Only the remaining round was judged, on its own
+    assert messages.calls == 1
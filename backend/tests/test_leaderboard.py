@@ -0,0 +1,74 @@
+from sqlalchemy import event, text
+from sqlmodel import Session, SQLModel, create_engine
+
+from app.services import leaderboard
+
+
+def make_db() -> Session:
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    db = Session(engine)
+    db.exec(
+        text(
+            "INSERT INTO white_cards (id, text, watermark, category, language) "
+            "VALUES (:id, 'card', 'TEST', 'SAFE', 'EN')"
+        ),
+        params=[{"id": i} for i in range(1, 101)],
+    )
+    # Ten wins apiece for most cards, long tie groups to page through
+    db.exec(
+        text("INSERT INTO card_stats (card_id, plays, wins) VALUES (:id, 20, :wins)"),
+        params=[{"id": i, "wins": 10 if i % 4 else i % 7} for i in range(1, 101)],
+    )
+    db.commit()
+    return db
+
+
+def test_pages_cover_every_card_once_in_order():
+    db = make_db()
+    seen, after = [], None
+    while True:
+        rows = leaderboard.card_leaderboard(db, 7, after)
+        seen += [(stats.wins, card.id) for stats, card in rows]
+        if len(rows) < 7:
+            break
+        after = (rows[-1][0].wins, rows[-1][1].id)
+
+    assert len(seen) == 100
+    assert seen == sorted(seen, reverse=True)
+
+
+def test_deep_page_reads_the_index_without_sorting():
+    db = make_db()
+    statements = []
+    event.listen(
+        db.get_bind(),
+        "before_cursor_execute",
+        lambda conn, cursor, statement, params, *args: statements.append(
+            (statement, params)
+        ),
+    )
+    leaderboard.card_leaderboard(db, 20, (10, 50))
+
+    statement, params = statements[0]
+    plan = " ".join(
+        row[-1]
+        for row in db.connection().exec_driver_sql(
+            f"EXPLAIN QUERY PLAN {statement}", params
+        )
+    )
+    assert "idx_card_stats_leaderboard" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_stats_of_deleted_cards_are_skipped():
+    db = make_db()
+    # A deck rebuild can drop cards, SQLite does not enforce the foreign key
+    db.exec(text("DELETE FROM white_cards WHERE id IN (99, 100)"))
+    db.commit()
+
+    rows = leaderboard.card_leaderboard(db, 7)
+
+    assert len(rows) == 7
+    assert all(card.id == stats.card_id for stats, card in rows)
+    assert {card.id for _, card in rows}.isdisjoint({99, 100})
@@ -0,0 +1,121 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    LatencyTracker,
+    ResiliencePolicy,
+    RetryBudget,
+)
+
+
+def make_policy(failures=3, reset_timeout=30.0, min_retries=3, hedging=False):
+    return ResiliencePolicy(
+        CircuitBreaker(failure_threshold=failures, reset_timeout=reset_timeout),
+        RetryBudget(ratio=0.0, min_retries=min_retries),
+        hedging=hedging,
+        min_hedge_delay=0.01,
+    )
+
+
+class Attempts:
+    """Model call stand-in, each attempt takes the next (delay, outcome)."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    async def __call__(self):
+        delay, outcome = self.outcomes[min(self.calls, len(self.outcomes) - 1)]
+        self.calls += 1
+        await asyncio.sleep(delay)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def test_breaker_opens_then_half_opens_and_closes():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    # A single probe goes through while half open
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_failed_probe_opens_the_breaker_again():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    breaker.record_failure()
+    time.sleep(0.06)
+
+    assert breaker.allow()
+    breaker.record_failure()
+
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_open_circuit_short_circuits_calls():
+    policy = make_policy(failures=2, min_retries=0)
+    attempt = Attempts((0, RuntimeError("down")))
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            asyncio.run(policy.call("pick", attempt, deadline=1.0))
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(policy.call("pick", attempt, deadline=1.0))
+
+    assert attempt.calls == 2
+
+
+def test_failed_attempt_is_retried_within_the_budget():
+    policy = make_policy(min_retries=1)
+    attempt = Attempts((0, RuntimeError("flaky")), (0, "ok"))
+
+    assert asyncio.run(policy.call("pick", attempt, deadline=1.0)) == "ok"
+    assert attempt.calls == 2
+    assert policy.budget.stats()["retries"] == 1
+    assert policy.breaker.consecutive_failures == 0
+
+    # The budget is spent, the next failure is not retried
+    attempt = Attempts((0, RuntimeError("flaky")), (0, "ok"))
+    with pytest.raises(RuntimeError):
+        asyncio.run(policy.call("pick", attempt, deadline=1.0))
+    assert attempt.calls == 1
+
+
+def test_slow_attempt_is_hedged():
+    policy = make_policy(hedging=True)
+    policy.latency = LatencyTracker(min_samples=1)
+    policy.latency.observe("pick", 0.01)
+    attempt = Attempts((1.0, "slow"), (0, "hedged"))
+
+    started = time.perf_counter()
+    result = asyncio.run(policy.call("pick", attempt, deadline=2.0))
+
+    assert result == "hedged"
+    assert time.perf_counter() - started < 0.5
+
+
+def test_deadline_counts_as_a_failure():
+    policy = make_policy(failures=1)
+    attempt = Attempts((1.0, "late"))
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(policy.call("judge", attempt, deadline=0.05))
+    assert policy.breaker.state == "open"
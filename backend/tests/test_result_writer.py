@@ -0,0 +1,72 @@
+import asyncio
+from datetime import datetime, timezone
+
+from app.services.result_writer import RoundResult, RoundResultWriter
+
+
+def make_result(round_id: int, game_session_id: int = 1) -> RoundResult:
+    return RoundResult(
+        round_id=round_id,
+        game_session_id=game_session_id,
+        ai_personality_id=1,
+        winner="human",
+        explanation="Funnier.",
+        completed_at=datetime.now(timezone.utc),
+        user_card_ids=[round_id * 10],
+        ai_card_ids=[round_id * 10 + 1],
+    )
+
+
+class FlakyWriter(RoundResultWriter):
+    """Writes to a list instead of the database. Any batch holding a
+    `poisoned` round fails, and so do the first `failures` writes."""
+
+    def __init__(self, journal_path, poisoned=(), failures=0, **kwargs):
+        super().__init__(journal_path, retry_delay=0, **kwargs)
+        self.poisoned = set(poisoned)
+        self.failures = failures
+        self.written = []
+
+    async def _write(self, results):
+        self.failures -= 1
+        if self.failures >= 0 or any(
+            result.round_id in self.poisoned for result in results
+        ):
+            raise RuntimeError("UNIQUE constraint failed")
+        self.written.extend(result.round_id for result in results)
+        return len(results)
+
+
+def test_a_result_that_always_fails_is_dead_lettered(tmp_path):
+    writer = FlakyWriter(tmp_path / "results.journal", poisoned={2})
+
+    async def play():
+        await writer.start()
+        for round_id in (1, 2, 3):
+            await writer.submit(make_result(round_id))
+        # Neither the session nor shutdown wait on the failing result forever
+        await asyncio.wait_for(writer.flush_session(1), timeout=5)
+        await asyncio.wait_for(writer.close(), timeout=5)
+
+    asyncio.run(play())
+
+    assert sorted(writer.written) == [1, 3]
+    assert not writer.is_pending(2)
+    dead_letters = writer.dead_letter_path.read_text().splitlines()
+    assert [RoundResult.from_json(line).round_id for line in dead_letters] == [2]
+    assert (tmp_path / "results.journal").read_text() == ""
+
+
+def test_a_transient_failure_is_retried(tmp_path):
+    # The batch and the first attempt on its own fail, the second one works
+    writer = FlakyWriter(tmp_path / "results.journal", failures=2)
+
+    async def play():
+        await writer.start()
+        await writer.submit(make_result(1))
+        await asyncio.wait_for(writer.close(), timeout=5)
+
+    asyncio.run(play())
+
+    assert writer.written == [1]
+    assert not writer.dead_letter_path.exists()
@@ -0,0 +1,92 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from fakeredis import FakeAsyncRedis
+
+from app.services import shared_state
+from app.services.shared_state import (
+    LockTimeoutError,
+    RateLimiter,
+    RedisRateLimiter,
+    RedisSharedState,
+    SharedState,
+)
+
+
+def make_redis_state(**kwargs) -> RedisSharedState:
+    return RedisSharedState(
+        FakeAsyncRedis(), RateLimiter(0, 1), lock_timeout=0.1, **kwargs
+    )
+
+
+def hold_while_contended(state: SharedState):
+    """Hold the lock of session 1 while a second caller tries to take it."""
+
+    async def contend():
+        async with state.lock("session:1"):
+            with pytest.raises(LockTimeoutError):
+                async with state.lock("session:1"):
+                    pass
+            # Other keys are not affected
+            async with state.lock("session:2"):
+                pass
+        # Released, the next caller gets it right away
+        async with state.lock("session:1"):
+            pass
+
+    asyncio.run(contend())
+
+
+def test_local_lock_times_out_while_held():
+    hold_while_contended(SharedState(RateLimiter(0, 1), lock_timeout=0.1))
+
+
+def test_redis_lock_times_out_while_held():
+    state = make_redis_state()
+    hold_while_contended(state)
+
+
+def test_redis_lock_is_not_released_once_taken_over():
+    state = make_redis_state(lock_ttl=0.05)
+
+    async def outlive_the_ttl():
+        async with state.lock("session:1"):
+            await asyncio.sleep(0.1)
+            # Expired, another worker takes the lock meanwhile
+            await state.redis.set("caai:lock:session:1", "other")
+        return await state.redis.get("caai:lock:session:1")
+
+    assert asyncio.run(outlive_the_ttl()) == b"other"
+
+
+def test_local_rate_limiter_trips_past_the_burst():
+    limiter = RateLimiter(rate=1, burst=2)
+
+    async def take(count):
+        return [await limiter._take() for _ in range(count)]
+
+    waits = asyncio.run(take(3))
+
+    assert waits[:2] == [0.0, 0.0]
+    assert 0 < waits[2] <= 1.0
+
+
+def test_redis_rate_limiter_trips_past_the_rate(monkeypatch):
+    # Every call lands in the same one second window
+    monkeypatch.setattr(
+        shared_state,
+        "time",
+        SimpleNamespace(time=lambda: 1000.25, monotonic=time.monotonic),
+    )
+    redis_client = FakeAsyncRedis()
+
+    async def take(count):
+        # Two workers share the limit through Redis
+        limiters = [RedisRateLimiter(redis_client, rate=2) for _ in range(2)]
+        return [await limiters[i % 2]._take() for i in range(count)]
+
+    waits = asyncio.run(take(3))
+
+    assert waits == [0.0, 0.0, 0.75]
@@ -0,0 +1,57 @@
+import asyncio
+
+from app.services.warmup import Warmup
+
+
+class Step:
+    """A warmup step failing its first `failures` runs."""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.runs = 0
+
+    async def __call__(self):
+        self.runs += 1
+        if self.runs <= self.failures:
+            raise ConnectionError("unreachable")
+
+
+def test_ready_once_every_step_ran():
+    warmup = Warmup()
+    assert not warmup.status()["ready"]
+
+    asyncio.run(warmup.run([("database", Step(), True), ("model", Step(), False)]))
+
+    assert warmup.status()["ready"]
+    assert set(warmup.status()["steps_ms"]) == {"database", "model"}
+
+
+def test_failed_optional_step_does_not_block_readiness():
+    warmup = Warmup()
+
+    asyncio.run(warmup.run([("database", Step(), True), ("model", Step(1), False)]))
+
+    status = warmup.status()
+    assert status["ready"]
+    assert status["failed"] == []
+    assert "model" in status["errors"]
+
+
+def test_failed_critical_step_is_not_ready_until_it_recovers():
+    warmup = Warmup(retry_interval=0.01)
+    database = Step(failures=2)
+    statuses = []
+
+    async def run():
+        task = asyncio.create_task(warmup.run([("database", database, True)]))
+        await warmup.wait_first_pass()
+        statuses.append(warmup.status())
+        await asyncio.wait_for(task, timeout=5)
+
+    asyncio.run(run())
+
+    assert not statuses[0]["ready"]
+    assert statuses[0]["failed"] == ["database"]
+    assert warmup.status()["ready"]
+    assert warmup.status()["errors"] == {}
+    assert database.runs == 3
@@ -1,3 +1,4 @@
+import json
 from pathlib import Path
 import unicodedata
 
@@ -41,3 +42,62 @@ def read_commits():
         .reset_index(drop=True)
     )
     return df
+
+
+STORE = Path(__file__).parent.parent / "store"
+
+
+def _store_filters(start, end):
+    filters = []
+    if start is not None:
+        filters.append(("date", ">=", str(start)))
+    if end is not None:
+        filters.append(("date", "<=", str(end)))
+    return filters or None
+
+
+def read_rounds(columns=None, start=None, end=None, store=STORE):
+    """
+    Rounds exported by `python -m bi.etl`, optionally only `columns` and the
+    date partitions between `start` and `end` (YYYY-MM-DD, inclusive).
+    """
+    return pd.read_parquet(
+        Path(store) / "rounds", columns=columns, filters=_store_filters(start, end)
+    )
+
+
+def read_card_plays(columns=None, start=None, end=None, store=STORE):
+    """
+    One row per pair of cards played, with the round's winner and personality.
+    """
+    return pd.read_parquet(
+        Path(store) / "card_plays", columns=columns, filters=_store_filters(start, end)
+    )
+
+
+def _read_aggregate(name, store):
+    watermark = json.loads((Path(store) / "watermark.json").read_text())
+    return pd.read_parquet(Path(store) / "aggregates" / watermark["aggregates"][name])
+
+
+def read_card_stats(store=STORE):
+    return (
+        _read_aggregate("card_stats", store)
+        .assign(
+            plays=lambda df: df.user_plays + df.ai_plays,
+            wins=lambda df: df.user_wins + df.ai_wins,
+            win_rate=lambda df: df.wins / df.plays,
+        )
+        .set_index("card_id")
+    )
+
+
+def read_personality_stats(store=STORE):
+    return (
+        _read_aggregate("personality_stats", store)
+        .assign(
+            ai_win_ratio=lambda df: df.ai_wins / df.rounds,
+            mean_duration_s=lambda df: df.duration_s_total / df.timed_rounds,
+        )
+        .set_index("ai_personality_id")
+    )
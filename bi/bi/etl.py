@@ -0,0 +1,295 @@
+"""
+Incremental export of finished rounds from the game database to a partitioned
+Parquet store, so analytics never query the production tables.
+
+Every run only reads the rounds past the watermark of the previous one, by
+primary key range, and appends them as new files:
+
+    store/
+        rounds/date=2024-07-20/part-000000001234.parquet
+        card_plays/date=2024-07-20/part-000000001234.parquet
+        aggregates/card_stats-000000005678.parquet
+        aggregates/personality_stats-000000005678.parquet
+        watermark.json
+
+watermark.json is the commit point of a run: it holds the last exported round
+id and names the aggregates that include it, and is replaced last. A run that
+dies before that is simply redone, it overwrites the files it already wrote.
+
+Rounds still in play hold the watermark back so they are picked up once
+judged, unless they were dealt more than --abandon-after-hours ago.
+
+    python -m bi.etl --database ../cards_against_ai.db
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pandas as pd
+
+DEFAULT_DB = Path(__file__).parent.parent.parent / "cards_against_ai.db"
+DEFAULT_STORE = Path(__file__).parent.parent / "store"
+ABANDON_AFTER_HOURS = 2
+
+ROUNDS_QUERY = """
+    SELECT
+        r.id AS round_id,
+        r.game_session_id,
+        s.user_id,
+        s.ai_personality_id,
+        r.round_number,
+        r.black_card_id,
+        r.winner,
+        r.user_score,
+        r.ai_score,
+        r.created_at,
+        r.completed_at
+    FROM game_rounds AS r
+    JOIN game_sessions AS s ON s.id = r.game_session_id
+    WHERE r.id > ? AND r.id <= ? AND r.winner IS NOT NULL
+"""
+
+CARD_PLAYS_QUERY = """
+    SELECT round_id, play_order, user_card_id, ai_card_id
+    FROM card_plays
+    WHERE round_id > ? AND round_id <= ?
+"""
+
+CARD_STATS_COLUMNS = ["user_plays", "user_wins", "ai_plays", "ai_wins"]
+PERSONALITY_STATS_COLUMNS = [
+    "rounds",
+    "ai_wins",
+    "human_wins",
+    "ties",
+    "timed_rounds",
+    "duration_s_total",
+]
+
+
+def read_watermark(store):
+    """
+    {"round_id": last exported round id, "aggregates": {name: file name}}
+    """
+    path = Path(store) / "watermark.json"
+    if not path.exists():
+        return {"round_id": 0, "aggregates": {}}
+    return json.loads(path.read_text())
+
+
+def write_atomic(path, write):
+    """
+    Write through a temporary file so readers never see a half written file.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp")
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def next_watermark(conn, watermark, abandon_before, batch_size):
+    """
+    Highest round id that can be exported: the round before the oldest one
+    still in play, abandoned rounds aside, and at most `batch_size` ids ahead.
+    """
+    (last_id,) = conn.execute(
+        "SELECT MAX(id) FROM game_rounds WHERE id > ?", (watermark,)
+    ).fetchone()
+    if last_id is None:
+        return watermark
+    (in_play,) = conn.execute(
+        """
+        SELECT MIN(id) FROM game_rounds
+        WHERE id > ? AND winner IS NULL AND created_at >= ?
+        """,
+        (watermark, abandon_before),
+    ).fetchone()
+    upper = last_id if in_play is None else in_play - 1
+    return min(upper, watermark + batch_size)
+
+
+def extract(conn, watermark, upper):
+    rounds = pd.read_sql_query(
+        ROUNDS_QUERY,
+        conn,
+        params=(watermark, upper),
+        # With and without microseconds, written by the app and by SQLite defaults
+        parse_dates={
+            column: {"format": "ISO8601"} for column in ("created_at", "completed_at")
+        },
+    )
+    rounds = rounds.assign(
+        duration_s=lambda df: (df.completed_at - df.created_at).dt.total_seconds(),
+        date=lambda df: df.completed_at.fillna(df.created_at)
+        .dt.strftime("%Y-%m-%d")
+        .fillna("unknown"),
+    )
+    card_plays = pd.read_sql_query(
+        CARD_PLAYS_QUERY, conn, params=(watermark, upper)
+    ).merge(rounds[["round_id", "ai_personality_id", "winner", "date"]], on="round_id")
+    return rounds, card_plays
+
+
+def write_partitions(df, store, table, watermark):
+    """
+    One file per date partition, named after the watermark the run started
+    from so a rerun after a crash overwrites its own files.
+    """
+    for date, part in df.groupby("date"):
+        path = Path(store) / table / f"date={date}" / f"part-{watermark:012d}.parquet"
+        write_atomic(
+            path, lambda tmp: part.drop(columns="date").to_parquet(tmp, index=False)
+        )
+
+
+def card_stats(card_plays):
+    card_plays = card_plays.assign(
+        user_won=lambda df: df.winner == "human", ai_won=lambda df: df.winner == "ai"
+    )
+    user = card_plays.groupby("user_card_id").agg(
+        user_plays=("round_id", "size"), user_wins=("user_won", "sum")
+    )
+    ai = card_plays.groupby("ai_card_id").agg(
+        ai_plays=("round_id", "size"), ai_wins=("ai_won", "sum")
+    )
+    return (
+        user.rename_axis("card_id")
+        .join(ai.rename_axis("card_id"), how="outer")
+        .fillna(0)
+        .astype(int)
+    )
+
+
+def personality_stats(rounds):
+    return (
+        rounds.assign(
+            ai_wins=lambda df: df.winner == "ai",
+            human_wins=lambda df: df.winner == "human",
+            ties=lambda df: df.winner == "tie",
+            timed_rounds=lambda df: df.duration_s.notna(),
+        )
+        .groupby("ai_personality_id")
+        .agg(
+            rounds=("round_id", "size"),
+            ai_wins=("ai_wins", "sum"),
+            human_wins=("human_wins", "sum"),
+            ties=("ties", "sum"),
+            timed_rounds=("timed_rounds", "sum"),
+            duration_s_total=("duration_s", "sum"),
+        )
+    )
+
+
+def merge_aggregate(store, previous_file, name, delta, columns, upper):
+    """
+    Add the counts of the new rounds to the previous aggregate, written as a
+    new file so the one watermark.json points to stays valid until the run
+    commits. Returns the new file name.
+    """
+    aggregates = Path(store) / "aggregates"
+    if previous_file is not None:
+        previous = pd.read_parquet(aggregates / previous_file)
+        delta = previous.set_index(delta.index.name).add(delta, fill_value=0)
+    # Counts come back as floats from the outer join with the stored ones
+    delta = delta[columns].astype({c: int for c in columns if not c.endswith("_total")})
+    file_name = f"{name}-{upper:012d}.parquet"
+    write_atomic(
+        aggregates / file_name,
+        lambda tmp: delta.reset_index().to_parquet(tmp, index=False),
+    )
+    return file_name
+
+
+def run(
+    database=DEFAULT_DB,
+    store=DEFAULT_STORE,
+    abandon_after_hours=ABANDON_AFTER_HOURS,
+    batch_size=100_000,
+):
+    """
+    Export the rounds finished since the last run. Returns how many were exported.
+    """
+    store = Path(store)
+    state = read_watermark(store)
+    watermark = state["round_id"]
+    abandon_before = (
+        datetime.now(timezone.utc) - timedelta(hours=abandon_after_hours)
+    ).strftime("%Y-%m-%d %H:%M:%S")
+
+    # Read only, the export never takes a write lock on the game database
+    conn = sqlite3.connect(f"file:{database}?mode=ro", uri=True)
+    try:
+        upper = next_watermark(conn, watermark, abandon_before, batch_size)
+        if upper == watermark:
+            print(f"Nothing to export past round {watermark}")
+            return 0
+        rounds, card_plays = extract(conn, watermark, upper)
+    finally:
+        conn.close()
+
+    write_partitions(rounds, store, "rounds", watermark)
+    write_partitions(card_plays, store, "card_plays", watermark)
+    previous = state["aggregates"]
+    aggregates = {
+        "card_stats": merge_aggregate(
+            store,
+            previous.get("card_stats"),
+            "card_stats",
+            card_stats(card_plays),
+            CARD_STATS_COLUMNS,
+            upper,
+        ),
+        "personality_stats": merge_aggregate(
+            store,
+            previous.get("personality_stats"),
+            "personality_stats",
+            personality_stats(rounds),
+            PERSONALITY_STATS_COLUMNS,
+            upper,
+        ),
+    }
+    write_atomic(
+        store / "watermark.json",
+        lambda tmp: tmp.write_text(
+            json.dumps(
+                {
+                    "round_id": upper,
+                    "aggregates": aggregates,
+                    "updated_at": datetime.now(timezone.utc).isoformat(),
+                },
+                indent=2,
+            )
+        ),
+    )
+    for name, file_name in previous.items():
+        if file_name != aggregates.get(name):
+            (store / "aggregates" / file_name).unlink(missing_ok=True)
+
+    print(f"Exported {len(rounds)} rounds, {watermark} < round id <= {upper}")
+    return len(rounds)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Append the rounds finished since the last run to the Parquet store"
+    )
+    parser.add_argument(
+        "--database", type=Path, default=DEFAULT_DB, help="Game database"
+    )
+    parser.add_argument(
+        "--store", type=Path, default=DEFAULT_STORE, help="Parquet store"
+    )
+    parser.add_argument(
+        "--abandon-after-hours",
+        type=float,
+        default=ABANDON_AFTER_HOURS,
+        help="Unjudged rounds older than this no longer hold the watermark back",
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=100_000, help="Max round ids per run"
+    )
+    args = parser.parse_args()
+    run(args.database, args.store, args.abandon_after_hours, args.batch_size)
@@ -1,30 +1,31 @@
+import argparse
+import asyncio
+import random
+import re
 import sqlite3
+import time
 
 from dotenv import load_dotenv
-from openai import OpenAI
 from tqdm.auto import tqdm
 
 # Load environment variables
 load_dotenv()
 
 
-# Connect to the SQLite database
-conn = sqlite3.connect("source.sqlite")
-cursor = conn.cursor()
-
+CATEGORIES = ("SAFE", "NSFW", "OFFENSIVE")
 
 PROMPT = """
-You are tasked with evaluating a given text to determine if it is Not Safe For Work (NSFW) or offensive.
+You are tasked with evaluating a list of texts to determine if each one is Not Safe For Work (NSFW) or offensive.
 NSFW content typically includes explicit sexual references, graphic violence, or other material unsuitable for a professional or public setting.
 Offensive content may include hate speech, extreme political views, discriminatory language, or other text that could be considered highly inappropriate or hurtful.
 
-Here is the text to evaluate:
+Here are the texts to evaluate, one per line, each prefixed by its id:
 
-<text_to_evaluate>
-{text}
-</text_to_evaluate>
+<texts_to_evaluate>
+{texts}
+</texts_to_evaluate>
 
-Carefully read and analyze the text above. Consider the following aspects:
+Carefully read and analyze every text above. Consider the following aspects:
 1. Presence of explicit sexual content
 2. Graphic depictions of violence
 3. Use of profanity or vulgar language
@@ -32,66 +33,201 @@ Carefully read and analyze the text above. Consider the following aspects:
 5. Extreme political views
 6. Other potentially offensive or inappropriate content
 
-After your analysis, provide only your final judgment following format:
-NSFW: if the text is Not Safe For Work
-OFFENSIVE: if the text is offensive but not necessarily NSFW
-SAFE: if the text is neither NSFW nor offensive
+After your analysis, provide only your final judgment for every text, one per line, following format:
+<id>: NSFW if the text is Not Safe For Work
+<id>: OFFENSIVE if the text is offensive but not necessarily NSFW
+<id>: SAFE if the text is neither NSFW nor offensive
 
-If the text is both NSFW and offensive, use the [NSFW] judgment.
+If a text is both NSFW and offensive, use the [NSFW] judgment.
 
 Begin your evaluation now.
 """
 
+JUDGMENT_LINE = re.compile(r"^\s*(\d+)\s*:\s*\[?(SAFE|NSFW|OFFENSIVE)\]?", re.MULTILINE)
+
 
-client = OpenAI()
+class OpenAIClassifier:
+    def __init__(self, model="gpt-4o-mini-2024-07-18", max_retries=6):
+        from openai import APIConnectionError, AsyncOpenAI, RateLimitError
 
+        self.client = AsyncOpenAI(max_retries=0)
+        self.model = model
+        self.max_retries = max_retries
+        self.retryable_errors = (RateLimitError, APIConnectionError)
 
-def check_content(text):
+    async def classify(self, cards):
+        """
+        Classify a batch of (id, text) cards, returns {id: category}.
+        """
+        texts = "\n".join(
+            f"{card_id}: {' '.join(text.split())}" for card_id, text in cards
+        )
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[{"role": "user", "content": PROMPT.format(texts=texts)}],
+                )
+                return parse_judgments(response.choices[0].message.content)
+            except self.retryable_errors as e:
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(backoff_delay(e, attempt))
+
+
+class StubClassifier:
     """
-    Check if the text is offensive or inappropriate using OpenAI's API.
+    Local stand-in for the model, flags a few keywords and otherwise says SAFE.
     """
-    prompt = PROMPT.format(text=text)
-
-    nsfw = client.chat.completions.create(
-        model="gpt-4o-mini-2024-07-18",
-        messages=[
-            {
-                "role": "user",
-                "content": prompt,
-            },
-        ],
-    )
-    return nsfw.choices[0].message.content
 
+    NSFW_WORDS = ("sex", "penis", "vagina", "orgasm", "porn", "naked")
+    OFFENSIVE_WORDS = ("nazi", "racist", "hitler", "slave")
+
+    def __init__(self, latency=0.05):
+        self.latency = latency
+
+    async def classify(self, cards):
+        await asyncio.sleep(self.latency)
+        judgments = {}
+        for card_id, text in cards:
+            text = text.lower()
+            if any(word in text for word in self.NSFW_WORDS):
+                judgments[card_id] = "NSFW"
+            elif any(word in text for word in self.OFFENSIVE_WORDS):
+                judgments[card_id] = "OFFENSIVE"
+            else:
+                judgments[card_id] = "SAFE"
+        return judgments
 
-def get_cards(table_name):
-    cursor.execute(f"SELECT id, text FROM {table_name}")
-    return cursor.fetchall()
+
+def parse_judgments(content):
+    return {
+        int(card_id): category for card_id, category in JUDGMENT_LINE.findall(content)
+    }
+
+
+def backoff_delay(error, attempt, base=1.0, cap=60.0):
+    """
+    Honor the server's retry-after header when present, otherwise use
+    exponential backoff with full jitter.
+    """
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return random.uniform(0, min(cap, base * 2**attempt))
 
 
-def process_cards(table_name):
+def get_cards(conn, table_name, force=False):
+    """
+    Cards still to categorize. Rows that already hold a valid category are
+    skipped, so an interrupted run resumes where it stopped.
+    """
+    if force:
+        return conn.execute(f"SELECT id, text FROM {table_name}").fetchall()
+    placeholders = ", ".join("?" for _ in CATEGORIES)
+    return conn.execute(
+        f"SELECT id, text FROM {table_name} "
+        f"WHERE category IS NULL OR category NOT IN ({placeholders})",
+        CATEGORIES,
+    ).fetchall()
+
+
+def write_categories(conn, table_name, updates):
+    with conn:
+        conn.executemany(f"UPDATE {table_name} SET category = ? WHERE id = ?", updates)
+
+
+async def process_cards(
+    conn,
+    table_name,
+    classifier,
+    concurrency=8,
+    batch_size=20,
+    chunk_size=200,
+    force=False,
+):
     """
     Process cards from the given table, check content, and update the category.
     """
-    cards = get_cards(table_name)
+    cards = get_cards(conn, table_name, force=force)
+    batches = asyncio.Queue()
+    for start in range(0, len(cards), batch_size):
+        batches.put_nowait(cards[start : start + batch_size])
+
+    pending_updates = []
+    failed = 0
+    progress = tqdm(total=len(cards), desc=table_name)
+    started = time.perf_counter()
+
+    async def worker():
+        nonlocal failed
+        while not batches.empty():
+            batch = batches.get_nowait()
+            try:
+                judgments = await classifier.classify(batch)
+            except Exception as e:
+                print(f"Batch starting at {table_name} card {batch[0][0]} failed: {e}")
+                judgments = {}
+            for card_id, _ in batch:
+                if card_id in judgments:
+                    pending_updates.append((judgments[card_id], card_id))
+                else:
+                    failed += 1
+            # Checkpoint in chunks, a crash loses at most one chunk of work
+            if len(pending_updates) >= chunk_size:
+                chunk = pending_updates[:]
+                pending_updates.clear()
+                write_categories(conn, table_name, chunk)
+            progress.update(len(batch))
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    write_categories(conn, table_name, pending_updates)
+    progress.close()
+
+    elapsed = time.perf_counter() - started
+    processed = len(cards) - failed
+    print(
+        f"Processed {processed}/{len(cards)} {table_name} cards in {elapsed:.1f}s "
+        f"({processed / elapsed if elapsed else 0:.1f} cards/s), {failed} left uncategorized"
+    )
 
-    for card_id, card_text in tqdm(cards):
-        category = check_content(card_text)
-        cursor.execute(
-            f"UPDATE {table_name} SET category = ? WHERE id = ?", (category, card_id)
+
+async def main(args):
+    conn = sqlite3.connect(args.db)
+    classifier = StubClassifier() if args.stub else OpenAIClassifier(model=args.model)
+    for table_name in args.tables:
+        await process_cards(
+            conn,
+            table_name,
+            classifier,
+            concurrency=args.concurrency,
+            batch_size=args.batch_size,
+            chunk_size=args.chunk_size,
+            force=args.force,
         )
-        conn.commit()
-        print(f"Processed {table_name} card {card_id}: {category}")
+    conn.close()
 
 
 if __name__ == "__main__":
-    # Process black cards
-    process_cards("black_cards")
-
-    # Process white cards
-    process_cards("white_cards")
-
-    # Close the database connection
-    conn.close()
+    parser = argparse.ArgumentParser(
+        description="Categorize cards as SAFE, NSFW or OFFENSIVE"
+    )
+    parser.add_argument("--db", default="source.sqlite")
+    parser.add_argument("--tables", nargs="+", default=["black_cards", "white_cards"])
+    parser.add_argument("--model", default="gpt-4o-mini-2024-07-18")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=20, help="Cards per prompt")
+    parser.add_argument(
+        "--chunk-size", type=int, default=200, help="Rows per UPDATE transaction"
+    )
+    parser.add_argument("--force", action="store_true", help="Recategorize every card")
+    parser.add_argument(
+        "--stub", action="store_true", help="Use a local stub instead of OpenAI"
+    )
+    asyncio.run(main(parser.parse_args()))
 
     print("All cards have been processed and categorized.")
@@ -0,0 +1,315 @@
+import argparse
+import csv
+import hashlib
+import sqlite3
+import time
+import unicodedata
+from itertools import islice
+from pathlib import Path
+
+DEFAULT_DB = Path(__file__).parent.parent / "cards_against_ai.db"
+SETUP_SCRIPT = Path(__file__).parent / "setup_db.sql"
+
+CARD_TABLES = ("black_cards", "white_cards")
+
+# Secondary indexes are dropped during the import and rebuilt afterwards, the
+# text_hash unique index has to stay since the upserts rely on it
+SECONDARY_INDEXES = {
+    "black_cards": {
+        "idx_black_cards_category_language": "(category, language)",
+        "idx_black_cards_watermark": "(watermark)",
+    },
+    "white_cards": {
+        "idx_white_cards_category_language": "(category, language)",
+        "idx_white_cards_watermark": "(watermark)",
+    },
+}
+
+UPSERTS = {
+    "black_cards": """
+        INSERT INTO black_cards (text, pick, watermark, category, language, text_hash)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (text_hash) DO UPDATE SET
+            pick = excluded.pick,
+            watermark = excluded.watermark,
+            language = excluded.language
+    """,
+    "white_cards": """
+        INSERT INTO white_cards (text, watermark, category, language, text_hash)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (text_hash) DO UPDATE SET
+            watermark = excluded.watermark,
+            language = excluded.language
+    """,
+}
+
+
+# Cards of a source database keep their id, games and stats refer to it. A
+# card whose text is already taken by another id is kept as a duplicate with
+# a NULL text_hash, like ensure_schema does for older databases
+ID_UPSERTS = {
+    "black_cards": """
+        INSERT INTO black_cards
+            (id, text, pick, watermark, category, language, text_hash)
+        VALUES (?1, ?2, ?3, ?4, ?5, ?6, CASE
+            WHEN EXISTS (SELECT 1 FROM black_cards WHERE text_hash = ?7 AND id != ?1)
+            THEN NULL ELSE ?7 END)
+        ON CONFLICT (id) DO UPDATE SET
+            pick = excluded.pick,
+            watermark = excluded.watermark,
+            language = excluded.language
+    """,
+    "white_cards": """
+        INSERT INTO white_cards (id, text, watermark, category, language, text_hash)
+        VALUES (?1, ?2, ?3, ?4, ?5, CASE
+            WHEN EXISTS (SELECT 1 FROM white_cards WHERE text_hash = ?6 AND id != ?1)
+            THEN NULL ELSE ?6 END)
+        ON CONFLICT (id) DO UPDATE SET
+            watermark = excluded.watermark,
+            language = excluded.language
+    """,
+}
+
+
+def normalize_text(text):
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+def text_hash(text):
+    """
+    Identity of a card, two cards whose text only differs in case or
+    whitespace are the same card.
+    """
+    return hashlib.sha256(normalize_text(text).encode()).hexdigest()
+
+
+def ensure_schema(conn):
+    """
+    Create the tables on a fresh database, add the text_hash column to
+    databases created before it existed and hash cards inserted without one.
+    """
+    tables = {
+        row[0]
+        for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    }
+    if not set(CARD_TABLES) <= tables:
+        conn.executescript(SETUP_SCRIPT.read_text())
+
+    conn.create_function("text_hash", 1, text_hash, deterministic=True)
+    for table in CARD_TABLES:
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        with conn:
+            if "text_hash" not in columns:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN text_hash VARCHAR")
+            # Duplicates keep a NULL hash, only the oldest copy of a card takes
+            # part in deduplication
+            conn.execute(f"""
+                UPDATE {table} SET text_hash = text_hash(text)
+                WHERE id IN (
+                    SELECT MIN(id) FROM {table} WHERE text_hash IS NULL
+                    GROUP BY text_hash(text)
+                )
+                AND text_hash(text) NOT IN (
+                    SELECT text_hash FROM {table} WHERE text_hash IS NOT NULL
+                )
+                """)
+            conn.execute(
+                f"CREATE UNIQUE INDEX IF NOT EXISTS idx_unique_{table}_text_hash "
+                f"ON {table}(text_hash)"
+            )
+
+
+def drop_secondary_indexes(conn, table):
+    with conn:
+        for name in SECONDARY_INDEXES[table]:
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def build_secondary_indexes(conn, table):
+    with conn:
+        for name, columns in SECONDARY_INDEXES[table].items():
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table}{columns}")
+        conn.execute(f"ANALYZE {table}")
+
+
+def read_sqlite(path, table, category, language):
+    """
+    Stream the cards of `table` from a source database like source.sqlite,
+    with their ids.
+    """
+    source = sqlite3.connect(path)
+    columns = {row[1] for row in source.execute(f"PRAGMA table_info({table})")}
+    pick = "pick" if table == "black_cards" else "NULL"
+    source_category = "category" if "category" in columns else "NULL"
+    source_language = "language" if "language" in columns else "NULL"
+    cursor = source.execute(
+        f"SELECT id, text, {pick}, watermark, {source_category}, {source_language} "
+        f"FROM {table} ORDER BY id"
+    )
+    try:
+        for card_id, text, card_pick, watermark, card_category, card_language in cursor:
+            yield (
+                card_id,
+                text,
+                card_pick,
+                watermark,
+                card_category or category,
+                card_language or language,
+            )
+    finally:
+        source.close()
+
+
+def csv_table(path):
+    """
+    CSV files with a pick column hold black cards, any other holds white cards.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        header = next(csv.reader(f), [])
+    return "black_cards" if "pick" in header else "white_cards"
+
+
+def read_csv(path, category, language):
+    """
+    Stream the cards of a pack CSV, they get new ids. The watermark is the
+    last dash separated part of the file name, tarjetas-negras-paisas.csv ->
+    PAISAS, a watermark column in the file is ignored.
+    """
+    watermark = Path(path).stem.split("-")[-1].upper()
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            yield (
+                None,
+                row["text"],
+                int(row["pick"]) if row.get("pick") else None,
+                watermark,
+                row.get("category") or category,
+                row.get("language") or language,
+            )
+
+
+def import_cards(conn, table, rows, chunk_size=1000):
+    """
+    Upsert cards in chunks of `chunk_size`, one transaction per chunk so an
+    interrupted import keeps every finished chunk. Returns the number of rows
+    read from the source.
+    """
+    total = 0
+    rows = iter(rows)
+    while chunk := list(islice(rows, chunk_size)):
+        new_cards, known_cards = [], []
+        for card_id, text, pick, watermark, category, language in chunk:
+            if not text or not text.strip():
+                continue
+            values = (text, pick or 1) if table == "black_cards" else (text,)
+            values += (watermark, category, language, text_hash(text))
+            if card_id is None:
+                new_cards.append(values)
+            else:
+                known_cards.append((card_id, *values))
+        with conn:
+            conn.executemany(UPSERTS[table], new_cards)
+            conn.executemany(ID_UPSERTS[table], known_cards)
+        total += len(chunk)
+    return total
+
+
+def count_cards(conn, table):
+    return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def sources(sqlite_paths, csv_paths, category, language):
+    """
+    (table, rows, label) for every table of every source.
+    """
+    for path in sqlite_paths:
+        for table in CARD_TABLES:
+            yield table, read_sqlite(path, table, category, language), f"{path}:{table}"
+    for path in csv_paths:
+        yield csv_table(path), read_csv(path, category, language), str(path)
+
+
+def refresh_backend(url):
+    """
+    Ask a running backend to reload its in-memory card index.
+    """
+    from urllib.request import Request, urlopen
+
+    with urlopen(
+        Request(url.rstrip("/") + "/card-index/refresh", method="POST")
+    ) as response:
+        print(f"Backend card index refreshed: {response.read().decode()}")
+
+
+def import_decks(
+    db, sqlite_paths=(), csv_paths=(), category="SAFE", language="EN", chunk_size=1000
+):
+    conn = sqlite3.connect(db)
+    ensure_schema(conn)
+    before = {table: count_cards(conn, table) for table in CARD_TABLES}
+    for table in CARD_TABLES:
+        drop_secondary_indexes(conn, table)
+
+    started = time.perf_counter()
+    try:
+        for table, rows, label in sources(sqlite_paths, csv_paths, category, language):
+            read = import_cards(conn, table, rows, chunk_size=chunk_size)
+            print(f"{label}: {read} cards read")
+    finally:
+        for table in CARD_TABLES:
+            build_secondary_indexes(conn, table)
+
+    elapsed = time.perf_counter() - started
+    for table in CARD_TABLES:
+        added = count_cards(conn, table) - before[table]
+        print(f"{table}: {added} new cards, {before[table] + added} total")
+    print(f"Import finished in {elapsed:.2f}s")
+    conn.close()
+
+
+def main(args):
+    import_decks(
+        args.db,
+        sqlite_paths=args.sqlite,
+        csv_paths=args.csv,
+        category=args.category,
+        language=args.language,
+        chunk_size=args.chunk_size,
+    )
+    if args.refresh_url:
+        refresh_backend(args.refresh_url)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=(
+            "Import card decks from sqlite databases and CSV packs, "
+            "deduplicated by text"
+        )
+    )
+    parser.add_argument("csv", nargs="*", type=Path, help="Pack CSV files")
+    parser.add_argument(
+        "--db", type=Path, default=DEFAULT_DB, help="Database to import into"
+    )
+    parser.add_argument(
+        "--sqlite",
+        nargs="+",
+        type=Path,
+        default=[],
+        help="Source databases like source.sqlite",
+    )
+    parser.add_argument(
+        "--category", default="SAFE", help="Category of cards without one"
+    )
+    parser.add_argument(
+        "--language", default="EN", help="Language of cards without one"
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, default=1000, help="Rows per transaction"
+    )
+    parser.add_argument(
+        "--refresh-url",
+        default=None,
+        help="Backend to refresh after the import, e.g. http://127.0.0.1:8000",
+    )
+    main(parser.parse_args())
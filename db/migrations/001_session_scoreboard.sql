@@ -0,0 +1,26 @@
+-- Running scoreboard on game_sessions, replaces the
+-- ORDER BY round_number DESC LIMIT 1 lookup on game_rounds.
+-- Apply once on databases created before the scoreboard columns existed:
+--   sqlite3 cards_against_ai.db < db/migrations/001_session_scoreboard.sql
+
+ALTER TABLE game_sessions ADD COLUMN current_round INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE game_sessions ADD COLUMN user_score INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE game_sessions ADD COLUMN ai_score INTEGER NOT NULL DEFAULT 0;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_unique_game_round
+ON game_rounds(game_session_id, round_number);
+
+-- Backfill from the latest round of every session
+UPDATE game_sessions
+SET
+    current_round = latest.round_number,
+    user_score = latest.user_score,
+    ai_score = latest.ai_score
+FROM (
+    SELECT game_session_id, round_number, user_score, ai_score
+    FROM game_rounds AS r
+    WHERE round_number = (
+        SELECT MAX(round_number) FROM game_rounds WHERE game_session_id = r.game_session_id
+    )
+) AS latest
+WHERE game_sessions.id = latest.game_session_id;
@@ -0,0 +1,12 @@
+-- Hands dealt to every round, so submits no longer round-trip the hand
+-- through the client. Apply once on databases created before the table
+-- existed:
+--   sqlite3 cards_against_ai.db < db/migrations/002_round_hands.sql
+-- Rounds dealt before have no stored hand and keep accepting the
+-- white_card_ids sent with the submission.
+
+CREATE TABLE IF NOT EXISTS round_hands (
+    round_id INTEGER PRIMARY KEY,
+    card_ids VARCHAR NOT NULL,
+    FOREIGN KEY (round_id) REFERENCES game_rounds(id)
+);
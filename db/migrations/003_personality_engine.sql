@@ -0,0 +1,5 @@
+-- Per personality choice between the remote model and the local heuristic
+-- engine. Apply once on databases created before the column existed:
+--   sqlite3 cards_against_ai.db < db/migrations/003_personality_engine.sql
+
+ALTER TABLE ai_personalities ADD COLUMN engine VARCHAR NOT NULL DEFAULT 'anthropic';
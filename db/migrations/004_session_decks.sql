@@ -0,0 +1,11 @@
+-- Per session deck shuffles: a seed, the deck sizes when the session
+-- started and how many cards were dealt from each deck. Sessions get their
+-- seed on their next round. Apply once on databases created before the
+-- columns existed:
+--   sqlite3 cards_against_ai.db < db/migrations/004_session_decks.sql
+
+ALTER TABLE game_sessions ADD COLUMN deck_seed INTEGER;
+ALTER TABLE game_sessions ADD COLUMN black_deck_size INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE game_sessions ADD COLUMN black_cursor INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE game_sessions ADD COLUMN white_deck_size INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE game_sessions ADD COLUMN white_cursor INTEGER NOT NULL DEFAULT 0;
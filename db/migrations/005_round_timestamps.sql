@@ -0,0 +1,7 @@
+-- When every round was dealt and judged, read by the analytics export in
+-- bi/bi/etl.py. Apply once on databases created before the columns existed:
+--   sqlite3 cards_against_ai.db < db/migrations/005_round_timestamps.sql
+-- Rounds played before have no timestamps and no duration.
+
+ALTER TABLE game_rounds ADD COLUMN created_at TIMESTAMP;
+ALTER TABLE game_rounds ADD COLUMN completed_at TIMESTAMP;
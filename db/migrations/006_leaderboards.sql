@@ -0,0 +1,22 @@
+-- Leaderboard counters served by /leaderboards/*. Apply once on databases
+-- created before the tables existed, then count the rounds already played:
+--   sqlite3 cards_against_ai.db < db/migrations/006_leaderboards.sql
+--   cd backend && python -m app.services.leaderboard
+
+CREATE TABLE IF NOT EXISTS card_stats (
+    card_id INTEGER PRIMARY KEY,
+    plays INTEGER NOT NULL DEFAULT 0,
+    wins INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (card_id) REFERENCES white_cards(id)
+);
+CREATE INDEX IF NOT EXISTS idx_card_stats_leaderboard ON card_stats(wins, card_id);
+
+CREATE TABLE IF NOT EXISTS personality_stats (
+    ai_personality_id INTEGER PRIMARY KEY,
+    wins INTEGER NOT NULL DEFAULT 0,
+    losses INTEGER NOT NULL DEFAULT 0,
+    ties INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (ai_personality_id) REFERENCES ai_personalities(id)
+);
+CREATE INDEX IF NOT EXISTS idx_personality_stats_leaderboard
+ON personality_stats(wins, ai_personality_id);
@@ -0,0 +1,11 @@
+-- Session decks shuffle card ids instead of positions in the card index, so
+-- a deck records its highest card id instead of its size. Unfinished
+-- sessions are reshuffled on their next round. Apply once on databases
+-- created before the change:
+--   sqlite3 cards_against_ai.db < db/migrations/007_deck_card_ids.sql
+
+ALTER TABLE game_sessions RENAME COLUMN black_deck_size TO black_deck_max_id;
+ALTER TABLE game_sessions RENAME COLUMN white_deck_size TO white_deck_max_id;
+UPDATE game_sessions
+SET deck_seed = NULL, black_cursor = 0, white_cursor = 0
+WHERE end_time IS NULL;
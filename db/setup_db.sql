@@ -12,16 +12,20 @@ CREATE TABLE IF NOT EXISTS black_cards (
     pick INTEGER NOT NULL,
     watermark VARCHAR NOT NULL,
     category VARCHAR NOT NULL,
-    language VARCHAR NOT NULL DEFAULT 'EN'
+    language VARCHAR NOT NULL DEFAULT 'EN',
+    text_hash VARCHAR
 );
+CREATE UNIQUE INDEX IF NOT EXISTS idx_unique_black_cards_text_hash ON black_cards(text_hash);
 
 CREATE TABLE IF NOT EXISTS white_cards (
     id INTEGER PRIMARY KEY,
     text VARCHAR NOT NULL,
     watermark VARCHAR,
     category VARCHAR,
-    language VARCHAR NOT NULL DEFAULT 'EN'
+    language VARCHAR NOT NULL DEFAULT 'EN',
+    text_hash VARCHAR
 );
+CREATE UNIQUE INDEX IF NOT EXISTS idx_unique_white_cards_text_hash ON white_cards(text_hash);
 
 -- Create user-related tables if they don't exist
 CREATE TABLE IF NOT EXISTS users (
@@ -36,6 +40,7 @@ CREATE TABLE IF NOT EXISTS ai_personalities (
     description TEXT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     created_by INTEGER,
+    engine VARCHAR NOT NULL DEFAULT 'anthropic' CHECK (engine IN ('anthropic', 'heuristic')),
     FOREIGN KEY (created_by) REFERENCES users(id)
 );
 
@@ -45,6 +50,14 @@ CREATE TABLE IF NOT EXISTS game_sessions (
     ai_personality_id INTEGER NOT NULL,
     start_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     end_time TIMESTAMP,
+    current_round INTEGER NOT NULL DEFAULT 0,
+    user_score INTEGER NOT NULL DEFAULT 0,
+    ai_score INTEGER NOT NULL DEFAULT 0,
+    deck_seed INTEGER,
+    black_deck_max_id INTEGER NOT NULL DEFAULT 0,
+    black_cursor INTEGER NOT NULL DEFAULT 0,
+    white_deck_max_id INTEGER NOT NULL DEFAULT 0,
+    white_cursor INTEGER NOT NULL DEFAULT 0,
     FOREIGN KEY (user_id) REFERENCES users(id),
     FOREIGN KEY (ai_personality_id) REFERENCES ai_personalities(id)
 );
@@ -60,6 +73,8 @@ CREATE TABLE IF NOT EXISTS game_rounds (
     ai_score INTEGER NOT NULL,
     winner VARCHAR CHECK (winner IN ('human', 'ai', 'tie', NULL)),
     judge_explanation TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    completed_at TIMESTAMP,
     FOREIGN KEY (game_session_id) REFERENCES game_sessions(id),
     FOREIGN KEY (black_card_id) REFERENCES black_cards(id)
 );
@@ -84,6 +99,33 @@ CREATE INDEX IF NOT EXISTS idx_card_plays_ai_card_id ON card_plays(ai_card_id);
 CREATE UNIQUE INDEX IF NOT EXISTS idx_unique_card_play 
 ON card_plays(round_id, play_order);
 
+-- Leaderboard counters, updated with every judged round. Rebuilt from
+-- card_plays and game_rounds by `python -m app.services.leaderboard`
+CREATE TABLE IF NOT EXISTS card_stats (
+    card_id INTEGER PRIMARY KEY,
+    plays INTEGER NOT NULL DEFAULT 0,
+    wins INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (card_id) REFERENCES white_cards(id)
+);
+CREATE INDEX IF NOT EXISTS idx_card_stats_leaderboard ON card_stats(wins, card_id);
+
+CREATE TABLE IF NOT EXISTS personality_stats (
+    ai_personality_id INTEGER PRIMARY KEY,
+    wins INTEGER NOT NULL DEFAULT 0,
+    losses INTEGER NOT NULL DEFAULT 0,
+    ties INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (ai_personality_id) REFERENCES ai_personalities(id)
+);
+CREATE INDEX IF NOT EXISTS idx_personality_stats_leaderboard
+ON personality_stats(wins, ai_personality_id);
+
+-- Comma separated white card ids dealt to a round, in deal order
+CREATE TABLE IF NOT EXISTS round_hands (
+    round_id INTEGER PRIMARY KEY,
+    card_ids VARCHAR NOT NULL,
+    FOREIGN KEY (round_id) REFERENCES game_rounds(id)
+);
+
 -- Insert AI personalities
 INSERT INTO ai_personalities (name, description) VALUES
 ('Sarcastic Susan', 'A quick-witted, dry-humored AI that always has a snarky comment ready.');
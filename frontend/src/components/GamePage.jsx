@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { User, Bot, Award, XCircle, Trophy } from 'lucide-react';
-import { createGameRound, submitGameRound, endGameSession } from '../services/apiClient';
+import { createGameRound, submitGameRoundStream, endGameSession } from '../services/apiClient';
 
 // BlackCard Component
 const BlackCard = ({ card }) => (
@@ -79,7 +79,7 @@ const JudgeDecisionModal = ({ isOpen, blackCard, userCards, aiCards, winner, exp
           </div>
         </div>
         <div className="mb-4">
-          <p className="text-lg font-semibold mb-2">Winner: {winner === 'human' ? 'You!' : 'AI'}</p>
+          <p className="text-lg font-semibold mb-2">Winner: {winner ? (winner === 'human' ? 'You!' : 'AI') : '...'}</p>
           <p className="italic">{explanation}</p>
         </div>
         <button
@@ -205,17 +205,35 @@ export default function GamePage({ initialGameData, onReturnHome }) {
     setIsLoading(true);
     setError(null);
     try {
-      const response = await submitGameRound(
+      await submitGameRoundStream(
         gameState.game_round.id, 
         selectedCards, 
-        gameState.white_cards.map(card => card.id)
+        (event, data) => {
+          if (event === 'ai_cards') {
+            setGameState(prevState => ({
+              ...prevState,
+              game_round: { ...prevState.game_round, winner: null, judge_explanation: '' },
+              ai_chosen_cards: data
+            }));
+            setShowJudgeModal(true);
+          } else if (event === 'winner') {
+            setGameState(prevState => ({
+              ...prevState,
+              game_round: { ...prevState.game_round, winner: data }
+            }));
+          } else if (event === 'explanation') {
+            setGameState(prevState => ({
+              ...prevState,
+              game_round: {
+                ...prevState.game_round,
+                judge_explanation: prevState.game_round.judge_explanation + data
+              }
+            }));
+          } else if (event === 'result') {
+            setGameState(prevState => ({ ...prevState, game_round: data }));
+          }
+        }
       );
-      setGameState(prevState => ({
-        ...prevState,
-        game_round: response.data.game_round,
-        ai_chosen_cards: response.data.ai_chosen_cards
-      }));
-      setShowJudgeModal(true);
     } catch (error) {
       console.error('Error submitting cards:', error);
       setError('Failed to submit cards. Please try again.');
@@ -20,8 +20,43 @@ export const createGameSession = (username, aiPersonalityId) =>
 export const createGameRound = (gameSessionId) => 
   apiClient.post('/game-rounds', { game_session_id: gameSessionId });
 
-export const submitGameRound = (roundId, userCardIds, whiteCardIds) => 
-  apiClient.post(`/game-rounds/${roundId}/submit`, { user_card_ids: userCardIds, white_card_ids: whiteCardIds });
+// The dealt hand is kept server side, only the chosen cards are sent
+export const submitGameRound = (roundId, userCardIds) => 
+  apiClient.post(`/game-rounds/${roundId}/submit`, { user_card_ids: userCardIds });
+
+// Streams the round result as Server-Sent Events: `ai_cards`, `winner`,
+// `explanation` chunks and the persisted `result` round, in that order.
+export const submitGameRoundStream = async (roundId, userCardIds, onEvent) => {
+  const response = await fetch(`${BASE_URL}game-rounds/${roundId}/submit/stream`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ user_card_ids: userCardIds }),
+  });
+  if (!response.ok) {
+    throw new Error(`Submit failed with status ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const message = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      let event = 'message';
+      let data = '';
+      message.split('\n').forEach(line => {
+        if (line.startsWith('event: ')) event = line.slice(7);
+        else if (line.startsWith('data: ')) data += line.slice(6);
+      });
+      onEvent(event, JSON.parse(data));
+    }
+  }
+};
 
 export const endGameSession = (sessionId) => 
   apiClient.post(`/game-sessions/${sessionId}/end`);